@@ -694,10 +694,9 @@ export default function EmailSorterApp() {
       await fetchAndSetCategories();
       const savedUser = localStorage.getItem('user');
       if (savedUser) {
-        const userData = JSON.parse(savedUser);
-        // Call fetchInboxEmails after a short delay to ensure categories are fetched first
-        //fetchInboxEmails(userData);
-        processEmails(userData);
+        // Show the emails already processed and stored by the server; new mail
+        // is synced in the background, so a reload doesn't go to Gmail
+        await fetchStoredEmails();
       }
     };
     checkSession();
@@ -876,7 +875,126 @@ export default function EmailSorterApp() {
     saveData('accounts', newAccounts);
   };
 
+  // Convert an email stored by the server (GET /emails) to the frontend structure
+  const toFrontendEmail = (stored) => ({
+    id: stored.id,
+    subject: stored.subject || '',
+    from: stored.sender || '',
+    body: stored.body,
+    summary: stored.summary || '',
+    categoryId: stored.category_id != null ? stored.category_id.toString() : null,
+    receivedAt: stored.received_at,
+    archived: true
+  });
+
+  // Load processed emails from the database, newest first, one page at a time
+  const fetchStoredEmails = async (maxEmails = 500) => {
+    console.log('fetchStoredEmails() running');
+    const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+    const loaded = [];
+    let cursor = null;
+
+    try {
+      do {
+        const params = new URLSearchParams({ limit: '100' });
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`${apiUrl}/emails?${params}`, {
+          credentials: 'include'
+        });
+        if (!response.ok) {
+          console.error('Error fetching stored emails:', response.status, response.statusText);
+          return;
+        }
+        const page = await response.json();
+        loaded.push(...page.emails.map(toFrontendEmail));
+        cursor = page.next_cursor;
+      } while (cursor && loaded.length < maxEmails);
+
+      setEmails(loaded);
+      saveData('emails', loaded);
+      setCategories(prev => {
+        const updated = prev.map(c => ({
+          ...c,
+          emailCount: loaded.filter(e => e.categoryId === c.id).length
+        }));
+        saveData('categories', updated);
+        return updated;
+      });
+    } catch (error) {
+      console.error('Error fetching stored emails:', error);
+    }
+  };
+
+  // Load an email's body, which GET /emails leaves out
+  const fetchEmailBody = async (email) => {
+    const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+    const response = await fetch(`${apiUrl}/emails/${encodeURIComponent(email.id)}`, {
+      credentials: 'include'
+    });
+    if (!response.ok) {
+      console.error('Error fetching email:', response.status, response.statusText);
+      return email;
+    }
+    return { ...email, ...toFrontendEmail(await response.json()) };
+  };
+
   // Process emails: fetch from Gmail API, generate summaries, categorize, and save to database
+  const waitForJob = async (jobId, intervalMs = 1000) => {
+    const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+    while (true) {
+      const response = await fetch(`${apiUrl}/jobs/${jobId}`, {
+        credentials: 'include'
+      });
+      const job = await response.json();
+      if (!response.ok) {
+        throw new Error(job.detail || `Error fetching job ${jobId}: ${response.statusText}`);
+      }
+      console.log(`Job ${jobId}: ${job.status} (${job.processed}/${job.total} processed)`);
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+  };
+
+  // Follow a job's server-sent events, showing each email as soon as it is stored.
+  // EventSource reconnects by itself and resumes after the last event received.
+  const followJob = (jobId) => {
+    const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000';
+    if (typeof EventSource === 'undefined') {
+      return waitForJob(jobId);
+    }
+    return new Promise((resolve) => {
+      const source = new EventSource(`${apiUrl}/jobs/${jobId}/events`, { withCredentials: true });
+
+      source.addEventListener('persisted', (event) => {
+        const stored = toFrontendEmail(JSON.parse(event.data));
+        setEmails(prev => [stored, ...prev.filter(e => e.id !== stored.id)]);
+      });
+      source.addEventListener('failed', (event) => {
+        const failure = JSON.parse(event.data);
+        console.warn(`Email ${failure.id} failed${failure.retrying ? ' (retrying)' : ''}: ${failure.error}`);
+      });
+      source.addEventListener('progress', (event) => {
+        const progress = JSON.parse(event.data);
+        console.log(
+          `Job ${jobId}: ${progress.status} (${progress.processed}/${progress.total} processed, ` +
+          `${progress.failed} failed, ${progress.emails_per_second} emails/s)`
+        );
+      });
+      source.addEventListener('done', (event) => {
+        source.close();
+        resolve(JSON.parse(event.data));
+      });
+      source.onerror = () => {
+        // Closed means the server refused the stream (e.g. 404); otherwise it reconnects
+        if (source.readyState === EventSource.CLOSED) {
+          resolve(waitForJob(jobId));
+        }
+      };
+    });
+  };
+
   const processEmails = async (userDataParam = null) => {
     setProcessing(true);
     console.log('processEmails() running');
@@ -915,22 +1033,23 @@ export default function EmailSorterApp() {
       });
       
       if (response.ok) {
-        const result = await response.json();
-        console.log('Response from /emails/process endpoint:', result);
+        // Processing runs as a background job; follow it until it finishes
+        const job = await response.json();
+        console.log('Response from /emails/process endpoint:', job);
+        const result = await followJob(job.job_id);
+        console.log(`Job ${job.job_id} finished with status: ${result.status}`);
         
-       
-        // call   await importEmail( ); with each of the email in the result array
-        for (const email of result) {
-          await importEmail(email);
-        }
-    
+
+        // The processed emails are stored now; reload the list from the database
+        await fetchStoredEmails();
+
         setProcessing(false);
 
         if (result.message) {
           console.log(`Message: ${result.message}`);
         }
-        if (result.length !== undefined) {
-          console.log(`Emails processed: ${result.length}`);
+        if (result.emails !== undefined) {
+          console.log(`Emails processed: ${result.emails.length}`);
         }
 
         if (result.errors && result.errors.length > 0) {
@@ -1212,8 +1331,11 @@ export default function EmailSorterApp() {
     setProcessing(false);
   };
 
-  const handleEmailClick = (email) => {
+  const handleEmailClick = async (email) => {
     setSelectedEmailDetail(email);
+    if (email.body == null) {
+      setSelectedEmailDetail(await fetchEmailBody(email));
+    }
   };
 
   const handleDeleteEmailDetail = async () => {
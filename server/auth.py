@@ -1,7 +1,12 @@
 from fastapi import Depends, HTTPException, status, Cookie
-from sqlalchemy.orm import Session
-from database.database import get_db
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.database import get_async_db
 from models.db_models import UserAccount
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import threading
+import time
 import jwt
 import os
 from dotenv import load_dotenv
@@ -9,16 +14,101 @@ from dotenv import load_dotenv
 load_dotenv()
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 
+# Seconds an authenticated user's record is reused without a query, and how
+# many records are kept. Invalidation is per process, so with several API
+# processes the TTL bounds how long another process may serve a stale record.
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_USER_CACHE_MAX_ENTRIES", "10000"))
 
-def get_current_user(
+
+class UserCache:
+    """
+    Bounded TTL cache of user account columns, keyed by user ID.
+
+    Stores plain column values rather than ORM instances, and hands out a
+    new, session-less UserAccount per lookup, so a handler changing its
+    copy cannot affect other requests.
+    """
+
+    def __init__(self, ttl: float = AUTH_USER_CACHE_TTL, max_entries: int = AUTH_USER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "invalidations": 0}
+        self._columns = [attr.key for attr in inspect(UserAccount).column_attrs]
+
+    def get(self, user_id: int) -> Optional[UserAccount]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self._counters["hits"] += 1
+                return UserAccount(**entry[1])
+            if entry is not None:
+                del self._entries[user_id]
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, user: UserAccount) -> None:
+        values = {key: getattr(user, key) for key in self._columns}
+        with self._lock:
+            self._entries[user.id] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        """
+        Drop a user's record, e.g. after logout or when their tokens change.
+        """
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self._counters["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else 0.0,
+            }
+
+
+user_cache = UserCache()
+
+
+def user_id_from_token(token: Optional[str]) -> Optional[int]:
+    """
+    User ID of a session token, or None if it is missing or invalid.
+    """
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"]).get("userId")
+    except jwt.InvalidTokenError:
+        return None
+
+
+async def get_current_user(
     token: str | None = Cookie(None, alias="token"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> UserAccount:
     # Debug: print the token value
     print(f"Token from cookie: {token[:50] if token else 'None'}...")
     """
     Dependency function to verify JWT token from cookie and get current user.
     Use this in protected endpoints that require authentication.
+
+    The user record comes from user_cache when possible. FastAPI caches
+    dependency results per request, so endpoints and other dependencies
+    asking for it share one lookup.
     
     Example:
         @app.get("/protected")
@@ -43,8 +133,12 @@ def get_current_user(
                 detail="Invalid token payload",
             )
         
+        user = user_cache.get(user_id)
+        if user is not None:
+            return user
+
         # Get user from database
-        user = db.query(UserAccount).filter(UserAccount.id == user_id).first()
+        user = await db.scalar(select(UserAccount).where(UserAccount.id == user_id))
         
         if not user:
             raise HTTPException(
@@ -52,6 +146,7 @@ def get_current_user(
                 detail="User not found",
             )
         
+        user_cache.set(user)
         return user
         
     except jwt.ExpiredSignatureError:
@@ -0,0 +1,59 @@
+"""
+Benchmark: per-message messages.get loop vs. the batch endpoint.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_gmail_batch --messages 200 --latency 0.02
+"""
+import argparse
+import time
+
+from benchmarks.fake_gmail import FakeGmailServer
+from gmail_service import METADATA_HEADERS, _message_to_email, fetch_messages_batch
+
+
+def fetch_one_by_one(service, message_ids):
+    emails = []
+    for message_id in message_ids:
+        message = service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='metadata',
+            metadataHeaders=METADATA_HEADERS
+        ).execute()
+        emails.append(_message_to_email(message))
+    return emails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds per HTTP request')
+    parser.add_argument('--chunk-size', type=int, default=50)
+    args = parser.parse_args()
+
+    with FakeGmailServer(message_count=args.messages, latency=args.latency) as server:
+        service = server.build_service()
+        message_ids = [m['id'] for m in server.messages]
+
+        server.request_count = 0
+        start = time.perf_counter()
+        sequential = fetch_one_by_one(service, message_ids)
+        sequential_time = time.perf_counter() - start
+        sequential_requests = server.request_count
+
+        server.request_count = 0
+        start = time.perf_counter()
+        batched = fetch_messages_batch(service, message_ids, chunk_size=args.chunk_size)
+        batched_time = time.perf_counter() - start
+        batched_requests = server.request_count
+
+    assert batched == sequential, 'batched results differ from the per-message loop'
+
+    print(f'messages: {args.messages}, latency: {args.latency * 1000:.0f} ms/request')
+    print(f'one-by-one: {sequential_time:8.3f} s  ({sequential_requests} HTTP requests)')
+    print(f'batched:    {batched_time:8.3f} s  ({batched_requests} HTTP requests)')
+    print(f'speedup:    {sequential_time / batched_time:8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
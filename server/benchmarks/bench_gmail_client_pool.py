@@ -0,0 +1,88 @@
+"""
+Benchmark: building a Gmail client per call vs. leasing from GmailClientPool.
+
+Measures client construction cost (cold and warm) and end-to-end latency of
+a getProfile call against the local fake Gmail server, where the pooled
+client reuses its keep-alive connection.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_gmail_client_pool --calls 200
+"""
+import argparse
+import copy
+import statistics
+import time
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build, build_from_document
+
+import gmail_service
+from benchmarks.fake_gmail import FakeGmailServer
+from gmail_service import GmailClientPool
+
+
+def _timed(fn, calls):
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label, samples):
+    print(
+        f'{label:<34} first {samples[0]:8.2f} ms   '
+        f'median {statistics.median(samples[1:] or samples):8.3f} ms   '
+        f'p99 {sorted(samples)[int(len(samples) * 0.99) - 1]:8.3f} ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per HTTP request')
+    args = parser.parse_args()
+
+    credentials = Credentials(token='fake-token')
+
+    print('client construction')
+    _report('build() per call', _timed(lambda: build('gmail', 'v1', credentials=credentials), args.calls))
+
+    gmail_service._discovery_doc = None
+    pool = GmailClientPool()
+
+    def lease():
+        with pool.client(1, 'fake-token'):
+            pass
+
+    _report('GmailClientPool lease', _timed(lease, args.calls))
+
+    with FakeGmailServer(message_count=10, latency=args.latency) as server:
+        doc = copy.deepcopy(gmail_service.get_discovery_doc())
+        doc['rootUrl'] = server.url
+
+        print(f'\ngetProfile round trip ({args.latency * 1000:.0f} ms server latency)')
+
+        def unpooled():
+            service = build_from_document(doc, credentials=credentials)
+            service.users().getProfile(userId='me').execute()
+
+        server.connection_count = 0
+        _report('new client per call', _timed(unpooled, args.calls))
+        print(f'{"":<34} {server.connection_count} TCP connections')
+
+        pool = GmailClientPool(discovery_doc=doc)
+
+        def pooled():
+            with pool.client(1, 'fake-token') as service:
+                service.users().getProfile(userId='me').execute()
+
+        server.connection_count = 0
+        _report('pooled client', _timed(pooled, args.calls))
+        print(f'{"":<34} {server.connection_count} TCP connections')
+        print(f'pool stats: {pool.stats}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark: /google-auth login throughput, with and without cached Google
+signing certificates and verified tokens.
+
+"before" verifies every credential the way the endpoint used to: a new
+transport per login, so Google's certificates are downloaded every time.
+"after" is the current app. Both run in-process against a local stand-in
+for the certificate endpoint with --certs-latency per download.
+
+By default every login carries a different token, so only the certificate
+cache helps; pass --tokens lower than --requests to replay tokens, as
+double-submitted or retried logins do.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_google_auth --requests 500 --concurrency 20 --certs-latency 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+CLIENT_ID = 'bench-client.apps.googleusercontent.com'
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--tokens', type=int, default=None, help='distinct ID tokens (default: one per request)')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--certs-latency', type=float, default=50.0, help='ms per certificate download')
+    return parser.parse_args()
+
+
+args = _parse_args()
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmpdir.name}/bench.db'
+os.environ['JWT_SECRET'] = 'bench-secret'
+os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+os.environ['SYNC_ENABLED'] = 'false'
+os.environ['JOB_WORKER_ENABLED'] = 'false'
+
+import httpx
+import uvicorn
+from google.auth.transport import requests as google_requests
+from google.oauth2 import id_token
+
+from benchmarks.fake_google_certs import FakeGoogleCertsServer
+from google_id_tokens import GoogleIdTokenVerifier, GOOGLE_ISSUERS
+
+
+class LegacyVerifier:
+    """
+    The previous verification: a fresh transport and certificate download
+    for every login, and no memory of verified tokens.
+    """
+
+    def __init__(self, certs_url: str):
+        self.certs_url = certs_url
+
+    def cached(self, credential, audience):
+        return None
+
+    def verify(self, credential, audience):
+        idinfo = id_token.verify_token(credential, google_requests.Request(), audience=audience, certs_url=self.certs_url)
+        if idinfo.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError('Wrong issuer')
+        return idinfo
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _load(url: str, credentials, concurrency: int):
+    latencies = []
+    remaining = iter(credentials)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def _client():
+            for credential in remaining:
+                start = time.perf_counter()
+                response = await client.post(url, json={'credential': credential, 'client_id': CLIENT_ID})
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(_client() for _ in range(concurrency)))
+        return latencies, time.perf_counter() - start
+
+
+def measure(api, verifier, label: str, credentials, certs: FakeGoogleCertsServer):
+    api.google_id_tokens = verifier
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(api.app, host='127.0.0.1', port=port, log_level='warning'))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    downloads = certs.request_count
+    try:
+        # The endpoint prints debug lines per request; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, elapsed = asyncio.run(_load(f'http://127.0.0.1:{port}/google-auth', credentials, args.concurrency))
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    latencies.sort()
+    print(
+        f'{label:<7} p50 {statistics.median(latencies):8.1f} ms   '
+        f'p99 {latencies[int(len(latencies) * 0.99) - 1]:8.1f} ms   '
+        f'{len(credentials) / elapsed:7.0f} logins/s   '
+        f'cert downloads {certs.request_count - downloads}'
+    )
+
+
+def main():
+    with FakeGoogleCertsServer(latency=args.certs_latency / 1000) as certs:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main as api
+
+        tokens = [
+            certs.id_token(CLIENT_ID, f'user{i % args.users}@example.com')
+            for i in range(args.tokens or args.requests)
+        ]
+        credentials = [tokens[i % len(tokens)] for i in range(args.requests)]
+
+        print(
+            f'\nlogins: {args.requests}, concurrency: {args.concurrency}, distinct tokens: {len(tokens)}, '
+            f'{args.certs_latency:g} ms per certificate download'
+        )
+        # Create the users up front so both runs do the same database work
+        measure(api, LegacyVerifier(certs.certs_url), 'warm-up', tokens[:args.users], certs)
+        measure(api, LegacyVerifier(certs.certs_url), 'before', credentials, certs)
+        after = GoogleIdTokenVerifier(certs_url=certs.certs_url)
+        measure(api, after, 'after', credentials, certs)
+        print(f'after stats: {after.stats}')
+
+
+if __name__ == '__main__':
+    main()
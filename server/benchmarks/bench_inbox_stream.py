@@ -0,0 +1,140 @@
+"""
+Benchmark: /emails/inbox as one JSON array vs. streamed NDJSON.
+
+Runs the API in-process against the local Gmail stand-in and requests
+growing max_results both ways. Reports time to first byte, total time and
+the server's peak traced memory during the request (measured in a separate
+pass, since tracing slows everything down).
+
+Usage (from the server directory):
+    python -m benchmarks.bench_inbox_stream --sizes 100 500 2000 --latency 0.02
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{_tmpdir.name}/bench.db')
+os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+os.environ['JWT_SECRET'] = 'bench-secret'
+os.environ['SYNC_ENABLED'] = 'false'
+os.environ['JOB_WORKER_ENABLED'] = 'false'
+# Traced requests run far slower than the default Google call timeout allows
+os.environ['GOOGLE_IO_TIMEOUT'] = '600'
+
+import httpx
+import jwt
+from googleapiclient import discovery_cache
+
+from benchmarks.fake_gmail import FakeGmailServer
+
+ADDRESS = 'me@example.com'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _request(client: httpx.Client, url: str, max_results: int, stream: bool, keep: bool = True):
+    """
+    (ms to first byte, ms total, emails received). With keep=False the body
+    is discarded as it arrives, so the client adds nothing to the memory
+    traced in this process, and the email count is not known.
+    """
+    body = {
+        'gmail_address': ADDRESS,
+        'timestamp': (datetime.now(timezone.utc) - timedelta(days=3650)).isoformat(),
+        'max_results': max_results,
+    }
+    headers = {'Accept': 'application/x-ndjson'} if stream else {}
+    start = time.perf_counter()
+    with client.stream('POST', url, json=body, headers=headers) as response:
+        assert response.status_code == 200, response.read()
+        chunks = response.iter_bytes()
+        data = next(chunks, b'')
+        first_byte = time.perf_counter() - start
+        if keep:
+            data += b''.join(chunks)
+        else:
+            for _ in chunks:
+                pass
+    total = time.perf_counter() - start
+    if not keep:
+        return first_byte * 1000, total * 1000, None
+    count = len(data.splitlines()) if stream else len(json.loads(data))
+    return first_byte * 1000, total * 1000, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000], help='max_results values')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds per Gmail request')
+    args = parser.parse_args()
+
+    with FakeGmailServer(message_count=max(args.sizes), latency=args.latency) as gmail:
+        import uvicorn
+        import gmail_service
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main as api
+        from database.database import SessionLocal
+        from models.db_models import UserAccount
+
+        doc = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        doc['rootUrl'] = gmail.url
+        gmail_service.client_pool = gmail_service.GmailClientPool(discovery_doc=doc)
+
+        db = SessionLocal()
+        db.add(UserAccount(id=1, gmail_address=ADDRESS, access_token='fake-token'))
+        db.commit()
+        db.close()
+
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(api.app, host='127.0.0.1', port=port, log_level='warning'))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        url = f'http://127.0.0.1:{port}/emails/inbox'
+        token = jwt.encode({'userId': 1, 'email': ADDRESS}, 'bench-secret', algorithm='HS256')
+        results = {}
+        try:
+            with httpx.Client(cookies={'token': token}, timeout=300) as client, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                _request(client, url, 10, stream=False)  # warm up the client pool
+                for size in args.sizes:
+                    for stream in (False, True):
+                        results[size, stream] = list(_request(client, url, size, stream))
+                tracemalloc.start()
+                for size in args.sizes:
+                    for stream in (False, True):
+                        tracemalloc.reset_peak()
+                        baseline = tracemalloc.get_traced_memory()[0]
+                        _request(client, url, size, stream, keep=False)
+                        results[size, stream].append((tracemalloc.get_traced_memory()[1] - baseline) / 2 ** 20)
+                tracemalloc.stop()
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    print(f'\nGmail latency {args.latency * 1000:.0f} ms per request')
+    print(f'{"max_results":>11} {"mode":<7} {"first byte":>12} {"total":>11} {"emails":>7} {"peak memory":>12}')
+    for size in args.sizes:
+        for stream in (False, True):
+            first_byte, total, count, memory = results[size, stream]
+            mode = 'ndjson' if stream else 'array'
+            print(f'{size:>11} {mode:<7} {first_byte:9.0f} ms {total:8.0f} ms {count:>7} {memory:9.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: two-call (summarize + categorize) vs. combined structured LLM mode.
+
+Runs the email pipeline against a local fake OpenAI server and compares
+round trips, prompt/completion tokens and wall-clock time.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_llm_modes --emails 50 --latency 0.3
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+os.environ['LLM_CACHE_PERSISTENT'] = 'false'
+
+from benchmarks.fake_openai import FakeOpenAIServer
+
+
+CATEGORIES = [
+    ('Work', 'Emails from colleagues, meetings and project updates'),
+    ('Newsletters', 'Marketing emails, newsletters and promotional content'),
+    ('Billing', 'Invoices, receipts and account statements'),
+]
+
+
+def responder(messages, json_mode):
+    if json_mode:
+        return json.dumps({'summary': 'A short summary of the email.', 'category_id': 1, 'confidence': 0.9})
+    if messages[0]['content'].startswith('Summarize'):
+        return 'A short summary of the email.'
+    return 'Work'
+
+
+def sample_emails(count):
+    return [
+        {
+            'id': f'msg{i:04d}',
+            'subject': f'Project status update #{i}',
+            'sender': 'colleague@example.com',
+            'body': (
+                'Hi team, here is the weekly status update. The migration is on track, '
+                'the dashboard redesign is in review, and we need two more reviewers '
+                'for the API changes before Friday. Regards, Alex.'
+            ),
+            'received_at': None,
+        }
+        for i in range(count)
+    ]
+
+
+async def run(mode, emails, concurrency):
+    from email_processing import analyze_emails
+    from llm_cache import llm_cache
+    from utils import llm_clients
+
+    # Each mode starts cold, or the second would be answered from the cache
+    llm_cache.clear()
+    before = dict(llm_clients.stats)
+    start = time.perf_counter()
+    analyzed, errors = await analyze_emails(1, emails, concurrency=concurrency, mode=mode)
+    elapsed = time.perf_counter() - start
+    assert not errors, errors
+    used = {key: llm_clients.stats[key] - before[key] for key in before}
+    return elapsed, used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--emails', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.3, help='seconds per LLM request')
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    with FakeOpenAIServer(responder, latency=args.latency) as server:
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+
+        from database.database import SessionLocal, init_db
+        from models.db_models import Category, UserAccount
+
+        init_db()
+        db = SessionLocal()
+        db.add(UserAccount(id=1, gmail_address='me@example.com'))
+        db.add_all(Category(name=name, description=desc, account_id=1) for name, desc in CATEGORIES)
+        db.commit()
+        db.close()
+
+        emails = sample_emails(args.emails)
+
+        async def compare():
+            from utils import llm_clients
+            results = {mode: await run(mode, emails, args.concurrency) for mode in ('two_call', 'combined')}
+            await llm_clients.aclose()
+            return results
+
+        results = asyncio.run(compare())
+
+    print(f'\nemails: {args.emails}, latency: {args.latency * 1000:.0f} ms/request, concurrency: {args.concurrency}')
+    for mode, (elapsed, used) in results.items():
+        print(
+            f'{mode:<9} {elapsed:7.2f} s  {used["requests"]:4d} requests  '
+            f'{used["input_tokens"]:6d} input tokens  {used["output_tokens"]:5d} output tokens'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark: LLM calls saved by the local first-tier categorizer, and its
+accuracy, on the labelled fixture set of benchmarks/email_fixtures.py.
+
+Seeds an account with --train categorized fixture emails, then categorizes
+--test held-out fixture emails:
+
+1. directly with the local model, at several confidence thresholds:
+   the share of emails decided locally and their accuracy;
+2. end to end through analyze_emails() against a fake OpenAI server that
+   always answers with the correct category, with the local classifier off
+   and on: LLM requests, categorization requests, tokens and accuracy.
+   Since the stand-in LLM is never wrong, any accuracy lost is the local
+   classifier's.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_local_classifier --train 1000 --test 500
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmpdir.name}/bench.db'
+os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+os.environ['LLM_CACHE_PERSISTENT'] = 'false'
+# Measure the classifier alone
+os.environ['SENDER_RULES_ENABLED'] = 'false'
+
+import numpy as np
+
+from benchmarks.email_fixtures import CATEGORIES, labelled_emails
+from benchmarks.fake_openai import FakeOpenAIServer
+
+THRESHOLDS = [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+
+
+def _key(content: str) -> tuple:
+    email = json.loads(content)
+    return email['subject'], email['body']
+
+
+class Oracle:
+    """
+    Responder of a perfectly accurate LLM for the fixture emails, counting
+    the requests that ask for a category.
+    """
+
+    def __init__(self, truth: dict, category_ids: dict):
+        self.truth = truth
+        self.category_ids = category_ids
+        self.categorizations = 0
+
+    def __call__(self, messages, json_mode):
+        system, content = messages[0]['content'], messages[-1]['content']
+        if system.startswith('Summarize the following email content:'):
+            return 'A short summary of the email.'
+        self.categorizations += 1
+        label = self.truth[_key(content)]
+        if json_mode:
+            return json.dumps({
+                'summary': 'A short summary of the email.',
+                'category_id': self.category_ids[label],
+                'confidence': 0.9,
+            })
+        return label
+
+
+def seed(train) -> dict:
+    from database.database import SessionLocal, init_db
+    from models.db_models import Category, Email, UserAccount
+
+    init_db()
+    db = SessionLocal()
+    db.add(UserAccount(id=1, gmail_address='me@example.com'))
+    categories = [Category(name=name, description=description, account_id=1) for name, description in CATEGORIES]
+    db.add_all(categories)
+    db.flush()
+    category_ids = {cat.name: cat.id for cat in categories}
+    db.add_all(
+        Email(gmail_msg_id=email['id'], account_id=1, category_id=category_ids[label],
+              subject=email['subject'], sender=email['sender'], body=email['body'], summary='')
+        for email, label in train
+    )
+    db.commit()
+    db.close()
+    return category_ids
+
+
+def sweep(test, category_ids) -> list:
+    from local_classifier import local_classifier
+    from utils import load_categories
+
+    model = local_classifier.model(1, load_categories(1))
+    start = time.perf_counter()
+    predicted, confidence = model.predict([email for email, _ in test])
+    elapsed = time.perf_counter() - start
+    truth = np.array([category_ids[label] for _, label in test])
+    rows = []
+    for threshold in THRESHOLDS:
+        local = confidence >= threshold
+        accuracy = float(np.mean(predicted[local] == truth[local])) if local.any() else float('nan')
+        rows.append((threshold, float(local.mean()), accuracy))
+    return rows, elapsed
+
+
+async def pipeline(test, category_ids, oracle: Oracle, mode: str, enabled: bool, concurrency: int):
+    import email_processing
+    from llm_cache import llm_cache
+    from utils import llm_clients
+
+    llm_cache.clear()
+    email_processing.LOCAL_CLASSIFIER_ENABLED = enabled
+    before = dict(llm_clients.stats, categorizations=oracle.categorizations)
+    start = time.perf_counter()
+    analyzed, errors = await email_processing.analyze_emails(
+        1, [email for email, _ in test], concurrency=concurrency, mode=mode
+    )
+    elapsed = time.perf_counter() - start
+    assert not errors, errors
+    used = {key: llm_clients.stats[key] - before[key] for key in llm_clients.stats}
+    used['categorizations'] = oracle.categorizations - before['categorizations']
+    truth = {email['id']: category_ids[label] for email, label in test}
+    accuracy = sum(email['category_id'] == truth[email['id']] for email in analyzed) / len(analyzed)
+    return elapsed, used, accuracy
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--train', type=int, default=1000, help='categorized emails of the account')
+    parser.add_argument('--test', type=int, default=500, help='emails to categorize')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per LLM request')
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args()
+
+    train = labelled_emails(args.train, seed=1)
+    test = labelled_emails(args.test, seed=2)
+    category_ids = seed(train)
+    truth = {(email['subject'], email['body']): label for email, label in test}
+
+    from local_classifier import LOCAL_CLASSIFIER_THRESHOLD, local_classifier
+    rows, predict_time = sweep(test, category_ids)
+
+    oracle = Oracle(truth, category_ids)
+    with FakeOpenAIServer(oracle, latency=args.latency) as server:
+        os.environ['OPENAI_BASE_URL'] = server.base_url
+
+        async def compare():
+            from utils import llm_clients
+            results = {}
+            for mode in ('two_call', 'combined'):
+                for enabled in (False, True):
+                    results[mode, enabled] = await pipeline(
+                        test, category_ids, oracle, mode, enabled, args.concurrency
+                    )
+            await llm_clients.aclose()
+            return results
+
+        # Keep the pipeline's per-email prints out of the report
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = asyncio.run(compare())
+
+    print(f'\n{args.train} training emails, {args.test} test emails, {len(CATEGORIES)} categories')
+    print(f'local model: built in {local_classifier.stats["build_seconds"] * 1000:.0f} ms, '
+          f'classified the test set in {predict_time * 1000:.0f} ms')
+    print(f'\n{"threshold":>9} {"decided locally":>16} {"local accuracy":>15}')
+    for threshold, share, accuracy in rows:
+        print(f'{threshold:9.1f} {share:15.1%} {accuracy:15.1%}')
+
+    print(f'\nend to end at LOCAL_CLASSIFIER_THRESHOLD={LOCAL_CLASSIFIER_THRESHOLD}, '
+          f'LLM latency {args.latency * 1000:.0f} ms')
+    print(f'{"mode":<9} {"local":<6} {"requests":>8} {"categorize":>10} {"input tokens":>12} '
+          f'{"output tokens":>13} {"time":>8} {"accuracy":>9}')
+    for (mode, enabled), (elapsed, used, accuracy) in results.items():
+        print(f'{mode:<9} {"on" if enabled else "off":<6} {used["requests"]:8d} {used["categorizations"]:10d} '
+              f'{used["input_tokens"]:12d} {used["output_tokens"]:13d} {elapsed:7.2f}s {accuracy:9.1%}')
+
+
+if __name__ == '__main__':
+    main()
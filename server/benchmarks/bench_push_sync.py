@@ -0,0 +1,119 @@
+"""
+Benchmark: push-triggered incremental sync.
+
+Runs the API, and its job worker, in-process against local Gmail and OpenAI
+stand-ins. New mail is delivered in bursts, and the fake Pub/Sub pusher
+posts one notification per message, as Gmail does. Reports how many
+notifications were coalesced into each queued sync job, the Gmail requests
+spent, and the delay from delivery until the burst is stored.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_push_sync --bursts 5 --burst-size 10
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+# A file, so the API's async engine and the sync workers share the database
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ.setdefault('DATABASE_URL', f'sqlite:///{_tmpdir.name}/bench.db')
+os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+os.environ.setdefault('JWT_SECRET', 'bench-secret')
+os.environ['GMAIL_PUSH_TOPIC'] = 'projects/local/topics/gmail'
+os.environ['GMAIL_PUSH_TOKEN'] = 'bench-push-token'
+os.environ['SYNC_ENABLED'] = 'false'
+os.environ['JOB_WORKER_ENABLED'] = 'true'
+os.environ.setdefault('JOB_POLL_INTERVAL', '0.05')
+
+from googleapiclient import discovery_cache
+
+from benchmarks.bench_llm_modes import responder, CATEGORIES
+from benchmarks.fake_gmail import FakeGmailServer
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_pubsub import FakePubSubPusher
+
+ADDRESS = 'me@example.com'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bursts', type=int, default=5)
+    parser.add_argument('--burst-size', type=int, default=10, help='messages (and notifications) per burst')
+    parser.add_argument('--gmail-latency', type=float, default=0.02)
+    parser.add_argument('--llm-latency', type=float, default=0.2)
+    parser.add_argument('--debounce', type=float, default=0.5)
+    args = parser.parse_args()
+    os.environ['PUSH_DEBOUNCE_SECONDS'] = str(args.debounce)
+
+    with FakeGmailServer(message_count=20, latency=args.gmail_latency) as gmail, \
+            FakeOpenAIServer(responder, latency=args.llm_latency) as openai:
+        os.environ['OPENAI_BASE_URL'] = openai.base_url
+
+        import uvicorn
+        import gmail_service
+        import main as api
+        from database.database import SessionLocal
+        from models.db_models import Category, Email, UserAccount
+
+        doc = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        doc['rootUrl'] = gmail.url
+        gmail_service.client_pool = gmail_service.GmailClientPool(discovery_doc=doc)
+
+        db = SessionLocal()
+        db.add(UserAccount(id=1, gmail_address=ADDRESS, access_token='fake-token', last_history_id=gmail.history_id))
+        db.add_all(Category(name=name, description=desc, account_id=1) for name, desc in CATEGORIES)
+        db.commit()
+
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(api.app, host='127.0.0.1', port=port, log_level='warning'))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        pusher = FakePubSubPusher(f'http://127.0.0.1:{port}/gmail/push', os.environ['GMAIL_PUSH_TOKEN'])
+        delays = []
+        requests_before = gmail.request_count
+        try:
+            for burst in range(args.bursts):
+                start = time.perf_counter()
+                for _ in range(args.burst_size):
+                    history_id = gmail.deliver(1)
+                    pusher.push(ADDRESS, history_id)
+                expected = (burst + 1) * args.burst_size
+                while db.query(Email).count() < expected:
+                    time.sleep(0.02)
+                delays.append(time.perf_counter() - start)
+                # One stale notification per burst, as Pub/Sub redelivery would send
+                pusher.push(ADDRESS, history_id)
+                time.sleep(args.debounce * 2)
+        finally:
+            pusher.close()
+            server.should_exit = True
+            thread.join()
+
+        account = db.get(UserAccount, 1)
+        stats = api.push_syncs.stats
+        print(f'\nbursts: {args.bursts} x {args.burst_size} messages, debounce: {args.debounce * 1000:.0f} ms')
+        print(f'notifications sent:   {pusher.sent}')
+        print(f'push stats:           {stats}')
+        print(f'emails stored:        {db.query(Email).count()}')
+        print(f'gmail requests:       {gmail.request_count - requests_before}')
+        print(f'delivery -> stored:   median {statistics.median(delays):.2f} s, max {max(delays):.2f} s')
+        print(f'watch expiration:     {account.watch_expiration}')
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
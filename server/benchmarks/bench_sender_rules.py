@@ -0,0 +1,191 @@
+"""
+Benchmark: emails routed by sender/domain rules instead of the LLM, and
+the accuracy of those rules, on the labelled fixture set of
+benchmarks/email_fixtures.py.
+
+1. Agreement sweep: an account with --train categorized emails routes
+   --test new ones at several SENDER_RULES_AGREEMENT values.
+2. Incremental learning: a new account receives --stream emails in batches
+   of --batch. Emails no rule matches get their correct category (as from
+   a perfect LLM). Every batch is stored with upsert_emails(), which
+   updates the index with the emails the LLM categorized. Reports the hit rate per stretch of the stream and
+   the cost of an update against a rebuild.
+3. Tiers together: LLM categorizations left for the --test emails after
+   sender rules alone, then with the local classifier as well.
+
+Usage (from the server directory):
+    python -m benchmarks.bench_sender_rules --train 1000 --test 500 --stream 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmpdir.name}/bench.db'
+os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+
+from benchmarks.email_fixtures import CATEGORIES, labelled_emails
+
+AGREEMENTS = [0.6, 0.7, 0.8, 0.9, 0.95, 1.0]
+
+
+def _rate(hits: int, total: int) -> str:
+    return f'{hits / total:7.1%}' if total else '      -'
+
+
+def create_account(account_id: int) -> dict:
+    from database.database import SessionLocal
+    from models.db_models import Category, UserAccount
+
+    db = SessionLocal()
+    db.add(UserAccount(id=account_id, gmail_address=f'user{account_id}@example.com'))
+    categories = [Category(name=name, description=description, account_id=account_id)
+                  for name, description in CATEGORIES]
+    db.add_all(categories)
+    db.commit()
+    category_ids = {cat.name: cat.id for cat in categories}
+    db.close()
+    return category_ids
+
+
+def store(account_id: int, emails: list) -> None:
+    from database.database import SessionLocal
+    from email_store import upsert_emails
+
+    db = SessionLocal()
+    try:
+        upsert_emails(db, account_id, emails)
+    finally:
+        db.close()
+
+
+def routed_accuracy(routes, test, category_ids):
+    hits = [(route, label) for route, (_, label) in zip(routes, test) if route is not None]
+    correct = sum(route['category_id'] == category_ids[label] for route, label in hits)
+    return len(hits), correct
+
+
+def sweep(test, category_ids):
+    from sender_rules import SenderRules
+    from utils import load_categories
+
+    categories = load_categories(1)
+    rows = []
+    for agreement in AGREEMENTS:
+        routes = SenderRules(agreement=agreement).route(1, [email for email, _ in test], categories)
+        rows.append((agreement, *routed_accuracy(routes, test, category_ids)))
+    return rows
+
+
+def stream(emails, batch: int):
+    from sender_rules import build_index, sender_rules
+    from database.database import SessionLocal
+    from utils import load_categories
+
+    category_ids = create_account(2)
+    categories = load_categories(2)
+    # Hit rate per quarter of the stream
+    quarter = max(batch, len(emails) // 4)
+    next_mark = quarter
+    stretches = []
+    hits = correct = seen = 0
+    for start in range(0, len(emails), batch):
+        chunk = emails[start:start + batch]
+        routes = sender_rules.route(2, [email for email, _ in chunk], categories)
+        stored = []
+        for route, (email, label) in zip(routes, chunk):
+            if route is not None:
+                hits += 1
+                correct += route['category_id'] == category_ids[label]
+                stored.append({**email, 'category_id': route['category_id'], 'category_source': 'sender_rule'})
+            else:
+                stored.append({**email, 'category_id': category_ids[label], 'category_source': 'llm'})
+        seen += len(chunk)
+        store(2, stored)
+        if seen >= next_mark or seen == len(emails):
+            stretches.append((seen, hits, correct))
+            hits = correct = 0
+            next_mark += quarter
+
+    # What upsert_emails() adds to every batch, against rebuilding instead
+    db = SessionLocal()
+    began = time.perf_counter()
+    index = build_index(db, 2, 'bench')
+    rebuild = time.perf_counter() - began
+    db.close()
+    rows = [{'sender': email['sender'], 'category_id': 1} for email, _ in emails]
+    began = time.perf_counter()
+    for row in rows:
+        index.add(row['sender'], row['category_id'])
+    update = (time.perf_counter() - began) / len(rows) * batch
+    return stretches, update, rebuild
+
+
+def tiers(test, category_ids):
+    from local_classifier import local_classifier
+    from sender_rules import SenderRules
+    from utils import load_categories
+
+    categories = load_categories(1)
+    emails = [email for email, _ in test]
+    routes = SenderRules().route(1, emails, categories)
+    remaining = [email for email, route in zip(emails, routes) if route is None]
+    local = local_classifier.classify(1, remaining, categories)
+    predictions = iter(local)
+    combined = [route if route is not None else next(predictions) for route in routes]
+    return (
+        sum(route is None for route in routes),
+        sum(prediction is None for prediction in combined),
+        routed_accuracy(combined, test, category_ids),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--train', type=int, default=1000, help='categorized emails of the first account')
+    parser.add_argument('--test', type=int, default=500, help='new emails to route')
+    parser.add_argument('--stream', type=int, default=2000, help='emails received by the second account')
+    parser.add_argument('--batch', type=int, default=20, help='emails per stored batch')
+    parser.add_argument('--sender-noise', type=float, default=0.05,
+                        help='share of emails from a sender usually in another category')
+    args = parser.parse_args()
+
+    from database.database import init_db
+    from sender_rules import SENDER_RULES_AGREEMENT, SENDER_RULES_MIN_EMAILS
+
+    init_db()
+    category_ids = create_account(1)
+    train = labelled_emails(args.train, seed=1, sender_noise=args.sender_noise)
+    store(1, [{**email, 'category_id': category_ids[label]} for email, label in train])
+    test = labelled_emails(args.test, seed=2, sender_noise=args.sender_noise)
+
+    rows = sweep(test, category_ids)
+    stretches, record, rebuild = stream(labelled_emails(args.stream, seed=3, sender_noise=args.sender_noise), args.batch)
+    after_rules, after_local, (decided, correct) = tiers(test, category_ids)
+
+    print(f'\n{len(CATEGORIES)} categories, {args.sender_noise:.0%} of emails from a sender usually in '
+          f'another category, rules need {SENDER_RULES_MIN_EMAILS} emails')
+    print(f'\n1. {args.train} categorized emails, {args.test} new emails')
+    print(f'{"agreement":>9} {"hit rate":>9} {"accuracy":>9}')
+    for agreement, hits, correct_hits in rows:
+        print(f'{agreement:9.2f} {_rate(hits, args.test):>9} {_rate(correct_hits, hits):>9}')
+
+    print(f'\n2. new account receiving {args.stream} emails in batches of {args.batch} '
+          f'(agreement {SENDER_RULES_AGREEMENT})')
+    print(f'{"emails":>13} {"hit rate":>9} {"accuracy":>9}')
+    previous = 0
+    for seen, hits, correct_hits in stretches:
+        print(f'{previous + 1:>6}-{seen:<6} {_rate(hits, seen - previous):>9} {_rate(correct_hits, hits):>9}')
+        previous = seen
+    print(f'index update per batch: {record * 1000:.3f} ms; '
+          f'rebuilding it from {args.stream} stored emails: {rebuild * 1000:.1f} ms')
+
+    print(f'\n3. LLM categorizations for the {args.test} new emails')
+    print(f'without local tiers      {args.test:5d}')
+    print(f'after sender rules       {after_rules:5d}')
+    print(f'after the classifier too {after_local:5d}   (accuracy of local decisions: {_rate(correct, decided).strip()})')
+
+
+if __name__ == '__main__':
+    main()
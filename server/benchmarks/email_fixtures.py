@@ -0,0 +1,144 @@
+"""
+Labelled synthetic emails for evaluating categorization offline.
+
+Each category has its own senders, subject templates and phrases, but they
+share a vocabulary of filler, greetings and a few cross-category phrases
+("your account", "update"), senders on common webmail domains, and a share
+of emails that borrow phrases from another category. Generation is seeded,
+so the same arguments always give the same fixture set.
+"""
+from typing import Dict, List, Optional, Tuple
+import random
+
+CATEGORIES = [
+    ('Work', 'Emails from colleagues: meetings, project updates, code reviews and deadlines'),
+    ('Newsletters', 'Newsletters, digests, marketing and promotional emails'),
+    ('Billing', 'Invoices, receipts, payments and account statements'),
+    ('Travel', 'Flight, hotel and rental car bookings and itineraries'),
+    ('Social', 'Friends and family, invitations and social network notifications'),
+    ('Security', 'Sign-in alerts, password resets and verification codes'),
+]
+
+_SENDERS = {
+    'Work': ['alex@acme-corp.com', 'priya@acme-corp.com', 'jira@acme-corp.atlassian.net',
+             'github-noreply@github.com', 'sam.lee@gmail.com'],
+    'Newsletters': ['news@substack.com', 'digest@medium.com', 'deals@shopnow.com',
+                    'hello@producthunt.com', 'weekly@techcrunch.com', 'offers@airline-miles.com'],
+    'Billing': ['billing@stripe.com', 'receipts@uber.com', 'invoice@hosting.io',
+                'statements@bank.example', 'noreply@paypal.com'],
+    'Travel': ['bookings@airline.example', 'reservations@hotels.com', 'itinerary@expedia.com',
+               'noreply@rentacar.example', 'trips@airbnb.com'],
+    'Social': ['mom.smith@gmail.com', 'jordan.k@yahoo.com', 'notify@facebookmail.com',
+               'invitations@linkedin.com', 'events@meetup.com'],
+    'Security': ['no-reply@accounts.google.com', 'security@github.com', 'account-security@microsoft.com',
+                 'verify@paypal.com', 'alerts@bank.example'],
+}
+
+_SUBJECTS = {
+    'Work': ['Sprint planning for {project}', 'Re: {project} design review', 'Standup notes {date}',
+             '[{project}] Pull request #{n} needs review', 'Deadline moved for {project}', 'Q{q} roadmap draft'],
+    'Newsletters': ['This week in {topic}', 'Your {topic} digest', '{pct}% off everything this weekend',
+                    'Top stories in {topic}', 'New in {topic}: issue #{n}', 'Last chance: sale ends tonight'],
+    'Billing': ['Your receipt from {vendor}', 'Invoice #{n} is due', 'Payment received - thank you',
+                'Your {month} statement is ready', 'Subscription renewal for {vendor}', 'Refund processed'],
+    'Travel': ['Your flight to {city} is confirmed', 'Booking confirmation #{n}', 'Check in now for your trip to {city}',
+               'Your hotel reservation in {city}', 'Itinerary update: {city}', 'Rental car pickup details'],
+    'Social': ['{name} invited you to a party', 'Photos from the weekend', '{name} commented on your post',
+               'Dinner on Saturday?', 'Happy birthday!', '{name} wants to connect'],
+    'Security': ['New sign-in to your account', 'Your verification code is {n}', 'Password reset request',
+                 'Security alert: new device', 'Confirm your email address', 'Unusual activity detected'],
+}
+
+_PHRASES = {
+    'Work': ['please review the attached spec', 'can we move the meeting to tomorrow', 'the release is blocked on QA',
+             'I pushed the fix to the branch', 'let us sync on the roadmap', 'the deadline for the milestone',
+             'action items from the retro', 'the customer escalation', 'merge after CI passes',
+             'the staging deploy failed', 'headcount planning for next quarter', 'update the project tracker'],
+    'Newsletters': ['read the full story on our site', 'unsubscribe from this list', 'top picks for you this week',
+                    'limited time offer', 'shop the collection', 'in this issue we cover', 'sponsored by',
+                    'trending articles', 'use code SAVE at checkout', 'forward this to a friend',
+                    'new arrivals just dropped', 'our editors recommend'],
+    'Billing': ['amount due', 'payment method on file', 'your card ending in 4242 was charged', 'view invoice online',
+                'total including tax', 'billing period', 'the balance of your account', 'receipt number',
+                'auto renewal is on', 'download the PDF statement', 'refund to your original payment method',
+                'late fee may apply'],
+    'Travel': ['departure gate and boarding time', 'confirmation code', 'baggage allowance', 'check-in opens 24 hours before',
+               'your seat assignment', 'hotel check-in after 3 pm', 'cancellation policy', 'pick up your rental at the counter',
+               'the itinerary for your trip', 'flight number', 'layover in', 'reservation details'],
+    'Social': ['hope you are doing well', 'we would love to see you', 'bring the kids', 'it has been too long',
+               'see the photos', 'liked your post', 'RSVP by Friday', 'call me when you can',
+               'so proud of you', 'catch up over coffee', 'the family reunion', 'tagged you in a photo'],
+    'Security': ['if this was not you', 'secure your account', 'enter this code to continue', 'the code expires in 10 minutes',
+                 'we noticed a new sign-in', 'reset your password', 'two-step verification', 'from a new device',
+                 'location and IP address', 'we will never ask for your password', 'review recent activity',
+                 'verify it is you'],
+}
+
+_SHARED = ['your account', 'update', 'thanks', 'let me know', 'click the link below', 'as soon as possible',
+           'we wanted to let you know', 'have a great week', 'questions? reply to this email', 'details below',
+           'view in browser', 'regards']
+_FILLER = ('the a to of and in for on with this that is be at by from as your you we our it'
+           ' will can more about new time today next here').split()
+_VALUES = {
+    'project': ['Apollo', 'Atlas', 'billing service', 'mobile app', 'data pipeline', 'Phoenix'],
+    'topic': ['AI', 'design', 'startups', 'cooking', 'finance', 'travel deals', 'security news'],
+    'vendor': ['Netflix', 'AWS', 'Spotify', 'Dropbox', 'the gym', 'Adobe'],
+    'city': ['Lisbon', 'Tokyo', 'New York', 'Berlin', 'Austin', 'Nairobi'],
+    'name': ['Jordan', 'Maria', 'Chen', 'Aisha', 'Tom', 'Lena'],
+    'month': ['January', 'February', 'March', 'April', 'May', 'June'],
+}
+
+
+def _fill(rng: random.Random, template: str) -> str:
+    return template.format(
+        n=rng.randint(100, 99999), q=rng.randint(1, 4), pct=rng.choice([10, 20, 30, 50]),
+        date=f'{rng.randint(1, 28)}/{rng.randint(1, 12)}',
+        **{key: rng.choice(values) for key, values in _VALUES.items()},
+    )
+
+
+def _email(rng: random.Random, n: int, category: str, borrow: float, sender_noise: float) -> Dict:
+    other = rng.choice([name for name, _ in CATEGORIES if name != category])
+    sentences = []
+    for _ in range(rng.randint(3, 8)):
+        roll = rng.random()
+        if roll < borrow:
+            source = _PHRASES[other]
+        elif roll < borrow + 0.25:
+            source = _SHARED
+        else:
+            source = _PHRASES[category]
+        words = rng.choice(source).split() + rng.sample(_FILLER, rng.randint(2, 8))
+        rng.shuffle(words)
+        sentences.append(' '.join(words).capitalize() + '.')
+    if rng.random() < sender_noise:
+        sender = rng.choice(_SENDERS[other])
+    else:
+        sender = rng.choice(_SENDERS[category])
+    return {
+        'id': f'fixture{n:06d}',
+        'subject': _fill(rng, rng.choice(_SUBJECTS[category])),
+        'sender': f'"{sender.split("@")[0].title()}" <{sender}>',
+        'body': ' '.join(sentences),
+        'received_at': None,
+    }
+
+
+def labelled_emails(
+    count: int,
+    seed: int = 1,
+    borrow: float = 0.3,
+    sender_noise: Optional[float] = None
+) -> List[Tuple[Dict, str]]:
+    """
+    `count` (email, category name) pairs. Categories are imbalanced, as in
+    a real inbox; `borrow` is the share of phrases taken from another
+    category, `sender_noise` (default: `borrow`) the share of senders.
+    """
+    if sender_noise is None:
+        sender_noise = borrow
+    rng = random.Random(seed)
+    names = [name for name, _ in CATEGORIES]
+    weights = [5, 8, 3, 2, 3, 2]
+    labels = rng.choices(names, weights=weights, k=count)
+    return [(_email(rng, seed * 1_000_000 + n, label, borrow, sender_noise), label) for n, label in enumerate(labels)]
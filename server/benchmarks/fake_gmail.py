@@ -0,0 +1,203 @@
+"""
+Local stand-in for the Gmail API used by the benchmarks.
+
+Serves a fixed mailbox over HTTP with an artificial per-request latency so
+that round trips dominate, the same way they do against the real API.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from email.parser import BytesParser
+from email.policy import HTTP
+from urllib.parse import urlparse, parse_qs
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import json
+import socket
+import threading
+import time
+import uuid
+
+from google.oauth2.credentials import Credentials
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+
+class FakeGmailServer:
+    """
+    Threaded HTTP server that answers getProfile, paginated messages.list,
+    messages.get, history.list, watch and the batch endpoint for a mailbox
+    of `message_count` messages. deliver() adds new mail.
+    """
+
+    def __init__(self, message_count: int = 200, latency: float = 0.02):
+        self.latency = latency
+        self.request_count = 0
+        self.connection_count = 0
+        self.history_id = str(message_count)
+        now = datetime.now(timezone.utc)
+        self.messages = [self._message(i, now - timedelta(minutes=i)) for i in range(message_count)]
+        self._by_id = {message['id']: message for message in self.messages}
+        # (historyId, message ID) of messages added by deliver()
+        self._history = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address
+        return f'http://{host}:{port}/'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    @staticmethod
+    def _message(i: int, date: datetime) -> dict:
+        return {
+            'id': f'msg{i:06d}',
+            'snippet': f'Snippet of message {i}',
+            'payload': {
+                'headers': [
+                    {'name': 'From', 'value': f'sender{i % 7}@example.com'},
+                    {'name': 'Subject', 'value': f'Subject {i}'},
+                    {'name': 'Date', 'value': format_datetime(date)},
+                ]
+            },
+        }
+
+    def deliver(self, count: int = 1) -> str:
+        """
+        Add `count` new messages to the inbox and return the new historyId.
+        """
+        with self._lock:
+            for _ in range(count):
+                message = self._message(len(self.messages), datetime.now(timezone.utc))
+                self.messages.insert(0, message)
+                self._by_id[message['id']] = message
+                self.history_id = str(int(self.history_id) + 1)
+                self._history.append((int(self.history_id), message['id']))
+            return self.history_id
+
+    def build_service(self):
+        """
+        Build a Gmail API service object pointed at this server.
+        """
+        doc = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+        doc['rootUrl'] = self.url
+        return build_from_document(doc, credentials=Credentials(token='fake-token'))
+
+    def handle(self, method: str, path: str, query: dict, body: bytes):
+        """
+        Return (status, payload) for a single API call.
+        """
+        parts = path.strip('/').split('/')
+
+        if parts == ['gmail', 'v1', 'users', 'me', 'profile']:
+            return 200, {'emailAddress': 'me@example.com', 'historyId': self.history_id}
+
+        if parts == ['gmail', 'v1', 'users', 'me', 'watch']:
+            expiration = datetime.now(timezone.utc) + timedelta(days=7)
+            return 200, {'historyId': self.history_id, 'expiration': str(int(expiration.timestamp() * 1000))}
+
+        if parts == ['gmail', 'v1', 'users', 'me', 'history']:
+            start = int(query['startHistoryId'][0])
+            with self._lock:
+                records = [
+                    {'id': str(history_id), 'messagesAdded': [{'message': {'id': message_id}}]}
+                    for history_id, message_id in self._history if history_id > start
+                ]
+            return 200, {'history': records, 'historyId': self.history_id}
+
+        if parts[:4] == ['gmail', 'v1', 'users', 'me'] and parts[4:5] == ['messages']:
+            if len(parts) == 5:
+                return 200, self._list_messages(query)
+            message = self._by_id.get(parts[5])
+            if message is None:
+                return 404, {'error': {'code': 404, 'message': 'Not Found'}}
+            return 200, message
+
+        return 404, {'error': {'code': 404, 'message': f'Unknown path {path}'}}
+
+    def _list_messages(self, query: dict) -> dict:
+        page_size = int(query.get('maxResults', ['100'])[0])
+        start = int(query.get('pageToken', ['0'])[0])
+        page = self.messages[start:start + page_size]
+        result = {'messages': [{'id': m['id']} for m in page]}
+        if start + page_size < len(self.messages):
+            result['nextPageToken'] = str(start + page_size)
+        return result
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                # Avoid Nagle/delayed-ACK stalls on keep-alive connections
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server._lock:
+                    server.connection_count += 1
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def _dispatch(self, method):
+                with server._lock:
+                    server.request_count += 1
+                time.sleep(server.latency)
+
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                url = urlparse(self.path)
+
+                if method == 'POST' and url.path == '/batch':
+                    self._send_batch(body)
+                    return
+
+                status, payload = server.handle(method, url.path, parse_qs(url.query), body)
+                self._send(status, 'application/json', json.dumps(payload).encode())
+
+            def _send_batch(self, body):
+                content_type = self.headers['Content-Type']
+                multipart = BytesParser(policy=HTTP).parsebytes(
+                    f'Content-Type: {content_type}\r\n\r\n'.encode() + body
+                )
+                boundary = uuid.uuid4().hex
+                chunks = []
+                for part in multipart.iter_parts():
+                    request_line = part.get_payload(decode=True).decode().splitlines()[0]
+                    sub_method, sub_path, _ = request_line.split(' ', 2)
+                    url = urlparse(sub_path)
+                    status, payload = server.handle(sub_method, url.path, parse_qs(url.query), b'')
+                    content_id = part['Content-ID'].strip('<>')
+                    chunks.append(
+                        f'--{boundary}\r\n'
+                        'Content-Type: application/http\r\n'
+                        f'Content-ID: <response-{content_id}>\r\n\r\n'
+                        f'HTTP/1.1 {status} OK\r\n'
+                        'Content-Type: application/json\r\n\r\n'
+                        f'{json.dumps(payload)}\r\n'
+                    )
+                chunks.append(f'--{boundary}--\r\n')
+                self._send(200, f'multipart/mixed; boundary={boundary}', ''.join(chunks).encode())
+
+            def _send(self, status, content_type, payload):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
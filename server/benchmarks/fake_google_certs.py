@@ -0,0 +1,96 @@
+"""
+Local stand-in for Google's ID token signing certificates.
+
+Serves a key set at /oauth2/v1/certs with a Cache-Control max-age, as
+www.googleapis.com does, after an artificial latency, and signs ID tokens
+with the matching private key so they verify against it.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import socket
+import threading
+import time
+
+import rsa
+from google.auth import crypt, jwt
+
+KEY_ID = 'bench-key-1'
+
+
+class FakeGoogleCertsServer:
+    """
+    Threaded HTTP server publishing one RSA public key, plus a signer for
+    ID tokens issued by "accounts.google.com".
+    """
+
+    def __init__(self, latency: float = 0.05, max_age: int = 21600, key_bits: int = 2048):
+        self.latency = latency
+        self.max_age = max_age
+        self.request_count = 0
+        public_key, private_key = rsa.newkeys(key_bits)
+        self._signer = crypt.RSASigner.from_string(private_key.save_pkcs1(), key_id=KEY_ID)
+        self._body = json.dumps({KEY_ID: public_key.save_pkcs1().decode()}).encode()
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def certs_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f'http://{host}:{port}/oauth2/v1/certs'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def id_token(self, client_id: str, email: str, lifetime: int = 3600) -> str:
+        """
+        Sign an ID token for `email`, as Sign in with Google would issue it.
+        """
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com',
+            'aud': client_id,
+            'sub': str(abs(hash(email))),
+            'email': email,
+            'email_verified': True,
+            'name': email.split('@')[0],
+            'iat': now,
+            'exp': now + lifetime,
+        }
+        return jwt.encode(self._signer, payload).decode()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                time.sleep(server.latency)
+                if self.path.split('?')[0] != '/oauth2/v1/certs':
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=UTF-8')
+                self.send_header('Cache-Control', f'public, max-age={server.max_age}, must-revalidate, no-transform')
+                self.send_header('Content-Length', str(len(server._body)))
+                self.end_headers()
+                self.wfile.write(server._body)
+
+        return Handler
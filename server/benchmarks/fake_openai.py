@@ -0,0 +1,110 @@
+"""
+Local stand-in for the OpenAI chat completions API used by the benchmarks.
+
+Answers every request after a fixed latency and reports token usage counted
+with tiktoken, so prompt sizes of different call patterns can be compared
+without an API key.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from functools import lru_cache
+from typing import Callable, Dict, List
+import json
+import socket
+import threading
+import time
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        # Rough estimate when the encoding can't be loaded (e.g. offline)
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+class FakeOpenAIServer:
+    """
+    Threaded HTTP server implementing POST /v1/chat/completions.
+
+    `responder(messages, json_mode)` returns the assistant message content.
+    """
+
+    def __init__(self, responder: Callable[[List[Dict], bool], str], latency: float = 0.3):
+        self.responder = responder
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f'http://{host}:{port}/v1'
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def complete(self, request: Dict) -> Dict:
+        messages = request['messages']
+        json_mode = (request.get('response_format') or {}).get('type') == 'json_object'
+        content = self.responder(messages, json_mode)
+        prompt_tokens = sum(count_tokens(m['content']) for m in messages)
+        completion_tokens = count_tokens(content)
+        return {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request['model'],
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def do_POST(self):
+                with server._lock:
+                    server.request_count += 1
+                time.sleep(server.latency)
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                payload = json.dumps(server.complete(json.loads(body))).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
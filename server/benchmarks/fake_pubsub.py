@@ -0,0 +1,87 @@
+"""
+Local stand-in for the Cloud Pub/Sub push subscription that delivers Gmail
+users.watch notifications.
+
+Posts synthetic push requests, in the same envelope Pub/Sub uses, to the
+/gmail/push endpoint of a running server:
+
+    python -m benchmarks.fake_pubsub --email me@example.com --history-id 12345 --burst 20
+"""
+from datetime import datetime, timezone
+import argparse
+import base64
+import itertools
+import json
+import time
+import uuid
+
+import httpx
+
+
+def encode_notification(email_address: str, history_id: str) -> str:
+    """
+    Base64 payload of a Gmail notification, as Gmail publishes it.
+    """
+    payload = json.dumps({'emailAddress': email_address, 'historyId': int(history_id)})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+class FakePubSubPusher:
+    """
+    Sends Gmail notifications to a push endpoint like Pub/Sub would.
+    """
+
+    def __init__(self, url: str, token: str = None, subscription: str = 'projects/local/subscriptions/gmail-push'):
+        self.url = url
+        self.token = token
+        self.subscription = subscription
+        self.sent = 0
+        self._client = httpx.Client(timeout=10)
+
+    def envelope(self, email_address: str, history_id: str) -> dict:
+        return {
+            'message': {
+                'data': encode_notification(email_address, history_id),
+                'messageId': uuid.uuid4().hex,
+                'publishTime': datetime.now(timezone.utc).isoformat(),
+            },
+            'subscription': self.subscription,
+        }
+
+    def push(self, email_address: str, history_id: str) -> int:
+        """
+        Deliver one notification and return the HTTP status code.
+        """
+        params = {'token': self.token} if self.token else None
+        response = self._client.post(self.url, json=self.envelope(email_address, history_id), params=params)
+        self.sent += 1
+        return response.status_code
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000/gmail/push')
+    parser.add_argument('--email', required=True, help='gmail_address of a connected account')
+    parser.add_argument('--history-id', type=int, required=True, help='historyId of the first notification')
+    parser.add_argument('--burst', type=int, default=1, help='notifications to send, with increasing historyIds')
+    parser.add_argument('--interval', type=float, default=0.0, help='seconds between notifications')
+    parser.add_argument('--token', default=None, help='GMAIL_PUSH_TOKEN of the server')
+    args = parser.parse_args()
+
+    pusher = FakePubSubPusher(args.url, args.token)
+    statuses = {}
+    try:
+        for history_id in itertools.islice(itertools.count(args.history_id), args.burst):
+            status = pusher.push(args.email, str(history_id))
+            statuses[status] = statuses.get(status, 0) + 1
+            time.sleep(args.interval)
+    finally:
+        pusher.close()
+    print(f'Sent {pusher.sent} notifications, responses: {statuses}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""
+Email processing pipeline: summarize and categorize fetched emails with the
+LLM. Emails that sender rules or the local classifier categorize
+confidently only need a summary from the LLM. Results are stored with email_store.upsert_emails.
+"""
+from models.db_models import Category
+from utils import summarize, categorize, classify, load_categories
+from llm_cache import llm_cache, cache_key, category_version, SUMMARY, CATEGORY
+from local_classifier import local_classifier, LOCAL_CLASSIFIER_ENABLED
+from sender_rules import sender_rules, SENDER_RULES_ENABLED
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of emails analyzed by the LLM at the same time
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '8'))
+
+# How emails are analyzed:
+#   "combined" - one structured call returning summary, category and confidence
+#   "two_call" - separate summarize and categorize calls
+LLM_MODE = os.getenv('LLM_MODE', 'combined')
+LLM_MODES = ('combined', 'two_call')
+
+
+async def generateSummary(email: Dict) -> str:
+    """
+    Generate a summary of the email body using OpenAI API.
+    """
+    contentToSummarize = {
+        "subject": email['subject'],
+        "body": email['body']
+    }
+    summary = await summarize(contentToSummarize)
+    logger.debug("Summary generated: %s", summary)
+    return summary
+
+
+async def defineCategory(userId: int, email: Dict, categories: Optional[List[Category]] = None) -> Optional[int]:
+    contentToDefineCategory = {
+        "subject": email['subject'],
+        "body": email['body'],
+        "sender": email['sender']
+    }
+    category = await categorize(userId, contentToDefineCategory, categories)
+    logger.debug("Category generated: %s", category)
+    return category
+
+
+async def analyze_email(
+    user_id: int,
+    email: Dict,
+    mode: str = LLM_MODE,
+    categories: Optional[List[Category]] = None,
+    local_category: Optional[Dict] = None,
+    cached: Optional[Dict[str, Dict]] = None
+) -> Dict:
+    """
+    Summarize and categorize a single email.
+
+    Cached results are used when available. With a local category the LLM
+    only summarizes. Otherwise, in "combined" mode this is one structured
+    LLM call; in "two_call" mode only the missing summarize/categorize calls
+    are made, in parallel.
+
+    Args:
+        categories: The user's categories, if already loaded
+        local_category: {'category_id', 'confidence', 'category_source'}
+            from sender rules or the local classifier
+        cached: Cache lookups already made for this email, by key (see
+            analyze_emails); looked up here if not given
+
+    Returns:
+        The email dictionary extended with 'summary', 'category_id',
+        'confidence' (None when not reported) and 'category_source'
+    """
+    if categories is None:
+        categories = await asyncio.to_thread(load_categories, user_id)
+    summary_key = cache_key(SUMMARY, user_id, email)
+    category_key = cache_key(CATEGORY, user_id, email, category_version(categories))
+
+    if cached is None:
+        cached = await llm_cache.aget_many([summary_key, category_key])
+    cached_summary = cached.get(summary_key)
+    cached_category = cached.get(category_key)
+    if cached_summary is not None and cached_category is not None:
+        return {**email, 'summary': cached_summary['summary'], **cached_category, 'category_source': 'llm'}
+
+    if local_category is not None:
+        summary = cached_summary
+        if summary is None:
+            summary = {'summary': await generateSummary(email)}
+            await llm_cache.aset_many([(summary_key, user_id, SUMMARY, summary)])
+        return {**email, **summary, **local_category}
+
+    if mode == 'combined':
+        result = await classify(user_id, {
+            "subject": email['subject'],
+            "body": email['body'],
+            "sender": email['sender']
+        }, categories)
+        summary = {'summary': result.summary}
+        category = {'category_id': result.category_id, 'confidence': result.confidence}
+    else:
+        async def _summary():
+            return cached_summary or {'summary': await generateSummary(email)}
+
+        async def _category():
+            return cached_category or {
+                'category_id': await defineCategory(user_id, email, categories),
+                'confidence': None
+            }
+
+        outcomes = await asyncio.gather(_summary(), _category(), return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        summary, category = outcomes
+
+    await llm_cache.aset_many([
+        (key, user_id, kind, value)
+        for key, kind, value, known in (
+            (summary_key, SUMMARY, summary, cached_summary),
+            (category_key, CATEGORY, category, cached_category),
+        )
+        if known is None or mode == 'combined'
+    ])
+    return {**email, **summary, **category, 'category_source': 'llm'}
+
+
+def _categorize_locally(user_id: int, emails: List[Dict], categories: List[Category]) -> Dict[str, Dict]:
+    """
+    Categories the LLM need not be asked for, by email ID: from sender
+    rules first, then from the local classifier for the remaining emails.
+    Either tier failing only leaves its emails to the LLM.
+    """
+    decided: Dict[str, Dict] = {}
+    tiers = [
+        ('Sender rules', 'sender_rule', SENDER_RULES_ENABLED, sender_rules.route),
+        ('Local classifier', 'local_classifier', LOCAL_CLASSIFIER_ENABLED, local_classifier.classify),
+    ]
+    for name, source, enabled, categorize_batch in tiers:
+        remaining = [email for email in emails if email['id'] not in decided]
+        if not enabled or not remaining:
+            continue
+        try:
+            predictions = categorize_batch(user_id, remaining, categories)
+        except Exception as e:
+            logger.warning("%s failed for user %s: %s", name, user_id, e)
+            continue
+        decided.update(
+            (email['id'], {**prediction, 'category_source': source})
+            for email, prediction in zip(remaining, predictions) if prediction is not None
+        )
+    return decided
+
+
+async def analyze_emails(
+    user_id: int,
+    emails: Iterable[Dict],
+    concurrency: int = LLM_CONCURRENCY,
+    mode: str = LLM_MODE,
+    on_result: Optional[Callable[[Dict, Optional[Dict], Optional[Dict]], None]] = None
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Analyze many emails concurrently, with at most `concurrency` in flight.
+
+    A failure only affects the email it happened on. The emails are first
+    categorized by sender rules and the local classifier in one batch; only
+    the rest are categorized by the LLM. Their cached results are also
+    looked up in one batch.
+
+    Args:
+        on_result: Called as on_result(email, analyzed, error) as soon as
+            each email is done, with either `analyzed` or `error` set
+
+    Returns:
+        Tuple of (analyzed emails in input order, errors as {'id', 'error'} dicts)
+    """
+    if mode not in LLM_MODES:
+        raise ValueError(f"Unknown LLM mode '{mode}', expected one of {LLM_MODES}")
+    semaphore = asyncio.Semaphore(concurrency)
+    # Load the category set once for the whole batch, off the event loop
+    categories = await asyncio.to_thread(load_categories, user_id)
+
+    emails = list(emails)
+    version = category_version(categories)
+    cached = await llm_cache.aget_many(
+        key for email in emails
+        for key in (cache_key(SUMMARY, user_id, email), cache_key(CATEGORY, user_id, email, version))
+    )
+    local_categories: Dict[str, Dict] = {}
+    if categories:
+        local_categories = await asyncio.to_thread(_categorize_locally, user_id, emails, categories)
+
+    async def _run(email: Dict):
+        async with semaphore:
+            try:
+                outcome = await analyze_email(
+                    user_id, email, mode, categories, local_categories.get(email.get('id')), cached
+                ), None
+            except Exception as e:
+                logger.warning("Failed to analyze email %s: %s", email.get('id'), e)
+                outcome = None, {'id': email.get('id'), 'error': str(e)}
+        if on_result is not None:
+            try:
+                on_result(email, *outcome)
+            except Exception as e:
+                logger.warning("Result callback failed for email %s: %s", email.get('id'), e)
+        return outcome
+
+    analyzed, errors = [], []
+    for result, error in await asyncio.gather(*(_run(email) for email in emails)):
+        if error is None:
+            analyzed.append(result)
+        else:
+            errors.append(error)
+    return analyzed, errors
@@ -0,0 +1,114 @@
+"""
+Full-text search over stored emails (subject, sender, summary and body).
+
+Uses the index created by migration 0003: the search_vector tsvector column
+with a GIN index on PostgreSQL, the emails_fts FTS5 table on SQLite. Both
+are updated by the database itself as emails are written, so nothing here
+has to keep them in sync.
+"""
+from sqlalchemy import and_, column, func, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
+from models.db_models import Email
+from typing import List, Optional, Tuple
+import os
+import re
+
+# Results per search page: default and upper bound
+EMAIL_SEARCH_PAGE_SIZE = int(os.getenv('EMAIL_SEARCH_PAGE_SIZE', '20'))
+EMAIL_SEARCH_PAGE_SIZE_MAX = int(os.getenv('EMAIL_SEARCH_PAGE_SIZE_MAX', '100'))
+# Deepest result that can be paged to; ranking needs every match scored
+EMAIL_SEARCH_MAX_OFFSET = int(os.getenv('EMAIL_SEARCH_MAX_OFFSET', '1000'))
+
+# PostgreSQL text search configuration; must match migration 0003
+SEARCH_CONFIG = 'english'
+
+# bm25 weights of the emails_fts columns: account_id, subject, sender,
+# summary, body
+FTS5_WEIGHTS = (0.0, 10.0, 10.0, 4.0, 1.0)
+
+_token = re.compile(r'\w+', re.UNICODE)
+
+_emails_fts = table('emails_fts', column('rowid'))
+
+
+def fts5_query(account_id: int, text: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for the account's emails containing every word of
+    `text`. Words are quoted, so user input cannot form FTS5 syntax. None if
+    there are no words.
+    """
+    terms = _token.findall(text)
+    if not terms:
+        return None
+    return f'account_id : "{int(account_id)}" AND ' + ' '.join(f'"{term}"' for term in terms)
+
+
+def _postgres_query(account_id: int, text: str):
+    # A literal regconfig: a bound string parameter would not resolve the overload
+    tsquery = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), text)
+    vector = literal_column('emails.search_vector')
+    rank = func.ts_rank_cd(vector, tsquery)
+    return select(Email).where(Email.account_id == account_id, vector.op('@@')(tsquery)), rank.desc()
+
+
+def _sqlite_query(account_id: int, text: str):
+    match = fts5_query(account_id, text)
+    if match is None:
+        return None, None
+    # bm25() is lower for better matches
+    rank = func.bm25(literal_column('emails_fts'), *FTS5_WEIGHTS)
+    query = (
+        select(Email)
+        .join(_emails_fts, _emails_fts.c.rowid == literal_column('emails.rowid'))
+        .where(and_(literal_column('emails_fts').op('MATCH')(match), Email.account_id == account_id))
+    )
+    return query, rank.asc()
+
+
+async def search_emails(
+    db: AsyncSession,
+    account_id: int,
+    text: str,
+    limit: int = EMAIL_SEARCH_PAGE_SIZE,
+    offset: int = 0,
+    include_body: bool = False
+) -> Tuple[List[Email], Optional[int]]:
+    """
+    One page of an account's stored emails matching `text`, best match
+    first (newest first among equal ranks).
+
+    On PostgreSQL `text` uses websearch syntax ("quoted phrases", -excluded,
+    or). On SQLite every word must match; words are stemmed on both.
+
+    Args:
+        db: Async database session
+        account_id: Owner of the emails
+        text: Search query
+        limit: Page size, capped at EMAIL_SEARCH_PAGE_SIZE_MAX
+        offset: Results to skip, at most EMAIL_SEARCH_MAX_OFFSET
+        include_body: Also load the email bodies
+
+    Returns:
+        (emails, next_offset); next_offset is None on the last page
+    """
+    limit = max(1, min(limit, EMAIL_SEARCH_PAGE_SIZE_MAX))
+    offset = max(0, min(offset, EMAIL_SEARCH_MAX_OFFSET))
+
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        query, order = _postgres_query(account_id, text)
+    elif dialect == 'sqlite':
+        query, order = _sqlite_query(account_id, text)
+    else:
+        raise NotImplementedError(f"Email search is not supported for the '{dialect}' dialect")
+    if query is None:
+        return [], None
+
+    if not include_body:
+        query = query.options(defer(Email.body, raiseload=True))
+    query = query.order_by(order, Email.received_at.desc(), Email.gmail_msg_id.desc())
+    emails = list((await db.scalars(query.offset(offset).limit(limit + 1))).all())
+    if len(emails) <= limit or offset + limit > EMAIL_SEARCH_MAX_OFFSET:
+        return emails[:limit], None
+    return emails[:limit], offset + limit
@@ -0,0 +1,349 @@
+"""
+Bulk persistence of processed emails, lookup of already-stored message IDs
+and paginated reads of stored emails.
+"""
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer
+from models.db_models import Email, LOCAL_CATEGORY_SOURCES
+from datetime import datetime, timezone
+from database.database import SessionLocal
+from sender_rules import sender_rules
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import base64
+import binascii
+import json
+import os
+import threading
+import time
+
+# Rows per INSERT statement
+EMAIL_UPSERT_BATCH_SIZE = int(os.getenv('EMAIL_UPSERT_BATCH_SIZE', '500'))
+
+# What to do when a gmail_msg_id is already stored: "nothing" or "update"
+EMAIL_UPSERT_ON_CONFLICT = os.getenv('EMAIL_UPSERT_ON_CONFLICT', 'nothing')
+
+# Accounts whose known message IDs are remembered in memory, and the
+# maximum number of IDs remembered per account
+KNOWN_IDS_MAX_ACCOUNTS = int(os.getenv('KNOWN_IDS_MAX_ACCOUNTS', '1000'))
+KNOWN_IDS_MAX_PER_ACCOUNT = int(os.getenv('KNOWN_IDS_MAX_PER_ACCOUNT', '50000'))
+# Seconds an account's known IDs are trusted; emails deleted by another
+# process are forgotten here after this long at the latest
+KNOWN_IDS_TTL = float(os.getenv('KNOWN_IDS_TTL', '600'))
+
+# Page size of stored email listings: default and upper bound
+EMAIL_PAGE_SIZE = int(os.getenv('EMAIL_PAGE_SIZE', '50'))
+EMAIL_PAGE_SIZE_MAX = int(os.getenv('EMAIL_PAGE_SIZE_MAX', '200'))
+
+# Columns refreshed by an "update" upsert
+_UPDATABLE_COLUMNS = ('category_id', 'category_source', 'summary', 'summary_created_at', 'subject', 'sender', 'body', 'received_at')
+
+
+def _insert_for(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert
+    if dialect == 'sqlite':
+        return sqlite.insert
+    raise NotImplementedError(f"Bulk upsert is not supported for the '{dialect}' dialect")
+
+
+def _to_row(account_id: int, email: Dict) -> Dict:
+    # Date headers keep the sender's UTC offset; store every time as naive
+    # UTC so rows of different senders sort and compare correctly
+    return {
+        'gmail_msg_id': email['id'],
+        'account_id': account_id,
+        'category_id': email.get('category_id'),
+        'category_source': email.get('category_source'),
+        'received_at': naive_utc(email.get('received_at') or datetime.now(timezone.utc)),
+        'summary': email.get('summary'),
+        'summary_created_at': naive_utc(datetime.now(timezone.utc)),
+        'subject': email.get('subject'),
+        'sender': email.get('sender'),
+        'body': email.get('body'),
+    }
+
+
+def upsert_emails(
+    db: Session,
+    account_id: int,
+    emails: List[Dict],
+    on_conflict: str = EMAIL_UPSERT_ON_CONFLICT,
+    batch_size: int = EMAIL_UPSERT_BATCH_SIZE
+) -> Dict[str, int]:
+    """
+    Insert processed emails in one transaction using
+    INSERT ... ON CONFLICT (gmail_msg_id) DO NOTHING / DO UPDATE.
+
+    Rows are sent in statements of `batch_size` rows. An "update" only
+    touches rows that belong to the same account.
+
+    Args:
+        db: Database session (committed on success, rolled back on error)
+        account_id: Owner of the emails
+        emails: Analyzed email dictionaries (id, subject, sender, body,
+            received_at, summary, category_id, category_source)
+        on_conflict: "nothing" to skip stored emails, "update" to refresh them
+        batch_size: Maximum rows per INSERT statement
+
+    Returns:
+        Counts: {'inserted', 'skipped'} or {'inserted', 'updated'}
+    """
+    if on_conflict not in ('nothing', 'update'):
+        raise ValueError(f"on_conflict must be 'nothing' or 'update', got '{on_conflict}'")
+
+    # The same message listed twice in one batch would conflict with itself
+    rows = list({email['id']: _to_row(account_id, email) for email in emails}.values())
+    insert = _insert_for(db)
+    inserted = 0
+    updated = 0
+    inserted_ids: Set[str] = set()
+
+    try:
+        for start in range(0, len(rows), batch_size):
+            chunk = rows[start:start + batch_size]
+            stmt = insert(Email).values(chunk)
+
+            if on_conflict == 'nothing':
+                stmt = stmt.on_conflict_do_nothing(index_elements=['gmail_msg_id'])
+                new_ids = db.scalars(stmt.returning(Email.gmail_msg_id)).all()
+                inserted += len(new_ids)
+                inserted_ids.update(new_ids)
+                continue
+
+            existing = set(db.scalars(
+                select(Email.gmail_msg_id).where(
+                    Email.gmail_msg_id.in_([row['gmail_msg_id'] for row in chunk])
+                )
+            ))
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['gmail_msg_id'],
+                set_={column: stmt.excluded[column] for column in _UPDATABLE_COLUMNS},
+                where=Email.account_id == stmt.excluded.account_id
+            )
+            written = len(db.execute(stmt.returning(Email.gmail_msg_id)).all())
+            inserted += len(chunk) - len(existing)
+            updated += written - (len(chunk) - len(existing))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    known_ids.add(account_id, [row['gmail_msg_id'] for row in rows])
+
+    if on_conflict == 'nothing':
+        # Only new rows count; stored emails were counted when first stored.
+        # Emails a rule or the local classifier categorized are no evidence
+        sender_rules.record(account_id, (
+            row for row in rows
+            if row['gmail_msg_id'] in inserted_ids and row['category_source'] not in LOCAL_CATEGORY_SOURCES
+        ))
+        return {'inserted': inserted, 'skipped': len(rows) - inserted}
+    # Updated rows may have changed category; recount from the database
+    sender_rules.invalidate(account_id)
+    return {'inserted': inserted, 'updated': updated}
+
+
+class KnownIdCache:
+    """
+    In-memory sets of message IDs already stored per account.
+
+    Only positive entries are kept, so a stale cache never hides a new
+    message; at worst it costs a database lookup. Deleting stored emails
+    must call forget() for their account, or a message deleted and received
+    again would be skipped; entries of other processes expire after `ttl`.
+    """
+
+    def __init__(
+        self,
+        max_accounts: int = KNOWN_IDS_MAX_ACCOUNTS,
+        max_per_account: int = KNOWN_IDS_MAX_PER_ACCOUNT,
+        ttl: float = KNOWN_IDS_TTL
+    ):
+        self.max_accounts = max_accounts
+        self.max_per_account = max_per_account
+        self.ttl = ttl
+        # account_id -> (IDs, monotonic time the set was started)
+        self._ids: 'OrderedDict[int, Tuple[Set[str], float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def known(self, account_id: int, message_ids: Iterable[str]) -> Set[str]:
+        with self._lock:
+            entry = self._ids.get(account_id)
+            if entry is None:
+                return set()
+            if time.monotonic() - entry[1] >= self.ttl:
+                del self._ids[account_id]
+                return set()
+            self._ids.move_to_end(account_id)
+            return entry[0].intersection(message_ids)
+
+    def add(self, account_id: int, message_ids: Iterable[str]) -> None:
+        with self._lock:
+            entry = self._ids.get(account_id)
+            if entry is None or time.monotonic() - entry[1] >= self.ttl:
+                entry = self._ids[account_id] = (set(), time.monotonic())
+            ids = entry[0]
+            self._ids.move_to_end(account_id)
+            ids.update(message_ids)
+            if len(ids) > self.max_per_account:
+                # Sets are unordered; start over rather than track recency per ID
+                ids.clear()
+            while len(self._ids) > self.max_accounts:
+                self._ids.popitem(last=False)
+
+    def forget(self, account_id: int) -> None:
+        """
+        Drop an account's known IDs, e.g. after some of its emails were
+        deleted.
+        """
+        with self._lock:
+            self._ids.pop(account_id, None)
+
+
+known_ids = KnownIdCache()
+
+
+def known_message_ids(db: Session, account_id: int, message_ids: List[str]) -> Set[str]:
+    """
+    Return which of the given message IDs are already stored for the account,
+    with one set-based query.
+    """
+    if not message_ids:
+        return set()
+    return set(db.scalars(
+        select(Email.gmail_msg_id).where(
+            Email.account_id == account_id,
+            Email.gmail_msg_id.in_(message_ids)
+        )
+    ))
+
+
+class NewMessageFilter:
+    """
+    Drops already-processed message IDs between listing and detail fetch.
+
+    Pass an instance as `id_filter` to the Gmail fetch functions. Each call
+    checks the in-memory KnownIdCache first and runs one query for the rest.
+    It uses its own session, so it can be called from a worker thread.
+    """
+
+    def __init__(self, account_id: int):
+        self.account_id = account_id
+        self.skipped = 0
+
+    def __call__(self, message_ids: List[str]) -> List[str]:
+        known = known_ids.known(self.account_id, message_ids)
+        unknown = [message_id for message_id in message_ids if message_id not in known]
+        if unknown:
+            db = SessionLocal()
+            try:
+                stored = known_message_ids(db, self.account_id, unknown)
+            finally:
+                db.close()
+            known_ids.add(self.account_id, stored)
+            known |= stored
+        self.skipped += len(known)
+        return [message_id for message_id in message_ids if message_id not in known]
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+
+
+def naive_utc(value: datetime) -> datetime:
+    """
+    `value` as a naive UTC datetime, as the DateTime columns store it.
+    Naive values are taken to be UTC already; asyncpg rejects aware ones.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def encode_cursor(email: Email) -> str:
+    """
+    Opaque cursor pointing just after `email` in newest-first order.
+    """
+    position = [email.received_at.isoformat(), email.gmail_msg_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    (received_at, gmail_msg_id) of a cursor made by encode_cursor().
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed
+    """
+    try:
+        received_at, gmail_msg_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return naive_utc(datetime.fromisoformat(received_at)), str(gmail_msg_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
+
+
+async def list_stored_emails(
+    db: AsyncSession,
+    account_id: int,
+    category_id: Optional[int] = None,
+    sender: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = EMAIL_PAGE_SIZE,
+    include_body: bool = False
+) -> Tuple[List[Email], Optional[str]]:
+    """
+    One page of an account's stored emails, newest first.
+
+    Uses keyset pagination on (received_at, gmail_msg_id), so every page is
+    an index range scan on ix_emails_account_received (or
+    ix_emails_account_category_received) however deep the client pages.
+    The body column is not loaded unless `include_body` is set.
+
+    Args:
+        db: Async database session
+        account_id: Owner of the emails
+        category_id: Only emails in this category
+        sender: Case-insensitive substring of the From header
+        since: Only emails received at or after this time (naive means UTC)
+        until: Only emails received before this time (naive means UTC)
+        cursor: next_cursor of the previous page
+        limit: Page size, capped at EMAIL_PAGE_SIZE_MAX
+        include_body: Also load the email bodies
+
+    Returns:
+        (emails, next_cursor); next_cursor is None on the last page
+
+    Raises:
+        InvalidCursorError: If `cursor` is malformed
+    """
+    limit = max(1, min(limit, EMAIL_PAGE_SIZE_MAX))
+    query = select(Email).where(Email.account_id == account_id)
+    if category_id is not None:
+        query = query.where(Email.category_id == category_id)
+    if sender:
+        query = query.where(Email.sender.icontains(sender, autoescape=True))
+    if since is not None:
+        query = query.where(Email.received_at >= naive_utc(since))
+    if until is not None:
+        query = query.where(Email.received_at < naive_utc(until))
+    if cursor:
+        received_at, gmail_msg_id = decode_cursor(cursor)
+        query = query.where(tuple_(Email.received_at, Email.gmail_msg_id) < tuple_(received_at, gmail_msg_id))
+    if not include_body:
+        # Raise instead of lazy loading if something touches it anyway
+        query = query.options(defer(Email.body, raiseload=True))
+
+    query = query.order_by(Email.received_at.desc(), Email.gmail_msg_id.desc()).limit(limit + 1)
+    emails = list((await db.scalars(query)).all())
+    if len(emails) <= limit:
+        return emails, None
+    emails = emails[:limit]
+    return emails, encode_cursor(emails[-1])
@@ -1,15 +1,27 @@
 """
 Background service to periodically sync user inbox emails and save metadata to database.
+
+SyncScheduler queues the periodic syncs as "sync" jobs on the job queue
+(see job_queue.enqueue_sync), so whichever worker leases a job runs it, and
+schedulers in several API processes sync each account once between them.
 """
+from sqlalchemy import BigInteger, cast, or_, update
 from sqlalchemy.orm import Session
-from models.db_models import UserAccount, Email
-from gmail_service import fetch_emails_since_date
-from datetime import datetime, timedelta, timezone
+from models.db_models import UserAccount
+from gmail_service import (
+    fetch_messages_batch,
+    gmail_client,
+    get_history_id,
+    list_added_message_ids,
+    list_message_ids,
+    HistoryExpiredError,
+)
+from datetime import datetime, timezone
 from database.database import SessionLocal
 import asyncio
 import os
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request as GoogleRequest
+import random
+from typing import Callable, Dict, List, NamedTuple, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,4 +29,218 @@ logger = logging.getLogger(__name__)
 # Track running background tasks per user
 running_tasks = {}
 
+# Upper bound on messages fetched when an account has to be fully resynced
+# (first sync, or the stored historyId has expired)
+FULL_RESYNC_MAX_RESULTS = int(os.getenv('FULL_RESYNC_MAX_RESULTS', '200'))
+
+# Background scheduler settings
+SYNC_ENABLED = os.getenv('SYNC_ENABLED', 'true').lower() == 'true'
+SYNC_INTERVAL_SECONDS = float(os.getenv('SYNC_INTERVAL_SECONDS', '300'))
+SYNC_JITTER = float(os.getenv('SYNC_JITTER', '0.1'))  # +/- fraction of the interval
+# Backoff when queueing a sync fails; failed sync jobs are retried by the queue
+SYNC_MAX_BACKOFF_SECONDS = float(os.getenv('SYNC_MAX_BACKOFF_SECONDS', '3600'))
+# How often the set of connected accounts is re-read
+SYNC_REFRESH_SECONDS = float(os.getenv('SYNC_REFRESH_SECONDS', '60'))
+# Accounts with an active Gmail push watch are synced when notified
+# (see gmail_push) instead of being polled, unless this is set
+SYNC_POLL_WATCHED = os.getenv('SYNC_POLL_WATCHED', 'false').lower() == 'true'
+
+
+class SyncResult(NamedTuple):
+    """
+    Outcome of fetching new mail for one account.
+    """
+    emails: List[Dict]
+    history_id: str
+    full_resync: bool
+
+
+def fetch_new_emails(
+    account: UserAccount,
+    id_filter: Optional[Callable[[List[str]], List[str]]] = None
+) -> SyncResult:
+    """
+    Fetch emails added to the account's inbox since its last sync checkpoint.
+
+    Uses users.history.list from `account.last_history_id`. Accounts without a
+    checkpoint, or whose checkpoint Gmail has expired, get a bounded full
+    resync of the newest FULL_RESYNC_MAX_RESULTS inbox messages instead.
+
+    The checkpoint is not stored here; call save_checkpoint() once the
+    returned emails have been persisted.
+
+    Args:
+        account: User account with Gmail OAuth tokens
+        id_filter: Called with the listed message IDs; only the IDs it
+            returns are fetched (optional)
+
+    Returns:
+        SyncResult with the new emails and the historyId to checkpoint
+    """
+    with gmail_client(account.access_token, account.refresh_token, account.id) as service:
+        if account.last_history_id:
+            try:
+                message_ids, history_id = list_added_message_ids(service, account.last_history_id)
+                if id_filter is not None:
+                    message_ids = id_filter(message_ids)
+                emails = fetch_messages_batch(service, message_ids)
+                return SyncResult(emails=emails, history_id=history_id, full_resync=False)
+            except HistoryExpiredError:
+                logger.warning(
+                    "historyId %s expired for account %s, falling back to full resync",
+                    account.last_history_id, account.id
+                )
+
+        return _full_resync(service, id_filter)
+
+
+def _full_resync(service, id_filter=None) -> SyncResult:
+    """
+    List the newest inbox messages, bounded by FULL_RESYNC_MAX_RESULTS.
+    """
+    # Read the checkpoint before listing so that mail arriving during the
+    # resync is picked up by the next incremental sync
+    history_id = get_history_id(service)
+    message_ids = list_message_ids(service, 'in:inbox', FULL_RESYNC_MAX_RESULTS)
+    if id_filter is not None:
+        message_ids = id_filter(message_ids)
+    emails = fetch_messages_batch(service, message_ids)
+    return SyncResult(emails=emails, history_id=history_id, full_resync=True)
+
+
+def save_checkpoint(db: Session, account: UserAccount, history_id: str) -> bool:
+    """
+    Store the historyId the next incremental sync should start from, unless
+    the stored one is already later: incremental syncs may finish out of
+    order, and an older checkpoint would make the next sync fetch again.
+
+    Returns:
+        True if the checkpoint advanced
+    """
+    advanced = db.execute(
+        update(UserAccount)
+        .where(
+            UserAccount.id == account.id,
+            or_(
+                UserAccount.last_history_id.is_(None),
+                cast(UserAccount.last_history_id, BigInteger) < int(history_id)
+            )
+        )
+        .values(last_history_id=history_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return advanced == 1
+
+
+def _jittered(seconds: float, jitter: float = SYNC_JITTER) -> float:
+    return seconds * random.uniform(1 - jitter, 1 + jitter)
+
+
+def _enqueue_sync(account_id: int, min_interval: float):
+    # Imported here: job_queue imports this module for fetch_new_emails
+    from job_queue import enqueue_sync
+
+    db: Session = SessionLocal()
+    try:
+        return enqueue_sync(db, account_id, min_interval)
+    finally:
+        db.close()
+
+
+class SyncScheduler:
+    """
+    Queues one periodic sync job per connected UserAccount.
+
+    Each account is synced every `interval` seconds with random jitter, so
+    accounts don't all hit Gmail at once. Every API process runs a
+    scheduler; a sync is only queued if the account has no open sync job and
+    none was queued within the interval (less jitter), so the account is
+    still synced once per interval. Failures to queue back off exponentially
+    up to `max_backoff`. Tasks are kept in `running_tasks` keyed by account ID.
+    """
+
+    def __init__(
+        self,
+        interval: float = SYNC_INTERVAL_SECONDS,
+        max_backoff: float = SYNC_MAX_BACKOFF_SECONDS,
+        refresh_interval: float = SYNC_REFRESH_SECONDS
+    ):
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.refresh_interval = refresh_interval
+        self._supervisor: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start the scheduler on the running event loop.
+        """
+        if self._supervisor is None:
+            self._supervisor = asyncio.create_task(self._supervise())
+
+    async def stop(self) -> None:
+        """
+        Cancel the supervisor and every account task, and wait for them.
+        """
+        tasks = list(running_tasks.values())
+        if self._supervisor is not None:
+            tasks.append(self._supervisor)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        running_tasks.clear()
+        self._supervisor = None
+
+    async def _supervise(self) -> None:
+        # Keep one task per connected account, picking up new connections
+        # and dropping disconnected or deleted accounts
+        while True:
+            try:
+                account_ids = await asyncio.to_thread(_connected_account_ids)
+                for account_id in account_ids - running_tasks.keys():
+                    running_tasks[account_id] = asyncio.create_task(self._run_account(account_id))
+                for account_id in running_tasks.keys() - account_ids:
+                    running_tasks.pop(account_id).cancel()
+            except Exception as e:
+                logger.error("Failed to refresh sync accounts: %s", e)
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _run_account(self, account_id: int) -> None:
+        failures = 0
+        # Spread the first syncs over one interval
+        delay = random.uniform(0, self.interval)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                job = await asyncio.to_thread(_enqueue_sync, account_id, self.interval * (1 - SYNC_JITTER))
+                if job is not None:
+                    logger.info("Queued sync job %s for account %s", job.id, account_id)
+                failures = 0
+                delay = _jittered(self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                delay = _jittered(min(self.interval * 2 ** failures, self.max_backoff))
+                logger.warning(
+                    "Queueing a sync of account %s failed (%s in a row), retrying in %.0fs: %s",
+                    account_id, failures, delay, e
+                )
+
+
+def _connected_account_ids() -> set:
+    db: Session = SessionLocal()
+    try:
+        query = db.query(UserAccount.id).filter(UserAccount.access_token.isnot(None))
+        if not SYNC_POLL_WATCHED:
+            query = query.filter(or_(
+                UserAccount.watch_expiration.is_(None),
+                UserAccount.watch_expiration < datetime.now(timezone.utc)
+            ))
+        rows = query.all()
+        return {row.id for row in rows}
+    finally:
+        db.close()
+
 
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,203 @@
+"""
+Gmail push notifications: coalesced per-account syncs triggered by
+users.watch Pub/Sub messages, and renewal of the watches themselves.
+
+Gmail sends a notification for every mailbox change, so a burst of new mail
+produces a burst of notifications for one account. PushSyncCoordinator
+queues one sync job per account on the durable job queue, which any worker
+process may run. Notifications that arrive before the job starts fetching
+collapse into it, in whichever API process they arrive.
+"""
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from models.db_models import UserAccount
+from database.database import SessionLocal
+from gmail_service import gmail_client, watch_inbox
+from job_queue import enqueue_push_sync
+from google_io import background_google_io
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import asyncio
+import base64
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pub/Sub topic Gmail publishes to, "projects/<project>/topics/<topic>".
+# Push notifications are disabled when unset.
+GMAIL_PUSH_TOPIC = os.getenv('GMAIL_PUSH_TOPIC')
+# Shared secret the push subscription sends as ?token=...; required, as
+# /gmail/push refuses notifications without it
+GMAIL_PUSH_TOKEN = os.getenv('GMAIL_PUSH_TOKEN')
+# Seconds a push sync waits after its first notification for more to
+# arrive before fetching
+PUSH_DEBOUNCE_SECONDS = float(os.getenv('PUSH_DEBOUNCE_SECONDS', '2'))
+# Watches last 7 days; renew those expiring within this many seconds
+WATCH_RENEW_BEFORE_SECONDS = float(os.getenv('WATCH_RENEW_BEFORE_SECONDS', str(24 * 3600)))
+# How often watch expirations are checked
+WATCH_CHECK_INTERVAL_SECONDS = float(os.getenv('WATCH_CHECK_INTERVAL_SECONDS', '3600'))
+
+
+class InvalidNotificationError(ValueError):
+    """
+    Raised for push payloads that are not Gmail notifications.
+    """
+
+
+def check_push_config(topic: Optional[str] = GMAIL_PUSH_TOPIC, token: Optional[str] = GMAIL_PUSH_TOKEN) -> None:
+    """
+    Refuse to start with push notifications enabled but no push token:
+    anyone could then trigger syncs, and their LLM calls, for any known
+    address.
+    """
+    if topic and not token:
+        raise RuntimeError("GMAIL_PUSH_TOPIC is set without GMAIL_PUSH_TOKEN; set a push token "
+                           "and add it to the push subscription as ?token=...")
+
+
+def decode_notification(data: str) -> Dict:
+    """
+    Decode the base64 JSON payload of a Gmail Pub/Sub message.
+
+    Returns:
+        Dictionary with 'emailAddress' and 'historyId' (as a string)
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(data + '=' * (-len(data) % 4)))
+        return {'emailAddress': payload['emailAddress'], 'historyId': str(payload['historyId'])}
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidNotificationError(f"Invalid Gmail notification payload: {e}")
+
+
+def is_stale(account: UserAccount, history_id: str) -> bool:
+    """
+    True if the account has already synced past the notified historyId.
+    """
+    try:
+        return account.last_history_id is not None and int(history_id) <= int(account.last_history_id)
+    except ValueError:
+        return False
+
+
+def _enqueue_push_sync(account_id: int, delay: float):
+    db: Session = SessionLocal()
+    try:
+        return enqueue_push_sync(db, account_id, delay)
+    finally:
+        db.close()
+
+
+class PushSyncCoordinator:
+    """
+    Turns push notifications into coalesced, per-account incremental sync
+    jobs on the job queue.
+    """
+
+    def __init__(self, debounce: float = PUSH_DEBOUNCE_SECONDS):
+        self.debounce = debounce
+        self.stats = {'notifications': 0, 'coalesced': 0, 'stale': 0, 'unknown_account': 0, 'queued': 0}
+
+    async def notify(self, account_id: int) -> None:
+        """
+        Queue a sync of the account, fetching after the debounce delay,
+        unless one that has not started fetching is queued already.
+        """
+        self.stats['notifications'] += 1
+        job = await asyncio.to_thread(_enqueue_push_sync, account_id, self.debounce)
+        if job is None:
+            self.stats['coalesced'] += 1
+        else:
+            self.stats['queued'] += 1
+            logger.info("Queued push sync job %s for account %s", job.id, account_id)
+
+
+push_syncs = PushSyncCoordinator()
+
+
+def renew_watch(db: Session, account: UserAccount, topic_name: str = GMAIL_PUSH_TOPIC) -> datetime:
+    """
+    Start or renew the account's Gmail watch and store its expiration.
+    """
+    with gmail_client(account.access_token, account.refresh_token, account.id) as service:
+        response = watch_inbox(service, topic_name)
+    account.watch_expiration = datetime.fromtimestamp(int(response['expiration']) / 1000, timezone.utc)
+    db.commit()
+    return account.watch_expiration
+
+
+def renew_account_watch(account_id: int, topic_name: str = GMAIL_PUSH_TOPIC) -> Optional[datetime]:
+    """
+    renew_watch() with its own session, for callers outside a sync session.
+    """
+    db: Session = SessionLocal()
+    try:
+        account = db.get(UserAccount, account_id)
+        if account is None or not account.access_token:
+            return None
+        return renew_watch(db, account, topic_name)
+    finally:
+        db.close()
+
+
+def renew_expiring_watches(
+    topic_name: str = GMAIL_PUSH_TOPIC,
+    renew_before: float = WATCH_RENEW_BEFORE_SECONDS
+) -> Dict[str, int]:
+    """
+    Renew watches of connected accounts that are missing or expire within
+    `renew_before` seconds.
+    """
+    db: Session = SessionLocal()
+    renewed = failed = 0
+    try:
+        deadline = datetime.now(timezone.utc) + timedelta(seconds=renew_before)
+        accounts: List[UserAccount] = db.query(UserAccount).filter(
+            UserAccount.access_token.isnot(None),
+            or_(UserAccount.watch_expiration.is_(None), UserAccount.watch_expiration < deadline)
+        ).all()
+        for account in accounts:
+            try:
+                renew_watch(db, account, topic_name)
+                renewed += 1
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                logger.warning("Failed to renew Gmail watch for account %s: %s", account.id, e)
+        return {'renewed': renewed, 'failed': failed}
+    finally:
+        db.close()
+
+
+class WatchRenewer:
+    """
+    Periodically renews Gmail watches before they expire.
+    """
+
+    def __init__(self, interval: float = WATCH_CHECK_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                counts = await background_google_io.submit(renew_expiring_watches)
+                if counts['renewed'] or counts['failed']:
+                    logger.info("Renewed Gmail watches: %s", counts)
+            except Exception as e:
+                logger.error("Failed to renew Gmail watches: %s", e)
+            await asyncio.sleep(self.interval)
+
+
+watch_renewer = WatchRenewer()
@@ -5,22 +5,99 @@ Requires OAuth 2.0 access tokens with Gmail API scope.
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient import discovery_cache
+from google_auth_httplib2 import AuthorizedHttp
 from datetime import datetime, timezone
 import os
 import json
 import base64
-from typing import List, Dict, Optional
+import time
+import asyncio
+import threading
+import httplib2
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple, Iterator, AsyncIterator, Callable
+from googleapiclient.errors import HttpError
+from google_io import background_google_io, GoogleIOTimeoutError
 
 
 # Gmail API scope
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
+# Headers requested for every message in metadata format
+METADATA_HEADERS = ['From', 'Subject', 'Date']
+
+# Number of sub-requests per batch call. Gmail accepts up to 100 but
+# recommends 50 or fewer to avoid per-user rate limiting.
+GMAIL_BATCH_SIZE = int(os.getenv('GMAIL_BATCH_SIZE', '50'))
+
+# Number of message IDs requested per messages.list page (Gmail allows up to 500)
+GMAIL_LIST_PAGE_SIZE = int(os.getenv('GMAIL_LIST_PAGE_SIZE', '100'))
+
+# How many times a failed sub-request is retried in a follow-up batch
+GMAIL_BATCH_MAX_RETRIES = int(os.getenv('GMAIL_BATCH_MAX_RETRIES', '3'))
+
+# Sub-request HTTP statuses that are worth retrying
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+# Client pool limits: accounts kept, idle clients kept per account, and
+# seconds an account may stay unused before its clients are dropped
+GMAIL_POOL_MAX_ACCOUNTS = int(os.getenv('GMAIL_POOL_MAX_ACCOUNTS', '256'))
+GMAIL_POOL_MAX_IDLE_PER_ACCOUNT = int(os.getenv('GMAIL_POOL_MAX_IDLE_PER_ACCOUNT', '4'))
+GMAIL_POOL_IDLE_TIMEOUT = float(os.getenv('GMAIL_POOL_IDLE_TIMEOUT', '900'))
+
+# Socket timeout in seconds for Gmail API HTTP connections
+GMAIL_HTTP_TIMEOUT = float(os.getenv('GMAIL_HTTP_TIMEOUT', '30'))
+
+# Seconds a streaming fetch waits for its consumer to take a buffered email
+# before it stops and frees its Google I/O thread
+GMAIL_STREAM_STALL_TIMEOUT = float(os.getenv('GMAIL_STREAM_STALL_TIMEOUT', '60'))
+
+_discovery_doc: Optional[Dict] = None
+_discovery_doc_lock = threading.Lock()
+
+
+class HistoryExpiredError(Exception):
+    """
+    Raised when Gmail no longer has history for the requested historyId.
+    The caller has to fall back to a full resync.
+    """
+
+
+def _build_credentials(access_token: str, refresh_token: Optional[str]) -> Credentials:
+    return Credentials(
+        token=access_token,
+        refresh_token=refresh_token,
+        token_uri='https://oauth2.googleapis.com/token',
+        client_id=os.getenv('GOOGLE_CLIENT_ID'),
+        client_secret=os.getenv('GOOGLE_CLIENT_SECRET')
+    )
+
+
+def get_discovery_doc() -> Dict:
+    """
+    Return the Gmail v1 discovery document, parsed once per process.
+    
+    Uses the static copy shipped with google-api-python-client, so building a
+    client never needs a network round trip for discovery.
+    """
+    global _discovery_doc
+    if _discovery_doc is None:
+        with _discovery_doc_lock:
+            if _discovery_doc is None:
+                _discovery_doc = json.loads(discovery_cache.get_static_doc('gmail', 'v1'))
+    return _discovery_doc
+
 
 def get_gmail_service(access_token: str, refresh_token: Optional[str] = None) -> object:
     """
     Create and return Gmail API service instance.
     
+    The service is not pooled; prefer gmail_client() for repeated calls.
+    
     Args:
         access_token: OAuth 2.0 access token
         refresh_token: OAuth 2.0 refresh token (optional)
@@ -28,23 +105,209 @@ def get_gmail_service(access_token: str, refresh_token: Optional[str] = None) ->
     Returns:
         Gmail API service object
     """
-    credentials = Credentials(
-        token=access_token,
-        refresh_token=refresh_token,
-        token_uri='https://oauth2.googleapis.com/token',
-        client_id=os.getenv('GOOGLE_CLIENT_ID'),
-        client_secret=os.getenv('GOOGLE_CLIENT_SECRET')
-    )
+    credentials = _build_credentials(access_token, refresh_token)
     
-    service = build('gmail', 'v1', credentials=credentials)
+    service = build_from_document(get_discovery_doc(), credentials=credentials)
     return service
 
 
+class _PoolEntry:
+    """
+    Pooled clients of a single account.
+    """
+    
+    def __init__(self, access_token: str, refresh_token: Optional[str]):
+        # Tokens as last handed in by the caller. Pooled clients refresh
+        # self.credentials in place, so it may hold a newer access token.
+        self.tokens = (access_token, refresh_token)
+        self.credentials = _build_credentials(access_token, refresh_token)
+        self.idle: List[Tuple[object, AuthorizedHttp]] = []
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class GmailClientPool:
+    """
+    Long-lived registry of Gmail API clients keyed by account.
+    
+    Every client is built from the cached discovery document and owns an
+    httplib2 transport whose keep-alive connections are reused across calls.
+    httplib2 is not thread-safe, so a client is leased to one caller at a
+    time; concurrent callers for the same account get extra clients that
+    share the account's credentials.
+    
+    Accounts beyond max_accounts are evicted least recently used first, and
+    accounts idle for longer than idle_timeout seconds are dropped. Leased
+    accounts are never evicted, so while more than max_accounts are in use
+    the pool holds them all.
+    """
+    
+    def __init__(
+        self,
+        max_accounts: int = GMAIL_POOL_MAX_ACCOUNTS,
+        max_idle_per_account: int = GMAIL_POOL_MAX_IDLE_PER_ACCOUNT,
+        idle_timeout: float = GMAIL_POOL_IDLE_TIMEOUT,
+        http_timeout: float = GMAIL_HTTP_TIMEOUT,
+        discovery_doc: Optional[Dict] = None
+    ):
+        self.max_accounts = max_accounts
+        self.max_idle_per_account = max_idle_per_account
+        self.idle_timeout = idle_timeout
+        self.http_timeout = http_timeout
+        self._discovery_doc = discovery_doc
+        self._entries: 'OrderedDict[object, _PoolEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'clients_built': 0, 'clients_reused': 0, 'credential_swaps': 0, 'evictions': 0}
+    
+    @contextmanager
+    def client(self, key, access_token: str, refresh_token: Optional[str] = None):
+        """
+        Lease a Gmail API service object for the given account.
+        
+        Args:
+            key: Account key, normally the UserAccount ID
+            access_token: OAuth 2.0 access token
+            refresh_token: OAuth 2.0 refresh token (optional)
+        
+        Yields:
+            Gmail API service object
+        """
+        service, http = self._acquire(key, access_token, refresh_token)
+        try:
+            yield service
+        finally:
+            self._release(key, service, http)
+    
+    def update_credentials(self, key, access_token: str, refresh_token: Optional[str] = None) -> None:
+        """
+        Swap the tokens of an account's pooled clients without rebuilding them.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._swap_credentials(entry, access_token, refresh_token)
+    
+    def evict(self, key) -> None:
+        """
+        Drop all pooled clients of an account.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._close(entry)
+    
+    def clear(self) -> None:
+        """
+        Drop every pooled client and close its connections.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry)
+    
+    def _acquire(self, key, access_token: str, refresh_token: Optional[str]):
+        with self._lock:
+            evicted = self._evict_expired()
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _PoolEntry(access_token, refresh_token)
+                self._entries[key] = entry
+            elif entry.tokens != (access_token, refresh_token):
+                self._swap_credentials(entry, access_token, refresh_token)
+            self._entries.move_to_end(key)
+            # Leased before evicting, so the entry itself is never evicted
+            entry.in_use += 1
+            entry.last_used = time.monotonic()
+            evicted += self._evict_over_capacity()
+            pooled = entry.idle.pop() if entry.idle else None
+            credentials = entry.credentials
+            self.stats['clients_reused' if pooled else 'clients_built'] += 1
+        
+        for old in evicted:
+            self._close(old)
+        
+        if pooled is not None:
+            return pooled
+        
+        http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=self.http_timeout))
+        service = build_from_document(self._discovery_doc or get_discovery_doc(), http=http)
+        return service, http
+    
+    def _release(self, key, service, http: AuthorizedHttp) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+                if len(entry.idle) < self.max_idle_per_account:
+                    # Pick up credentials swapped while this client was leased
+                    http.credentials = entry.credentials
+                    entry.idle.append((service, http))
+                    return
+        http.close()
+    
+    def _swap_credentials(self, entry: _PoolEntry, access_token: str, refresh_token: Optional[str]) -> None:
+        entry.tokens = (access_token, refresh_token)
+        entry.credentials = _build_credentials(access_token, refresh_token)
+        for _, http in entry.idle:
+            http.credentials = entry.credentials
+        self.stats['credential_swaps'] += 1
+    
+    def _evict_expired(self) -> List[_PoolEntry]:
+        now = time.monotonic()
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry.in_use == 0 and now - entry.last_used > self.idle_timeout
+        ]
+        return [self._pop(key) for key in expired]
+    
+    def _evict_over_capacity(self) -> List[_PoolEntry]:
+        evicted = []
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_accounts:
+                break
+            if self._entries[key].in_use == 0:
+                evicted.append(self._pop(key))
+        return evicted
+    
+    def _pop(self, key) -> _PoolEntry:
+        self.stats['evictions'] += 1
+        return self._entries.pop(key)
+    
+    @staticmethod
+    def _close(entry: _PoolEntry) -> None:
+        for _, http in entry.idle:
+            http.close()
+        entry.idle.clear()
+
+
+# Process-wide client pool used by the fetch functions below
+client_pool = GmailClientPool()
+
+
+def gmail_client(access_token: str, refresh_token: Optional[str] = None, account_id: Optional[int] = None):
+    """
+    Lease a pooled Gmail API service object.
+    
+    Clients are keyed by account_id when given, otherwise by the refresh token
+    (or access token), so the same account reuses its clients across calls.
+    
+    Example:
+        with gmail_client(user.access_token, user.refresh_token, user.id) as service:
+            service.users().getProfile(userId='me').execute()
+    """
+    key = account_id if account_id is not None else (refresh_token or access_token)
+    return client_pool.client(key, access_token, refresh_token)
+
+
 def fetch_emails_since_date(
     access_token: str,
     refresh_token: Optional[str],
     since_date: datetime,
-    max_results: int = 100
+    max_results: int = 100,
+    account_id: Optional[int] = None,
+    id_filter: Optional[Callable[[List[str]], List[str]]] = None
 ) -> List[Dict]:
     """
     Fetch emails from Gmail account since a given date.
@@ -54,66 +317,385 @@ def fetch_emails_since_date(
         refresh_token: OAuth 2.0 refresh token
         since_date: DateTime to fetch emails from (inclusive)
         max_results: Maximum number of emails to return
+        account_id: Account key for the client pool (optional)
+        id_filter: Called with each page of listed message IDs; only the IDs
+            it returns are fetched (optional)
     
     Returns:
         List of email dictionaries with parsed information
     """
+    return list(iter_emails_since_date(
+        access_token, refresh_token, since_date, max_results, account_id, id_filter
+    ))
+
+
+def iter_emails_since_date(
+    access_token: str,
+    refresh_token: Optional[str],
+    since_date: datetime,
+    max_results: int = 100,
+    account_id: Optional[int] = None,
+    id_filter: Optional[Callable[[List[str]], List[str]]] = None
+) -> Iterator[Dict]:
+    """
+    Lazily fetch emails from Gmail account since a given date.
+    
+    Message IDs are listed one page at a time and fetched with batch calls of
+    GMAIL_BATCH_SIZE messages, so the first emails are available after one
+    list and one batch call. Stops as soon as max_results emails have been
+    listed.
+    
+    Args:
+        access_token: OAuth 2.0 access token
+        refresh_token: OAuth 2.0 refresh token
+        since_date: DateTime to fetch emails from (inclusive)
+        max_results: Maximum number of emails to return
+        account_id: Account key for the client pool (optional)
+        id_filter: Called with each page of listed message IDs; only the IDs
+            it returns are fetched (optional)
+    
+    Yields:
+        Email dictionaries with parsed information, newest first
+    """
     try:
-        service = get_gmail_service(access_token, refresh_token)
-        
-        # Convert datetime to Unix timestamp (seconds) for Gmail API
-        # Gmail API uses Unix timestamp in seconds
-        #timestamp_seconds = int(since_date.timestamp())
-        
-        # Query Gmail API for messages after the given date
-        query = f'-in:archived'
+        with gmail_client(access_token, refresh_token, account_id) as service:
+            query = build_inbox_query(since_date)
+            
+            for message_ids in iter_message_id_pages(service, query, max_results):
+                if id_filter is not None:
+                    message_ids = id_filter(message_ids)
+                    if not message_ids:
+                        continue
+                # Fetch message details through the batch endpoint instead of one
+                # HTTP round trip per message, one batch call at a time so each
+                # call's emails are yielded before the next call is made
+                for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+                    yield from fetch_messages_batch(service, message_ids[start:start + GMAIL_BATCH_SIZE])
         
-        # Fetch message list
-        results = service.users().messages().list(
+    except Exception as e:
+        raise Exception(f"Error fetching emails from Gmail API: {str(e)}")
+
+
+async def aiter_emails_since_date(
+    access_token: str,
+    refresh_token: Optional[str],
+    since_date: datetime,
+    max_results: int = 100,
+    account_id: Optional[int] = None,
+    id_filter: Optional[Callable[[List[str]], List[str]]] = None,
+    prefetch: int = GMAIL_LIST_PAGE_SIZE,
+    stall_timeout: float = GMAIL_STREAM_STALL_TIMEOUT
+) -> AsyncIterator[Dict]:
+    """
+    Async version of iter_emails_since_date.
+    
+    The blocking Gmail calls run on the background Google I/O pool, in a
+    thread that keeps loading the next pages (up to `prefetch` emails
+    ahead) while the caller processes the emails already yielded. If the
+    caller takes no email for `stall_timeout` seconds while the buffer is
+    full, the thread stops, and the iterator raises GoogleIOTimeoutError
+    once the buffered emails are consumed.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(prefetch)
+    stop = threading.Event()
+    done = object()
+    
+    def _produce():
+        try:
+            for email in iter_emails_since_date(
+                access_token, refresh_token, since_date, max_results, account_id, id_filter
+            ):
+                if not slots.acquire(timeout=stall_timeout):
+                    raise GoogleIOTimeoutError(
+                        f"Stopped fetching emails: none was taken within {stall_timeout}s"
+                    )
+                if stop.is_set():
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, email)
+            item = done
+        except Exception as e:
+            item = e
+        loop.call_soon_threadsafe(queue.put_nowait, item)
+    
+    background_google_io.submit(_produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            slots.release()
+            yield item
+    finally:
+        # Let the worker thread stop if the caller stopped iterating early
+        stop.set()
+        slots.release()
+
+
+def build_inbox_query(since_date: Optional[datetime] = None) -> str:
+    """
+    Build the Gmail search query for inbox messages received after since_date.
+    """
+    query = '-in:archived'
+    if since_date is not None:
+        # Gmail's after: operator takes a Unix timestamp in seconds
+        if since_date.tzinfo is None:
+            since_date = since_date.replace(tzinfo=timezone.utc)
+        query += f' after:{int(since_date.timestamp())}'
+    return query
+
+
+def iter_message_id_pages(
+    service,
+    query: str,
+    max_results: int = 100,
+    page_size: int = GMAIL_LIST_PAGE_SIZE
+) -> Iterator[List[str]]:
+    """
+    Page through messages matching a Gmail search query, newest first.
+    
+    Follows nextPageToken lazily and stops once max_results IDs have been
+    yielded, so no page beyond the one that reaches the limit is requested.
+    
+    Args:
+        service: Gmail API service object
+        query: Gmail search query
+        max_results: Maximum number of message IDs to yield in total
+        page_size: Maximum number of message IDs requested per page
+    
+    Yields:
+        Lists of Gmail message IDs, one list per page
+    """
+    remaining = max_results
+    page_token = None
+    messages_resource = service.users().messages()
+    
+    while remaining > 0:
+        results = messages_resource.list(
             userId='me',
             q=query,
+            maxResults=min(page_size, remaining),
+            pageToken=page_token
         ).execute()
         
-        # print results in json format
-        # print("msg list result in json format: ", json.dumps(results, indent=4))
+        message_ids = [msg['id'] for msg in results.get('messages', [])][:remaining]
+        if message_ids:
+            remaining -= len(message_ids)
+            yield message_ids
+        
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def list_message_ids(service, query: str, max_results: int = 100) -> List[str]:
+    """
+    List IDs of messages matching a Gmail search query, newest first.
+    
+    Args:
+        service: Gmail API service object
+        query: Gmail search query
+        max_results: Maximum number of message IDs to return
+    
+    Returns:
+        List of Gmail message IDs
+    """
+    return [
+        message_id
+        for page in iter_message_id_pages(service, query, max_results)
+        for message_id in page
+    ]
 
-        messages = results.get('messages', [])
-        emails = []
+
+def fetch_messages_batch(
+    service,
+    message_ids: List[str],
+    chunk_size: int = GMAIL_BATCH_SIZE,
+    max_retries: int = GMAIL_BATCH_MAX_RETRIES
+) -> List[Dict]:
+    """
+    Fetch metadata for many messages using the Gmail batch endpoint.
+    
+    Message IDs are sent in chunks of `chunk_size` sub-requests per HTTP call.
+    Sub-requests that fail with a retryable status are collected and sent
+    again in a follow-up batch with exponential backoff. Messages that no
+    longer exist (deleted between listing and fetching) are skipped.
+    
+    Args:
+        service: Gmail API service object
+        message_ids: Gmail message IDs to fetch
+        chunk_size: Maximum number of sub-requests per batch call
+        max_retries: Maximum number of retries for each failed sub-request
+    
+    Returns:
+        List of email dictionaries in the same order as message_ids
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    
+    messages: Dict[int, Dict] = {}
+    pending = list(range(len(message_ids)))
+    
+    for attempt in range(max_retries + 1):
+        failed: Dict[int, Exception] = {}
         
+        def _callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is None:
+                messages[index] = response
+            else:
+                failed[index] = exception
         
-        # Fetch full message details
-        for msg in messages:
-            message = service.users().messages().get(
-                userId='me',
-                id=msg['id'],
-                format='metadata',
-                metadataHeaders=['From', 'Subject', 'Date']
-            ).execute()
+        # Each users().messages() call builds a new resource object (with
+        # reference cycles), so build it once rather than per message
+        messages_resource = service.users().messages()
+        for start in range(0, len(pending), chunk_size):
+            batch = service.new_batch_http_request(callback=_callback)
+            for index in pending[start:start + chunk_size]:
+                batch.add(
+                    messages_resource.get(
+                        userId='me',
+                        id=message_ids[index],
+                        format='metadata',
+                        metadataHeaders=METADATA_HEADERS
+                    ),
+                    request_id=str(index)
+                )
+            batch.execute()
+        
+        if not failed:
+            break
+        
+        for index, exception in list(failed.items()):
+            if isinstance(exception, HttpError) and exception.resp.status == 404:
+                del failed[index]
+                continue
+            if not _is_retryable(exception) or attempt == max_retries:
+                raise Exception(
+                    f"Failed to fetch message {message_ids[index]}: {str(exception)}"
+                )
+        
+        if not failed:
+            break
+        
+        pending = sorted(failed)
+        time.sleep(min(2 ** attempt * 0.5, 8))
+    
+    return [_message_to_email(messages[index]) for index in range(len(message_ids)) if index in messages]
 
-            #print("single message in json format: ", json.dumps(message, indent=4))
 
-            # Extract full message body
-            print("Full message body: ", body_text)
+def get_history_id(service) -> str:
+    """
+    Get the mailbox's current historyId from the user's Gmail profile.
+    """
+    profile = service.users().getProfile(userId='me').execute()
+    return profile['historyId']
 
-            
-            # Parse message headers
-            headers = {h['name']: h['value'] for h in message['payload'].get('headers', [])}
-            
-            # Extract email information
-            email_data = {
-                'id': message['id'],
-                'subject': headers.get('Subject', '(No Subject)'),
-                'sender': headers.get('From', 'Unknown'),
-                'body': message.get('snippet', ''),
-                'received_at': _parse_date(headers.get('Date', ''))
-            }
-            
-            emails.append(email_data)
+
+def watch_inbox(service, topic_name: str, label_ids: Optional[List[str]] = None) -> Dict:
+    """
+    Start or renew Gmail push notifications to a Cloud Pub/Sub topic.
+
+    Calling it again before the watch expires simply extends it.
+
+    Args:
+        service: Gmail API service object
+        topic_name: Full topic name, e.g. "projects/<project>/topics/<topic>"
+        label_ids: Only notify for changes to these labels (default: INBOX)
+
+    Returns:
+        Dictionary with the mailbox 'historyId' and the watch 'expiration'
+        (epoch milliseconds, as a string)
+    """
+    return service.users().watch(userId='me', body={
+        'topicName': topic_name,
+        'labelIds': label_ids or ['INBOX'],
+        'labelFilterBehavior': 'INCLUDE',
+    }).execute()
+
+
+def list_added_message_ids(
+    service,
+    start_history_id: str,
+    label_id: str = 'INBOX'
+) -> Tuple[List[str], str]:
+    """
+    List IDs of messages added to a label since the given historyId.
+    
+    Follows every page of users.history.list.
+    
+    Args:
+        service: Gmail API service object
+        start_history_id: historyId checkpoint from the previous sync
+        label_id: Only report messages added with this label
+    
+    Returns:
+        Tuple of (message IDs in the order they were added, latest historyId)
+    
+    Raises:
+        HistoryExpiredError: If Gmail no longer has history for start_history_id
+    """
+    message_ids = []
+    seen = set()
+    history_id = start_history_id
+    page_token = None
+    
+    while True:
+        try:
+            results = service.users().history().list(
+                userId='me',
+                startHistoryId=start_history_id,
+                historyTypes=['messageAdded'],
+                labelId=label_id,
+                pageToken=page_token
+            ).execute()
+        except HttpError as e:
+            # Gmail answers 404 once the historyId is older than its retention window
+            if e.resp.status == 404:
+                raise HistoryExpiredError(
+                    f"historyId {start_history_id} is no longer available"
+                )
+            raise
         
-        return emails
+        for record in results.get('history', []):
+            for added in record.get('messagesAdded', []):
+                message_id = added['message']['id']
+                if message_id not in seen:
+                    seen.add(message_id)
+                    message_ids.append(message_id)
         
-    except Exception as e:
-        raise Exception(f"Error fetching emails from Gmail API: {str(e)}")
+        history_id = results.get('historyId', history_id)
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return message_ids, history_id
+
+
+def _is_retryable(exception: Exception) -> bool:
+    """
+    Check whether a failed batch sub-request should be retried.
+    """
+    if isinstance(exception, HttpError):
+        return exception.resp.status in RETRYABLE_STATUSES
+    return False
+
+
+def _message_to_email(message: Dict) -> Dict:
+    """
+    Convert a Gmail API message in metadata format to an email dictionary.
+    """
+    # Parse message headers
+    headers = {h['name']: h['value'] for h in message['payload'].get('headers', [])}
+    
+    return {
+        'id': message['id'],
+        'subject': headers.get('Subject', '(No Subject)'),
+        'sender': headers.get('From', 'Unknown'),
+        'body': message.get('snippet', ''),
+        'received_at': _parse_date(headers.get('Date', ''))
+    }
 
 
 def _extract_message_body(message: Dict) -> str:
@@ -0,0 +1,196 @@
+"""
+Verification of Google ID tokens (Sign in with Google credentials) with
+cached signing certificates and a short-lived cache of verified tokens.
+
+google.oauth2.id_token downloads Google's public certificates on every
+verification unless the transport caches them. Google serves them with a
+Cache-Control max-age of several hours, so CachingRequest keeps each GET
+response for as long as its max-age allows. Verified tokens are remembered
+briefly (never past their own expiry), so a retried or duplicated login
+skips the signature check.
+"""
+from google.auth import transport
+from google.auth.transport.requests import Request as GoogleRequest
+from google.oauth2 import id_token
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional, Tuple
+import hashlib
+import os
+import re
+import threading
+import time
+
+import requests
+
+# Where Google publishes the certificates its ID tokens are signed with
+GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Seconds a verified ID token is reused, and how many are kept
+ID_TOKEN_CACHE_TTL = float(os.getenv('ID_TOKEN_CACHE_TTL', '300'))
+ID_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('ID_TOKEN_CACHE_MAX_ENTRIES', '10000'))
+
+_max_age_pattern = re.compile(r'(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+def cache_lifetime(headers: Mapping[str, str]) -> float:
+    """
+    Seconds a response may be reused according to its Cache-Control and Age
+    headers. Zero if it must not be cached.
+    """
+    headers = {key.lower(): value for key, value in headers.items()}
+    cache_control = headers.get('cache-control', '')
+    if re.search(r'no-store|no-cache|private', cache_control, re.IGNORECASE):
+        return 0.0
+    match = _max_age_pattern.search(cache_control)
+    if not match:
+        return 0.0
+    try:
+        age = float(headers.get('age', 0))
+    except ValueError:
+        age = 0.0
+    return max(float(match.group(1)) - age, 0.0)
+
+
+class _CachedResponse(transport.Response):
+    def __init__(self, response: transport.Response):
+        self._status = response.status
+        self._headers = dict(response.headers)
+        self._data = response.data
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def headers(self):
+        return self._headers
+
+    @property
+    def data(self):
+        return self._data
+
+
+class CachingRequest(transport.Request):
+    """
+    google.auth transport that reuses successful GET responses for their
+    Cache-Control max-age. Other requests pass straight through.
+
+    Shared by all logins, and safe to call from several threads: misses
+    are fetched one at a time, so an expired entry is refreshed once.
+    """
+
+    def __init__(self, session: Optional[requests.Session] = None):
+        self._request = GoogleRequest(session or requests.Session())
+        self._cache: Dict[str, Tuple[float, _CachedResponse]] = {}
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self.stats = {'fetches': 0, 'hits': 0}
+
+    def _cached(self, url: str) -> Optional[_CachedResponse]:
+        with self._lock:
+            entry = self._cache.get(url)
+            if entry is not None and entry[0] > time.monotonic():
+                self.stats['hits'] += 1
+                return entry[1]
+        return None
+
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        if method != 'GET' or body is not None:
+            return self._request(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+
+        response = self._cached(url)
+        if response is not None:
+            return response
+        with self._fetch_lock:
+            # Another thread may have refreshed it while we waited
+            response = self._cached(url)
+            if response is not None:
+                return response
+            response = self._request(url, method=method, headers=headers, timeout=timeout, **kwargs)
+            with self._lock:
+                self.stats['fetches'] += 1
+            lifetime = cache_lifetime(response.headers)
+            if response.status == 200 and lifetime > 0:
+                response = _CachedResponse(response)
+                with self._lock:
+                    self._cache[url] = (time.monotonic() + lifetime, response)
+            return response
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+
+class GoogleIdTokenVerifier:
+    """
+    Verifies Google ID tokens for a client ID, with cached certificates and
+    a bounded TTL cache of tokens that already passed verification.
+    """
+
+    def __init__(
+        self,
+        certs_url: str = GOOGLE_CERTS_URL,
+        request: Optional[transport.Request] = None,
+        ttl: float = ID_TOKEN_CACHE_TTL,
+        max_entries: int = ID_TOKEN_CACHE_MAX_ENTRIES
+    ):
+        self.certs_url = certs_url
+        self.request = request or CachingRequest()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at epoch seconds, idinfo)
+        self._verified: 'OrderedDict[str, Tuple[float, Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'token_hits': 0, 'token_misses': 0}
+
+    @staticmethod
+    def _key(credential: str, audience: str) -> str:
+        return hashlib.sha256(f'{audience}\0{credential}'.encode()).hexdigest()
+
+    def cached(self, credential: str, audience: str) -> Optional[Dict]:
+        """
+        Claims of an already verified, unexpired token, or None. Does no I/O,
+        so it can be called on the event loop.
+        """
+        key = self._key(credential, audience)
+        with self._lock:
+            entry = self._verified.get(key)
+            if entry is not None and entry[0] > time.time():
+                self._verified.move_to_end(key)
+                self._counters['token_hits'] += 1
+                return entry[1]
+            if entry is not None:
+                del self._verified[key]
+            self._counters['token_misses'] += 1
+            return None
+
+    def verify(self, credential: str, audience: str) -> Dict:
+        """
+        Verify signature, expiry, audience and issuer of an ID token.
+        Blocking: may download Google's certificates.
+
+        Raises:
+            ValueError: If the token is invalid
+        """
+        idinfo = id_token.verify_token(credential, self.request, audience=audience, certs_url=self.certs_url)
+        if idinfo.get('iss') not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer. 'iss' should be one of {GOOGLE_ISSUERS}")
+
+        expires_at = min(time.time() + self.ttl, float(idinfo.get('exp', 0)))
+        with self._lock:
+            self._verified[self._key(credential, audience)] = (expires_at, idinfo)
+            while len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+        return idinfo
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._counters)
+        if isinstance(self.request, CachingRequest):
+            stats.update({'cert_fetches': self.request.stats['fetches'], 'cert_hits': self.request.stats['hits']})
+        return stats
+
+
+google_id_tokens = GoogleIdTokenVerifier()
@@ -0,0 +1,194 @@
+"""
+Dedicated thread pool for blocking Google client calls (Gmail API, OAuth
+token exchange, ID token verification).
+
+The Google client libraries are synchronous. Running them on the event loop
+stalls every other request, and running them on the default executor lets
+a slow Google endpoint starve unrelated to_thread() work (database calls).
+This pool is sized separately, bounds how much work may queue up, applies
+timeouts and reports its saturation at /metrics.
+
+Interactive calls (sign-in, the OAuth callback, inbox requests) run on
+google_io. Long-running work (fetches of queued jobs, streamed inbox
+fetches, watch renewal) runs on background_google_io, so a large sync or a
+few slow streams cannot take every thread and time logins out.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Threads available for concurrent Google calls
+GOOGLE_IO_THREADS = int(os.getenv('GOOGLE_IO_THREADS', '16'))
+# Calls allowed to wait for a free thread before new ones are rejected
+GOOGLE_IO_MAX_QUEUE = int(os.getenv('GOOGLE_IO_MAX_QUEUE', '256'))
+# Default seconds a request handler waits for a Google call
+GOOGLE_IO_TIMEOUT = float(os.getenv('GOOGLE_IO_TIMEOUT', '30'))
+# Threads and queue bound of the pool for background and streaming work
+GOOGLE_IO_BACKGROUND_THREADS = int(os.getenv('GOOGLE_IO_BACKGROUND_THREADS', '8'))
+GOOGLE_IO_BACKGROUND_MAX_QUEUE = int(os.getenv('GOOGLE_IO_BACKGROUND_MAX_QUEUE', '256'))
+
+
+class GoogleIOTimeoutError(TimeoutError):
+    """
+    Raised when a Google call does not finish within its timeout.
+    """
+
+
+class GoogleIOBusyError(Exception):
+    """
+    Raised when too many Google calls are already waiting for a thread.
+    """
+
+
+class GoogleIOExecutor:
+    """
+    Bounded thread pool with queue-depth and saturation counters.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = GOOGLE_IO_THREADS,
+        max_queue: int = GOOGLE_IO_MAX_QUEUE,
+        timeout: float = GOOGLE_IO_TIMEOUT,
+        name: str = 'google-io'
+    ):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.name = name
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._started = 0
+        self._counters = {
+            'submitted': 0, 'completed': 0, 'failed': 0, 'timeouts': 0, 'rejected': 0,
+            'peak_queued': 0, 'queue_wait_ms_total': 0.0,
+        }
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self._executor
+
+    def submit(self, fn: Callable, *args, **kwargs) -> asyncio.Future:
+        """
+        Schedule `fn` on the pool and return an awaitable future, without a
+        timeout. Use for long-running background work.
+
+        Raises:
+            GoogleIOBusyError: If max_queue calls are already waiting
+        """
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters['rejected'] += 1
+                raise GoogleIOBusyError(f"{self._queued} Google calls are already queued")
+            self._queued += 1
+            self._counters['submitted'] += 1
+            self._counters['peak_queued'] = max(self._counters['peak_queued'], self._queued)
+        enqueued = time.perf_counter()
+        # 'started' once a thread picks the call up, 'abandoned' if the
+        # caller gave up on it before that
+        state = {'started': False, 'abandoned': False}
+
+        def _call():
+            with self._lock:
+                if state['abandoned']:
+                    return None
+                state['started'] = True
+                self._started += 1
+                self._queued -= 1
+                self._active += 1
+                self._counters['queue_wait_ms_total'] += (time.perf_counter() - enqueued) * 1000
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self._counters['failed'] += 1
+                raise
+            else:
+                with self._lock:
+                    self._counters['completed'] += 1
+                return result
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+        def _done(future: asyncio.Future):
+            if future.cancelled():
+                with self._lock:
+                    if not state['started']:
+                        state['abandoned'] = True
+                        self._queued -= 1
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._pool(), _call)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(_done)
+        return future
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run a blocking Google call on the pool and wait for it.
+
+        The thread itself cannot be interrupted, so on timeout the call keeps
+        running in the background and its result is discarded. Pair this
+        with an HTTP timeout on the client being called.
+
+        Args:
+            timeout: Seconds to wait (default: the executor's timeout)
+
+        Raises:
+            GoogleIOTimeoutError: If the call takes longer than `timeout`
+            GoogleIOBusyError: If max_queue calls are already waiting
+        """
+        future = self.submit(fn, *args, **kwargs)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._counters['timeouts'] += 1
+            name = getattr(fn, '__qualname__', None) or getattr(fn, '__name__', repr(fn))
+            logger.warning("Google call %s timed out after %ss", name, timeout)
+            raise GoogleIOTimeoutError(f"Google call {name} timed out after {timeout}s")
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            started = self._started
+            return {
+                'max_workers': self.max_workers,
+                'active': self._active,
+                'queued': self._queued,
+                'saturation': round(self._active / self.max_workers, 3),
+                'avg_queue_wait_ms': round(self._counters['queue_wait_ms_total'] / started, 3) if started else 0.0,
+                **{key: value for key, value in self._counters.items() if key != 'queue_wait_ms_total'},
+            }
+
+    def shutdown(self) -> None:
+        """
+        Stop accepting work and drop calls that have not started yet.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+google_io = GoogleIOExecutor()
+background_google_io = GoogleIOExecutor(
+    max_workers=GOOGLE_IO_BACKGROUND_THREADS,
+    max_queue=GOOGLE_IO_BACKGROUND_MAX_QUEUE,
+    name='google-io-background'
+)
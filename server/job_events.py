@@ -0,0 +1,189 @@
+"""
+Per-email progress events of processing jobs, streamed to clients as
+server-sent events by GET /jobs/{job_id}/events.
+
+Workers may run in other processes, so events are buffered in the
+job_events table rather than in memory. Their IDs increase, which lets a
+client that reconnects with Last-Event-ID resume right after the last event
+it received, until JOB_EVENTS_RETENTION_SECONDS after the job finished,
+when prune_events() deletes them.
+"""
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.db_models import JobEvent, ProcessingJob
+from database.database import AsyncSessionLocal
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import os
+
+# Seconds between checks for new events of a running job
+JOB_EVENTS_POLL_INTERVAL = float(os.getenv('JOB_EVENTS_POLL_INTERVAL', '0.5'))
+# Seconds of silence after which a comment is sent to keep proxies from
+# closing the stream
+JOB_EVENTS_KEEPALIVE = float(os.getenv('JOB_EVENTS_KEEPALIVE', '15'))
+# Events read from the database per query
+JOB_EVENTS_BATCH_SIZE = int(os.getenv('JOB_EVENTS_BATCH_SIZE', '500'))
+# Milliseconds a disconnected EventSource waits before reconnecting
+JOB_EVENTS_RETRY_MS = int(os.getenv('JOB_EVENTS_RETRY_MS', '2000'))
+# Seconds a finished job's events are kept for clients to catch up
+JOB_EVENTS_RETENTION_SECONDS = float(os.getenv('JOB_EVENTS_RETENTION_SECONDS', str(24 * 3600)))
+# Seconds between deletions of expired events by each job worker
+JOB_EVENTS_PRUNE_INTERVAL = float(os.getenv('JOB_EVENTS_PRUNE_INTERVAL', '600'))
+
+EVENT_TYPES = ('fetched', 'summarized', 'categorized', 'persisted', 'failed')
+FINISHED = ('succeeded', 'failed')
+
+
+def record_events(db: Session, job_id: int, events: Iterable[Tuple[str, Dict]]) -> None:
+    """
+    Append events to a job's buffer and commit.
+
+    The job row is locked first, so events of one job are committed in ID
+    order even when several workers write them; a reader that has seen an
+    ID can never miss a smaller one committed later.
+
+    Args:
+        db: Database session
+        job_id: Job the events belong to
+        events: (type, data) pairs, type one of EVENT_TYPES
+    """
+    rows = [JobEvent(job_id=job_id, type=type_, data=json.dumps(data, default=str)) for type_, data in events]
+    if not rows:
+        return
+    db.execute(select(ProcessingJob.id).where(ProcessingJob.id == job_id).with_for_update())
+    db.add_all(rows)
+    db.commit()
+
+
+def prune_events(db: Session, retention: float = JOB_EVENTS_RETENTION_SECONDS) -> int:
+    """
+    Delete the events of jobs that finished more than `retention` seconds
+    ago. The jobs themselves, and their final counters, are kept.
+
+    Returns:
+        Number of deleted events
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=retention)
+    expired = select(ProcessingJob.id).where(
+        ProcessingJob.status.in_(FINISHED),
+        ProcessingJob.updated_at < cutoff
+    )
+    deleted = db.execute(
+        delete(JobEvent).where(JobEvent.job_id.in_(expired)).execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return deleted
+
+
+async def events_after(db: AsyncSession, job_id: int, after_id: int = 0,
+                       limit: int = JOB_EVENTS_BATCH_SIZE) -> List[JobEvent]:
+    """
+    A job's buffered events with an ID above `after_id`, oldest first.
+    """
+    result = await db.scalars(
+        select(JobEvent)
+        .where(JobEvent.job_id == job_id, JobEvent.id > after_id)
+        .order_by(JobEvent.id)
+        .limit(limit)
+    )
+    return list(result.all())
+
+
+def job_progress(job: ProcessingJob, now: Optional[datetime] = None) -> Dict:
+    """
+    Running totals of a job and its throughput in emails per second since
+    it was queued.
+    """
+    now = now or datetime.now(timezone.utc)
+    created_at = job.created_at
+    if created_at is not None and created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    elapsed = max((now - created_at).total_seconds(), 0.0) if created_at else 0.0
+    done = job.processed + job.failed
+    return {
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'failed': job.failed,
+        'inserted': job.inserted,
+        'skipped': job.skipped,
+        'already_processed': job.already_processed,
+        'elapsed': round(elapsed, 3),
+        'emails_per_second': round(done / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+
+
+def format_sse(data: Dict, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """
+    One server-sent event. Data is JSON on a single line.
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream_job_events(
+    job_id: int,
+    last_event_id: int = 0,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    poll_interval: float = JOB_EVENTS_POLL_INTERVAL
+) -> AsyncIterator[str]:
+    """
+    Server-sent events of a job, starting after `last_event_id`.
+
+    Buffered events keep their type and carry their ID. Whenever the job's
+    counters change a "progress" event (see job_progress) follows; it has
+    no ID, so resuming is unaffected. Once the job has finished and every
+    event was sent, a final "done" event with the job's status ends the
+    stream.
+
+    Args:
+        job_id: Job to follow; ownership must be checked by the caller
+        last_event_id: ID of the last event the client received
+        is_disconnected: Checked between polls; the stream ends when it returns True
+        poll_interval: Seconds between checks for new events
+    """
+    yield f"retry: {JOB_EVENTS_RETRY_MS}\n\n"
+    last_progress = None
+    quiet_since = asyncio.get_running_loop().time()
+    while True:
+        async with AsyncSessionLocal() as db:
+            # Read the job before its events: once it is finished, every
+            # event it will ever have is committed already
+            job = await db.get(ProcessingJob, job_id)
+            if job is None:
+                return
+            events = await events_after(db, job_id, last_event_id)
+
+        chunks = []
+        for event in events:
+            chunks.append(format_sse(json.loads(event.data), event.type, event.id))
+            last_event_id = event.id
+        progress = job_progress(job)
+        counters = {key: value for key, value in progress.items() if key not in ('elapsed', 'emails_per_second')}
+        if counters != last_progress:
+            chunks.append(format_sse(progress, 'progress'))
+            last_progress = counters
+
+        if chunks:
+            yield ''.join(chunks)
+            quiet_since = asyncio.get_running_loop().time()
+        elif asyncio.get_running_loop().time() - quiet_since >= JOB_EVENTS_KEEPALIVE:
+            yield ": keepalive\n\n"
+            quiet_since = asyncio.get_running_loop().time()
+
+        if len(events) == JOB_EVENTS_BATCH_SIZE:
+            continue  # more are buffered; send them without waiting
+        if job.status in FINISHED:
+            yield format_sse({'status': job.status, 'error': job.error}, 'done')
+            return
+        if is_disconnected is not None and await is_disconnected():
+            return
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,738 @@
+"""
+Durable, database-backed job queue for email processing.
+
+POST /emails/process creates a ProcessingJob with one "fetch" work item;
+background syncs of connected accounts, scheduled or pushed, are queued
+as "sync" jobs the same way (see enqueue_sync and enqueue_push_sync).
+The fetch item lists and fetches new mail from Gmail and enqueues one
+"process" item per batch of emails. Process items run the LLM analysis and
+store the results, recording per-email progress events (see job_events.py)
+as they go. Items are leased by workers. A lease that is not
+completed in time (e.g. the worker died) can be taken over by another
+worker, and failed items are retried with backoff up to JOB_MAX_ATTEMPTS.
+"""
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+from models.db_models import Email, JobEvent, ProcessingJob, UserAccount, WorkItem
+from database.database import SessionLocal
+from email_processing import analyze_emails, LLM_MODE
+from email_store import upsert_emails, NewMessageFilter
+from email_sync_service import fetch_new_emails, save_checkpoint
+from gmail_service import fetch_emails_since_date
+from google_io import background_google_io
+from job_events import prune_events, record_events, JOB_EVENTS_PRUNE_INTERVAL
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Emails per "process" work item
+JOB_BATCH_SIZE = int(os.getenv('JOB_BATCH_SIZE', '20'))
+# Seconds a work item stays leased without renewal before others can
+# reclaim it; live workers renew their leases every third of this
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '60'))
+# Attempts per work item before it is marked failed
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+# Work items a worker processes at the same time
+JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', '4'))
+# Seconds a worker waits before polling an empty queue again
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+# Seconds running items get to finish when a worker stops; items still
+# running then are cancelled and released for other workers
+JOB_SHUTDOWN_GRACE_SECONDS = float(os.getenv('JOB_SHUTDOWN_GRACE_SECONDS', '30'))
+# Run a queue worker inside the API process
+JOB_WORKER_ENABLED = os.getenv('JOB_WORKER_ENABLED', 'true').lower() == 'true'
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _encode_emails(emails: List[Dict]) -> List[Dict]:
+    return [
+        {**email, 'received_at': email['received_at'].isoformat() if email.get('received_at') else None}
+        for email in emails
+    ]
+
+
+def _decode_emails(emails: List[Dict]) -> List[Dict]:
+    return [
+        {**email, 'received_at': datetime.fromisoformat(email['received_at']) if email.get('received_at') else None}
+        for email in emails
+    ]
+
+
+def _email_event(email: Dict, *keys: str) -> Dict:
+    event = {key: email.get(key) for key in ('id', 'subject', 'sender') + keys}
+    event['received_at'] = email['received_at'].isoformat() if email.get('received_at') else None
+    return event
+
+
+def enqueue_job(db: Session, account_id: int, params: Dict, kind: str = 'process', delay: float = 0) -> ProcessingJob:
+    """
+    Create a processing job with its initial fetch work item.
+
+    Args:
+        params: since_date (ISO string), max_results, incremental, llm_mode
+        kind: "process", or "sync" for background syncs (see enqueue_sync)
+        delay: Seconds before the fetch item may be leased
+    """
+    job = ProcessingJob(account_id=account_id, kind=kind, params=json.dumps(params))
+    job.items.append(WorkItem(
+        kind='fetch', payload=json.dumps(params), available_at=_now() + timedelta(seconds=delay)
+    ))
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def enqueue_sync(db: Session, account_id: int, min_interval: float = 0) -> Optional[ProcessingJob]:
+    """
+    Queue an incremental sync of an account, unless a sync job of the
+    account is still open or was created less than `min_interval` seconds
+    ago.
+
+    The account row is locked while checking (FOR UPDATE on PostgreSQL), so
+    schedulers in several API processes queue one job between them.
+
+    Returns:
+        The new job, or None if the account needs no sync yet
+    """
+    db.execute(select(UserAccount.id).where(UserAccount.id == account_id).with_for_update())
+    created_after = _now() - timedelta(seconds=min_interval)
+    existing = db.scalar(
+        select(ProcessingJob.id).where(
+            ProcessingJob.account_id == account_id,
+            ProcessingJob.kind == 'sync',
+            or_(ProcessingJob.status.in_(('pending', 'running')), ProcessingJob.created_at > created_after)
+        ).limit(1)
+    )
+    if existing is not None:
+        db.rollback()
+        return None
+    return enqueue_job(db, account_id, {'incremental': True}, kind='sync')
+
+
+def enqueue_push_sync(db: Session, account_id: int, delay: float = 0) -> Optional[ProcessingJob]:
+    """
+    Queue an incremental sync of an account after a push notification,
+    unless a sync job of the account has not started fetching yet: that
+    fetch covers the notified change too. Syncs already fetching get a
+    follow-up job.
+
+    Args:
+        delay: Seconds to wait before fetching, so a burst of notifications
+            is coalesced into one job
+
+    Returns:
+        The new job, or None if the notification was coalesced
+    """
+    db.execute(select(UserAccount.id).where(UserAccount.id == account_id).with_for_update())
+    queued = db.scalar(
+        select(WorkItem.id)
+        .join(ProcessingJob, WorkItem.job_id == ProcessingJob.id)
+        .where(
+            ProcessingJob.account_id == account_id,
+            ProcessingJob.kind == 'sync',
+            WorkItem.kind == 'fetch',
+            WorkItem.status == 'pending'
+        ).limit(1)
+    )
+    if queued is not None:
+        db.rollback()
+        return None
+    return enqueue_job(db, account_id, {'incremental': True}, kind='sync', delay=delay)
+
+
+def lease_items(db: Session, worker_id: str, limit: int = 1) -> List[WorkItem]:
+    """
+    Atomically lease up to `limit` available work items for a worker.
+
+    Items are available when pending and due, or when their lease expired
+    with attempts left (see fail_abandoned_items for the others). On
+    PostgreSQL the candidates are selected with FOR UPDATE SKIP LOCKED,
+    so concurrent workers never lease the same item. SQLite serializes
+    writers, which makes the single UPDATE ... RETURNING equally safe.
+    """
+    now = _now()
+    claimable = or_(
+        and_(WorkItem.status == 'pending', WorkItem.available_at <= now),
+        and_(
+            WorkItem.status == 'leased',
+            WorkItem.lease_expires_at < now,
+            WorkItem.attempts < JOB_MAX_ATTEMPTS
+        ),
+    )
+    candidates = (
+        select(WorkItem.id)
+        .where(claimable)
+        .order_by(WorkItem.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(WorkItem)
+        .where(WorkItem.id.in_(candidates.scalar_subquery()), claimable)
+        .values(
+            status='leased',
+            leased_by=worker_id,
+            lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+            attempts=WorkItem.attempts + 1,
+        )
+        .returning(WorkItem)
+        .execution_options(synchronize_session=False)
+    )
+    items = list(db.scalars(stmt))
+    # Detach before committing so the leased values stay readable
+    db.expunge_all()
+    db.commit()
+    return items
+
+
+def complete_item(db: Session, item: WorkItem, worker_id: str, result: Optional[Dict] = None) -> bool:
+    """
+    Mark a leased item done. Returns False if the lease was lost meanwhile.
+    """
+    updated = db.execute(
+        update(WorkItem)
+        .where(WorkItem.id == item.id, WorkItem.status == 'leased', WorkItem.leased_by == worker_id)
+        .values(status='done', result=json.dumps(result) if result is not None else None, error=None)
+    ).rowcount
+    db.commit()
+    return updated == 1
+
+
+def fail_item(db: Session, item: WorkItem, worker_id: str, error: str) -> bool:
+    """
+    Release a failed item for retry with exponential backoff, or mark it
+    failed after JOB_MAX_ATTEMPTS. Returns True if the item failed for good
+    here, False if it is retried or the lease was lost meanwhile.
+    """
+    final = item.attempts >= JOB_MAX_ATTEMPTS
+    values = {'error': error, 'leased_by': None, 'lease_expires_at': None}
+    if final:
+        values['status'] = 'failed'
+    else:
+        values['status'] = 'pending'
+        values['available_at'] = _now() + timedelta(seconds=2 ** item.attempts)
+    updated = db.execute(
+        update(WorkItem)
+        .where(WorkItem.id == item.id, WorkItem.status == 'leased', WorkItem.leased_by == worker_id)
+        .values(**values)
+    ).rowcount
+    db.commit()
+    # A lost lease is the new holder's to fail
+    return final and updated == 1
+
+
+def renew_leases(db: Session, worker_id: str, item_ids: List[int]) -> None:
+    """
+    Extend the leases a live worker still holds, so long-running items are
+    not reclaimed while JOB_LEASE_SECONDS stays short enough to notice dead
+    workers quickly.
+    """
+    if not item_ids:
+        return
+    db.execute(
+        update(WorkItem)
+        .where(WorkItem.id.in_(item_ids), WorkItem.status == 'leased', WorkItem.leased_by == worker_id)
+        .values(lease_expires_at=_now() + timedelta(seconds=JOB_LEASE_SECONDS))
+    )
+    db.commit()
+
+
+def release_leases(db: Session, worker_prefix: str, item_ids: Optional[List[int]] = None) -> int:
+    """
+    Return items leased by workers whose ID starts with `worker_prefix` to
+    the queue right away, instead of waiting for their leases to expire.
+    Used for workers that shut down or are known to have died.
+
+    Returns:
+        Number of released items
+    """
+    stmt = update(WorkItem).where(
+        WorkItem.status == 'leased',
+        WorkItem.leased_by.startswith(worker_prefix, autoescape=True)
+    )
+    if item_ids is not None:
+        stmt = stmt.where(WorkItem.id.in_(item_ids))
+    released = db.execute(
+        stmt.values(status='pending', leased_by=None, lease_expires_at=None, available_at=_now())
+    ).rowcount
+    db.commit()
+    return released
+
+
+def worker_prefix(pid: Optional[int] = None) -> str:
+    """
+    Prefix shared by the IDs of every JobWorker in a process on this host.
+    """
+    return f"{socket.gethostname()}:{pid or os.getpid()}:"
+
+
+def _add_progress(db: Session, job_id: int, **counters: int) -> None:
+    # Atomic increments; several workers update the same job concurrently
+    values = {name: getattr(ProcessingJob, name) + amount for name, amount in counters.items()}
+    db.execute(update(ProcessingJob).where(ProcessingJob.id == job_id).values(updated_at=_now(), **values))
+    db.commit()
+
+
+def _finish_job_if_done(db: Session, job_id: int) -> None:
+    open_items = db.scalar(
+        select(func.count(WorkItem.id)).where(
+            WorkItem.job_id == job_id,
+            WorkItem.status.in_(('pending', 'leased'))
+        )
+    )
+    if open_items:
+        return
+
+    failed_items = db.scalar(
+        select(func.count(WorkItem.id)).where(WorkItem.job_id == job_id, WorkItem.status == 'failed')
+    )
+    # Only the worker whose update flips the status runs the completion step
+    finished = db.execute(
+        update(ProcessingJob)
+        .where(ProcessingJob.id == job_id, ProcessingJob.status.in_(('pending', 'running')))
+        .values(status='failed' if failed_items else 'succeeded', updated_at=_now())
+    ).rowcount
+    db.commit()
+    if not finished:
+        return
+
+    job = db.get(ProcessingJob, job_id)
+    if job.history_id:
+        # Advance the incremental checkpoint once every email is stored or
+        # has failed for good. A message that fails every attempt stays
+        # recorded on its failed work item and in "failed" events; holding
+        # the checkpoint back for it would refetch it on every later sync
+        if failed_items:
+            logger.warning("Job %s finished with %s failed work item(s); advancing the checkpoint past them",
+                           job_id, failed_items)
+        account = db.get(UserAccount, job.account_id)
+        save_checkpoint(db, account, job.history_id)
+
+
+class LeaseLostError(Exception):
+    """
+    Raised when a worker's lease on a work item was taken over by another
+    worker before it could commit the item's outcome.
+    """
+
+
+def _fetch(db: Session, job: ProcessingJob, params: Dict, item_id: int, worker_id: str) -> Dict:
+    """
+    Fetch new mail for a job and split it into process work items.
+
+    The fetch item is completed in the same transaction, and only while
+    `worker_id` still holds its lease. A fetch that outlived its lease was
+    taken over by another worker, and raises LeaseLostError instead of
+    queueing the emails a second time.
+    """
+    account = db.get(UserAccount, job.account_id)
+    if account is None or not account.access_token:
+        raise Exception(f"Gmail API access not configured for account {job.account_id}")
+
+    id_filter = NewMessageFilter(account.id)
+    history_id = None
+    if params.get('incremental'):
+        sync_result = fetch_new_emails(account, id_filter)
+        emails, history_id = sync_result.emails, sync_result.history_id
+    else:
+        emails = fetch_emails_since_date(
+            access_token=account.access_token,
+            refresh_token=account.refresh_token,
+            since_date=datetime.fromisoformat(params['since_date']),
+            max_results=params.get('max_results') or 100,
+            account_id=account.id,
+            id_filter=id_filter
+        )
+
+    for start in range(0, len(emails), JOB_BATCH_SIZE):
+        payload = {'emails': _encode_emails(emails[start:start + JOB_BATCH_SIZE]), 'llm_mode': params.get('llm_mode')}
+        db.add(WorkItem(job_id=job.id, kind='process', payload=json.dumps(payload)))
+    # Committed together with the process items below
+    db.add_all(
+        JobEvent(job_id=job.id, type='fetched', data=json.dumps(_email_event(email)))
+        for email in emails
+    )
+    db.execute(
+        update(ProcessingJob)
+        .where(ProcessingJob.id == job.id)
+        .values(
+            status='running',
+            total=len(emails),
+            already_processed=id_filter.skipped,
+            history_id=history_id,
+            updated_at=_now()
+        )
+    )
+    result = {'fetched': len(emails)}
+    completed = db.execute(
+        update(WorkItem)
+        .where(WorkItem.id == item_id, WorkItem.status == 'leased', WorkItem.leased_by == worker_id)
+        .values(status='done', result=json.dumps(result), error=None)
+    ).rowcount
+    if completed != 1:
+        db.rollback()
+        raise LeaseLostError(f"Lease of fetch item {item_id} was lost")
+    db.commit()
+    return result
+
+
+_RESULT_KEYS = ('id', 'subject', 'sender', 'summary', 'category_id', 'confidence')
+
+
+def _load_stored(db: Session, account_id: int, ids: List[str]) -> List[Dict]:
+    """
+    Result entries of the emails among `ids` that are stored already; the
+    confidence is not stored.
+    """
+    rows = db.execute(
+        select(Email.gmail_msg_id, Email.subject, Email.sender, Email.summary, Email.category_id)
+        .where(Email.account_id == account_id, Email.gmail_msg_id.in_(ids))
+    ).all()
+    return [dict(zip(_RESULT_KEYS, row), confidence=None) for row in rows]
+
+
+def _store_batch(db: Session, job_id: int, account_id: int, analyzed: List[Dict], errors: List[Dict],
+                 stored_before: int = 0) -> Dict:
+    """
+    Store a batch's analyzed emails, record their "persisted" events and
+    count them in the job's progress.
+
+    Args:
+        stored_before: Emails of the batch an earlier attempt stored; they
+            count as processed once the batch succeeds
+    """
+    counts = upsert_emails(db, account_id, analyzed)
+    record_events(db, job_id, [
+        ('persisted', _email_event(email, 'summary', 'category_id', 'confidence')) for email in analyzed
+    ])
+    if errors:
+        # Retry the batch; the emails stored now are left out of the next
+        # attempt, and cached LLM results are reused for the others
+        _add_progress(db, job_id, inserted=counts['inserted'])
+    else:
+        _add_progress(db, job_id, processed=len(analyzed) + stored_before,
+                      inserted=counts['inserted'], skipped=counts['skipped'])
+    return counts
+
+
+async def _process(
+    job: ProcessingJob,
+    payload: Dict,
+    final_attempt: bool = True,
+    reported: Optional[Set[str]] = None,
+    retry: bool = False
+) -> Dict:
+    """
+    Analyze and store one batch of emails.
+
+    Args:
+        final_attempt: Whether a failure of this attempt is final; reported
+            with each "failed" event as `retrying`
+        retry: Whether an earlier attempt ran; emails it stored are not
+            analyzed, stored or reported again
+        reported: Collects the IDs of emails a "failed" or "persisted"
+            event was recorded for
+    """
+    reported = set() if reported is None else reported
+    job_id = job.id
+    # Events of emails analyzed since the last write. One write at a time
+    # runs in a thread and takes everything that piled up meanwhile, so a
+    # batch costs a few transactions instead of one per email
+    pending: List[Tuple[str, Dict]] = []
+    writer: Optional[asyncio.Task] = None
+
+    async def _write_events() -> None:
+        while pending:
+            events = pending[:]
+            del pending[:]
+            await _run_db(record_events, job_id, events)
+            reported.update(data['id'] for type_, data in events if type_ == 'failed')
+
+    def _on_result(email: Dict, result: Optional[Dict], error: Optional[Dict]) -> None:
+        nonlocal writer
+        if error is not None:
+            pending.append(('failed', {**error, 'retrying': not final_attempt}))
+        else:
+            pending.append(('summarized', {'id': result['id'], 'summary': result.get('summary')}))
+            pending.append(('categorized', {
+                'id': result['id'],
+                'category_id': result.get('category_id'),
+                'confidence': result.get('confidence'),
+            }))
+        if writer is None or writer.done():
+            writer = asyncio.create_task(_write_events())
+
+    emails = _decode_emails(payload['emails'])
+    stored: List[Dict] = []
+    if retry:
+        stored = await _run_db(_load_stored, job.account_id, [email['id'] for email in emails])
+        stored_ids = {email['id'] for email in stored}
+        emails = [email for email in emails if email['id'] not in stored_ids]
+        reported.update(stored_ids)
+    try:
+        analyzed, errors = await analyze_emails(
+            job.account_id, emails, mode=payload.get('llm_mode') or LLM_MODE, on_result=_on_result
+        )
+    finally:
+        if writer is not None:
+            await writer
+    await _run_db(_store_batch, job_id, job.account_id, analyzed, errors, len(stored))
+    reported.update(email['id'] for email in analyzed)
+    if errors:
+        raise Exception(f"{len(errors)} email(s) failed: {errors}")
+
+    return {'emails': stored + [{key: email.get(key) for key in _RESULT_KEYS} for email in analyzed]}
+
+
+def _record_failure(db: Session, job_id: int, item: WorkItem, worker_id: str, payload: Dict,
+                    error: str, reported: Set[str]) -> None:
+    """
+    fail_item(), and _report_failure() once the item has failed for good.
+    """
+    if fail_item(db, item, worker_id, error):
+        _report_failure(db, job_id, item, payload, error, reported)
+
+
+def _report_failure(db: Session, job_id: int, item: WorkItem, payload: Dict, error: str, reported: Set[str]) -> None:
+    """
+    Settle the progress of a failed process item and report its emails
+    without an event yet, or record the error of a failed fetch on the job.
+
+    Emails of the batch that were stored by one of its attempts count as
+    processed, only the others as failed.
+    """
+    if item.kind == 'process':
+        ids = [email['id'] for email in payload['emails']]
+        stored = set(db.scalars(select(Email.gmail_msg_id).where(Email.gmail_msg_id.in_(ids))))
+        _add_progress(db, job_id, processed=len(stored), failed=len(ids) - len(stored))
+        record_events(db, job_id, [
+            ('failed', {'id': email_id, 'error': error, 'retrying': False})
+            for email_id in ids if email_id not in stored and email_id not in reported
+        ])
+    else:
+        db.execute(update(ProcessingJob).where(ProcessingJob.id == job_id).values(error=error))
+        db.commit()
+
+
+def fail_abandoned_items(db: Session) -> int:
+    """
+    Mark items whose lease expired on their last attempt as failed, and
+    report their failure. Their workers died or hung while running them,
+    every time, so they are not leased again.
+
+    Returns:
+        Number of failed items
+    """
+    error = f"Lease expired on attempt {JOB_MAX_ATTEMPTS}; the item's worker stopped while running it"
+    items = list(db.scalars(
+        update(WorkItem)
+        .where(
+            WorkItem.status == 'leased',
+            WorkItem.lease_expires_at < _now(),
+            WorkItem.attempts >= JOB_MAX_ATTEMPTS
+        )
+        .values(status='failed', error=error, leased_by=None, lease_expires_at=None)
+        .returning(WorkItem)
+        .execution_options(synchronize_session=False)
+    ))
+    db.expunge_all()
+    db.commit()
+    for item in items:
+        logger.warning("Work item %s (%s) failed: %s", item.id, item.kind, error)
+        _report_failure(db, item.job_id, item, json.loads(item.payload), error, set())
+        _finish_job_if_done(db, item.job_id)
+    return len(items)
+
+
+async def run_item(item: WorkItem, worker_id: str) -> None:
+    """
+    Execute one leased work item and record its outcome.
+
+    The worker usually shares its event loop with the API, so every
+    database step runs in a thread with a session of its own, like the
+    Gmail calls; only the LLM analysis runs on the loop.
+    """
+    job = await _run_db(Session.get, ProcessingJob, item.job_id)
+    payload = json.loads(item.payload)
+    reported = set()
+    try:
+        if item.kind == 'fetch':
+            # Gmail calls are blocking; keep them off the event loop. The
+            # fetch item is completed by _fetch itself
+            await background_google_io.submit(_fetch_in_thread, job.id, payload, item.id, worker_id)
+        else:
+            result = await _process(job, payload, item.attempts >= JOB_MAX_ATTEMPTS, reported, item.attempts > 1)
+            await _run_db(complete_item, item, worker_id, result)
+    except LeaseLostError as e:
+        logger.warning("Work item %s (%s) attempt %s abandoned: %s", item.id, item.kind, item.attempts, e)
+    except Exception as e:
+        logger.warning("Work item %s (%s) attempt %s failed: %s", item.id, item.kind, item.attempts, e)
+        await _run_db(_record_failure, job.id, item, worker_id, payload, str(e), reported)
+    await _run_db(_finish_job_if_done, job.id)
+
+
+def _in_session(fn: Callable, *args):
+    # fn(db, *args) with a session of its own
+    db: Session = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def _run_db(fn: Callable, *args):
+    """
+    _in_session() in a thread, so the database round trip does not block
+    the event loop.
+    """
+    return await asyncio.to_thread(_in_session, fn, *args)
+
+
+def _fetch_in_thread(job_id: int, payload: Dict, item_id: int, worker_id: str) -> Dict:
+    db: Session = SessionLocal()
+    try:
+        return _fetch(db, db.get(ProcessingJob, job_id), payload, item_id, worker_id)
+    finally:
+        db.close()
+
+
+def get_job_status(db: Session, job: ProcessingJob) -> Dict:
+    """
+    Progress and results of a job, for GET /jobs/{id}.
+    """
+    items = db.query(WorkItem).filter(WorkItem.job_id == job.id).order_by(WorkItem.id).all()
+    emails, errors = [], []
+    for item in items:
+        if item.status == 'done' and item.result and item.kind == 'process':
+            emails += json.loads(item.result)['emails']
+        if item.error:
+            errors.append({'item_id': item.id, 'kind': item.kind, 'status': item.status, 'error': item.error})
+    return {
+        'id': job.id,
+        'status': job.status,
+        'total': job.total,
+        'processed': job.processed,
+        'failed': job.failed,
+        'inserted': job.inserted,
+        'skipped': job.skipped,
+        'already_processed': job.already_processed,
+        'error': job.error,
+        'errors': errors,
+        'emails': emails,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+class JobWorker:
+    """
+    Asyncio loop that leases and runs work items, up to `concurrency` at a time.
+
+    Leases of running items are renewed every third of JOB_LEASE_SECONDS.
+    """
+
+    def __init__(self, concurrency: int = JOB_WORKER_CONCURRENCY, poll_interval: float = JOB_POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{worker_prefix()}{uuid.uuid4().hex[:8]}"
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._running: Dict[asyncio.Task, int] = {}
+        self._next_prune = 0.0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+            self._heartbeat = asyncio.create_task(self._renew())
+
+    async def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stop leasing new items and wait for the running ones to finish.
+
+        Items still running after `timeout` seconds are cancelled and put
+        back on the queue for another worker.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._running:
+            _, pending = await asyncio.wait(list(self._running), timeout=timeout)
+            if pending:
+                item_ids = [self._running[task] for task in pending]
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                released = await asyncio.to_thread(self._release, item_ids)
+                logger.info("Released %s unfinished work items of %s", released, self.worker_id)
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+
+    async def run(self) -> None:
+        while True:
+            free = self.concurrency - len(self._running)
+            items = []
+            if free > 0:
+                try:
+                    items = await asyncio.to_thread(self._lease, free)
+                except Exception as e:
+                    logger.error("Failed to lease work items: %s", e)
+            for item in items:
+                task = asyncio.create_task(run_item(item, self.worker_id))
+                self._running[task] = item.id
+                task.add_done_callback(self._finished)
+            if not items:
+                await asyncio.sleep(self.poll_interval)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.pop(task, None)
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(self._renew_leases, list(self._running.values()))
+            except Exception as e:
+                logger.error("Failed to renew leases of %s: %s", self.worker_id, e)
+
+    def _lease(self, limit: int) -> List[WorkItem]:
+        db: Session = SessionLocal()
+        try:
+            fail_abandoned_items(db)
+            if time.monotonic() >= self._next_prune:
+                self._next_prune = time.monotonic() + JOB_EVENTS_PRUNE_INTERVAL
+                prune_events(db)
+            return lease_items(db, self.worker_id, limit)
+        finally:
+            db.close()
+
+    def _renew_leases(self, item_ids: List[int]) -> None:
+        db: Session = SessionLocal()
+        try:
+            renew_leases(db, self.worker_id, item_ids)
+        finally:
+            db.close()
+
+    def _release(self, item_ids: List[int]) -> int:
+        db: Session = SessionLocal()
+        try:
+            return release_leases(db, self.worker_id, item_ids)
+        finally:
+            db.close()
+
+
+job_worker = JobWorker()
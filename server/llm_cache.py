@@ -0,0 +1,288 @@
+"""
+Content-addressed cache of LLM results (summaries and categories).
+
+Entries are keyed by a hash of the normalized email content. Category
+entries also include a version of the user's category set, so editing a
+category makes older category entries unreachable. The category CRUD
+endpoints purge them explicitly as well.
+
+Two tiers: a size-bounded in-process LRU in front of the llm_cache table.
+The async lookup and store methods only leave the event loop for the
+database tier, which they query in a thread.
+"""
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.db_models import Category, LLMCacheEntry
+from database.database import SessionLocal
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# In-process tier limits
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Set to "false" to use the in-process tier only
+LLM_CACHE_PERSISTENT = os.getenv("LLM_CACHE_PERSISTENT", "true").lower() == "true"
+
+# Keys looked up, or entries written, per database statement
+LOOKUP_CHUNK = 500
+
+SUMMARY = "summary"
+CATEGORY = "category"
+
+_whitespace = re.compile(r"\s+")
+
+
+def _normalize(text: Optional[str]) -> str:
+    return _whitespace.sub(" ", text or "").strip()
+
+
+def category_version(categories: List[Category]) -> str:
+    """
+    Hash of the user's category set. Changes whenever a category is added,
+    removed, renamed or has its description edited.
+    """
+    digest = hashlib.sha256()
+    for cat in sorted(categories, key=lambda c: c.id):
+        digest.update(json.dumps([cat.id, cat.name, cat.description or ""]).encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_key(kind: str, account_id: int, email: Dict, version: str = "") -> str:
+    """
+    Content-addressed key for an email's summary or category.
+
+    Summaries depend on subject and body only; categories also depend on the
+    sender and on the category set version.
+    """
+    parts = [kind, account_id, _normalize(email.get("subject")), _normalize(email.get("body"))]
+    if kind == CATEGORY:
+        parts += [_normalize(email.get("sender")).lower(), version]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+
+def _insert_for(db: Session):
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert
+    if dialect == 'sqlite':
+        return sqlite.insert
+    raise NotImplementedError(f"Cache upserts are not supported for the '{dialect}' dialect")
+
+
+class LLMCache:
+    """
+    Two-tier LLM result cache with hit/miss counters.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+        persistent: bool = LLM_CACHE_PERSISTENT
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.persistent = persistent
+        # key -> (account_id, kind, encoded value)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cached result, promoting database hits into memory.
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """
+        Look up many cached results, with one database query for all
+        memory misses.
+
+        Returns:
+            Cached results by key; keys that are not cached are left out
+        """
+        found, missing = self._from_memory(keys)
+        if self.persistent and missing:
+            found.update(self._from_db(missing))
+        self._count_misses(missing, found)
+        return found
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict[str, Dict]:
+        """
+        get_many() for async callers; the database query runs in a thread.
+        """
+        found, missing = self._from_memory(keys)
+        if self.persistent and missing:
+            found.update(await asyncio.to_thread(self._from_db, missing))
+        self._count_misses(missing, found)
+        return found
+
+    def set(self, key: str, account_id: int, kind: str, value: Dict) -> None:
+        """
+        Store a result in both tiers.
+        """
+        self.set_many([(key, account_id, kind, value)])
+
+    def set_many(self, entries: List[Tuple[str, int, str, Dict]]) -> None:
+        """
+        Store (key, account_id, kind, value) results in both tiers, with one
+        database transaction for all of them.
+        """
+        encoded = self._remember_all(entries)
+        if self.persistent and encoded:
+            self._write(encoded)
+
+    async def aset_many(self, entries: List[Tuple[str, int, str, Dict]]) -> None:
+        """
+        set_many() for async callers; the database write runs in a thread.
+        """
+        encoded = self._remember_all(entries)
+        if self.persistent and encoded:
+            await asyncio.to_thread(self._write, encoded)
+
+    def _from_memory(self, keys: Iterable[str]) -> Tuple[Dict[str, Dict], List[str]]:
+        found, missing = {}, []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    missing.append(key)
+                    continue
+                self._entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                found[key] = json.loads(entry[2])
+        return found, missing
+
+    def _from_db(self, keys: List[str]) -> Dict[str, Dict]:
+        found = {}
+        db: Session = SessionLocal()
+        try:
+            for start in range(0, len(keys), LOOKUP_CHUNK):
+                rows = db.query(LLMCacheEntry).filter(
+                    LLMCacheEntry.key.in_(keys[start:start + LOOKUP_CHUNK])
+                ).all()
+                for row in rows:
+                    self._remember(row.key, row.account_id, row.kind, row.value)
+                    found[row.key] = json.loads(row.value)
+        except Exception as e:
+            logger.warning("LLM cache lookup failed: %s", e)
+        finally:
+            db.close()
+        with self._lock:
+            self.stats["db_hits"] += len(found)
+        return found
+
+    def _count_misses(self, missing: List[str], found: Dict[str, Dict]) -> None:
+        with self._lock:
+            self.stats["misses"] += sum(key not in found for key in missing)
+
+    def _remember_all(self, entries: List[Tuple[str, int, str, Dict]]) -> List[Tuple[str, int, str, str]]:
+        encoded = [(key, account_id, kind, json.dumps(value)) for key, account_id, kind, value in entries]
+        for entry in encoded:
+            self._remember(*entry)
+        return encoded
+
+    def _write(self, encoded: List[Tuple[str, int, str, str]]) -> None:
+        # Upserts, so workers storing the same key at once both succeed;
+        # the same key twice in one statement would conflict with itself
+        rows = list({
+            key: {'key': key, 'account_id': account_id, 'kind': kind, 'value': value}
+            for key, account_id, kind, value in encoded
+        }.values())
+        db: Session = SessionLocal()
+        try:
+            insert = _insert_for(db)
+            for start in range(0, len(rows), LOOKUP_CHUNK):
+                stmt = insert(LLMCacheEntry).values(rows[start:start + LOOKUP_CHUNK])
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=['key'],
+                    set_={column: stmt.excluded[column] for column in ('account_id', 'kind', 'value')}
+                ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("LLM cache write failed: %s", e)
+        finally:
+            db.close()
+
+    def invalidate_categories(self, account_id: int, db: Optional[Session] = None) -> None:
+        """
+        Drop the account's category results after its categories changed.
+        """
+        self._forget_categories(account_id)
+
+        if self.persistent:
+            own_session = db is None
+            db = db or SessionLocal()
+            try:
+                db.query(LLMCacheEntry).filter(
+                    LLMCacheEntry.account_id == account_id,
+                    LLMCacheEntry.kind == CATEGORY
+                ).delete(synchronize_session=False)
+                db.commit()
+            finally:
+                if own_session:
+                    db.close()
+
+    async def ainvalidate_categories(self, account_id: int, db: AsyncSession) -> None:
+        """
+        invalidate_categories() for async request handlers.
+        """
+        self._forget_categories(account_id)
+
+        if self.persistent:
+            await db.execute(
+                delete(LLMCacheEntry).where(
+                    LLMCacheEntry.account_id == account_id,
+                    LLMCacheEntry.kind == CATEGORY
+                )
+            )
+            await db.commit()
+
+    def _forget_categories(self, account_id: int) -> None:
+        with self._lock:
+            stale = [
+                key for key, (owner, kind, _) in self._entries.items()
+                if owner == account_id and kind == CATEGORY
+            ]
+            for key in stale:
+                self._bytes -= len(self._entries.pop(key)[2])
+
+    def clear(self) -> None:
+        """
+        Empty the in-process tier.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remember(self, key: str, account_id: int, kind: str, encoded: str) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[key] = (account_id, kind, encoded)
+            self._bytes += len(encoded)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted[2])
+                self.stats["evictions"] += 1
+
+
+llm_cache = LLMCache()
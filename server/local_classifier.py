@@ -0,0 +1,306 @@
+"""
+Local first-tier email categorizer, run before the LLM.
+
+A hashing TF-IDF model with nearest-centroid scoring, trained per account
+on the emails the LLM has categorized and on its category names and
+descriptions. Emails categorized locally are never trained on, so the model
+does not reinforce its own mistakes. Emails are classified a batch at a
+time with NumPy; only predictions at or above LOCAL_CLASSIFIER_THRESHOLD
+are used, the rest are left to the LLM.
+
+Models are kept in process per account and rebuilt when the category set
+changes or LOCAL_CLASSIFIER_REFRESH seconds have passed, so emails
+categorized since are learned from.
+"""
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from models.db_models import Category, Email, LOCAL_CATEGORY_SOURCES
+from database.database import SessionLocal
+from llm_cache import category_version
+from collections import OrderedDict
+from email.utils import parseaddr
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import os
+import re
+import threading
+import time
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to send every email to the LLM
+LOCAL_CLASSIFIER_ENABLED = os.getenv('LOCAL_CLASSIFIER_ENABLED', 'true').lower() == 'true'
+# Minimum confidence (0-1) of a local prediction; below it the LLM decides
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv('LOCAL_CLASSIFIER_THRESHOLD', '0.2'))
+# Minimum cosine similarity to the best category; emails unlike every
+# category are left to the LLM, which may also decide that none fits
+LOCAL_CLASSIFIER_MIN_SIMILARITY = float(os.getenv('LOCAL_CLASSIFIER_MIN_SIMILARITY', '0.1'))
+# LLM-categorized emails an account needs before its model is used
+LOCAL_CLASSIFIER_MIN_EXAMPLES = int(os.getenv('LOCAL_CLASSIFIER_MIN_EXAMPLES', '50'))
+# Most recent LLM-categorized emails trained on
+LOCAL_CLASSIFIER_MAX_EXAMPLES = int(os.getenv('LOCAL_CLASSIFIER_MAX_EXAMPLES', '5000'))
+# Hashed feature dimensions; each category centroid takes 4 bytes per dimension
+LOCAL_CLASSIFIER_FEATURES = int(os.getenv('LOCAL_CLASSIFIER_FEATURES', str(2 ** 15)))
+# Characters of the body that are read
+LOCAL_CLASSIFIER_BODY_CHARS = int(os.getenv('LOCAL_CLASSIFIER_BODY_CHARS', '2000'))
+# Seconds a model is used before it is rebuilt with newly categorized emails
+LOCAL_CLASSIFIER_REFRESH = float(os.getenv('LOCAL_CLASSIFIER_REFRESH', '600'))
+# Accounts whose models are kept in memory
+LOCAL_CLASSIFIER_MAX_MODELS = int(os.getenv('LOCAL_CLASSIFIER_MAX_MODELS', '64'))
+
+# A category's name and description count as this many example emails
+DESCRIPTION_WEIGHT = 3.0
+# Subject words count this many times as often as body words
+SUBJECT_WEIGHT = 2
+
+_word = re.compile(r'[a-z0-9]{2,}')
+
+
+def _sender_features(sender: Optional[str]) -> List[str]:
+    address = parseaddr(sender or '')[1].lower()
+    if '@' not in address:
+        return []
+    domain = address.rsplit('@', 1)[1]
+    features = [f'from:{address}', f'domain:{domain}']
+    labels = domain.split('.')
+    if len(labels) > 2:
+        features.append(f"domain:{'.'.join(labels[-2:])}")
+    return features
+
+
+def tokens(email: Dict) -> List[str]:
+    """
+    Features of an email: subject and body words, the sender address and
+    its domains.
+    """
+    subject = _word.findall((email.get('subject') or '').lower())
+    body = _word.findall((email.get('body') or '')[:LOCAL_CLASSIFIER_BODY_CHARS].lower())
+    return subject * SUBJECT_WEIGHT + body + _sender_features(email.get('sender'))
+
+
+def _hash(features: Sequence[str], n_features: int) -> np.ndarray:
+    # crc32 rather than hash(): stable across processes and restarts
+    return np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.int64, count=len(features)) % n_features
+
+
+def _term_counts(docs: List[List[str]], n_features: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sparse term counts of hashed documents as (doc, feature, count) arrays.
+    """
+    lengths = np.fromiter((len(doc) for doc in docs), dtype=np.int64, count=len(docs))
+    hashed = _hash([feature for doc in docs for feature in doc], n_features)
+    doc_ids = np.repeat(np.arange(len(docs)), lengths)
+    pairs, counts = np.unique(doc_ids * n_features + hashed, return_counts=True)
+    return pairs // n_features, pairs % n_features, counts.astype(np.float32)
+
+
+def _tfidf(docs: List[List[str]], idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    L2-normalized sublinear TF-IDF vectors of documents, sparse.
+    """
+    doc_ids, features, counts = _term_counts(docs, len(idf))
+    weights = (1 + np.log(counts)) * idf[features]
+    norms = np.sqrt(np.bincount(doc_ids, weights=weights ** 2, minlength=len(docs)))
+    weights = weights / np.where(norms > 0, norms, 1)[doc_ids]
+    return doc_ids, features, weights.astype(np.float32)
+
+
+class CentroidModel:
+    """
+    Nearest-centroid classifier over hashed TF-IDF vectors.
+    """
+
+    def __init__(self, category_ids: np.ndarray, idf: np.ndarray, centroids: np.ndarray, examples: int):
+        self.category_ids = category_ids
+        self.idf = idf
+        self.centroids = centroids
+        self.examples = examples
+
+    @classmethod
+    def train(
+        cls,
+        examples: List[Tuple[Dict, int]],
+        categories: List[Category],
+        n_features: int = LOCAL_CLASSIFIER_FEATURES,
+        description_weight: float = DESCRIPTION_WEIGHT
+    ) -> Optional['CentroidModel']:
+        """
+        Fit a model to (email, category ID) pairs and category descriptions.
+
+        Returns:
+            The model, or None if there are no categories
+        """
+        if not categories:
+            return None
+        category_ids = np.array([cat.id for cat in categories], dtype=np.int64)
+        column = {cat.id: i for i, cat in enumerate(categories)}
+        examples = [(email, category_id) for email, category_id in examples if category_id in column]
+
+        docs = [tokens(email) for email, _ in examples]
+        descriptions = [_word.findall(f'{cat.name} {cat.description or ""}'.lower()) for cat in categories]
+        all_docs = docs + descriptions
+
+        # Smoothed inverse document frequency over examples and descriptions
+        _, features, _ = _term_counts(all_docs, n_features)
+        df = np.bincount(features, minlength=n_features)
+        idf = (np.log((1 + len(all_docs)) / (1 + df)) + 1).astype(np.float32)
+
+        doc_ids, features, weights = _tfidf(all_docs, idf)
+        labels = np.array([column[category_id] for _, category_id in examples] + list(range(len(categories))))
+        doc_weights = np.ones(len(all_docs), dtype=np.float32)
+        doc_weights[len(docs):] = description_weight
+
+        centroids = np.zeros((len(categories), n_features), dtype=np.float32)
+        np.add.at(centroids, (labels[doc_ids], features), weights * doc_weights[doc_ids])
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms > 0, norms, 1)
+        return cls(category_ids, idf, centroids, len(examples))
+
+    def scores(self, emails: List[Dict]) -> np.ndarray:
+        """
+        Cosine similarity of each email to each category, shape (emails, categories).
+        """
+        doc_ids, features, weights = _tfidf([tokens(email) for email in emails], self.idf)
+        scores = np.zeros((len(emails), len(self.category_ids)), dtype=np.float32)
+        np.add.at(scores, doc_ids, self.centroids[:, features].T * weights[:, None])
+        return scores
+
+    def predict(self, emails: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Best category of each email and its confidence.
+
+        Confidence is the margin of the best over the runner-up category,
+        relative to the best: 1 when no other category is similar at all,
+        0 for a tie. It is 0 when the best similarity is below
+        LOCAL_CLASSIFIER_MIN_SIMILARITY.
+
+        Returns:
+            (category IDs, confidences), one of each per email
+        """
+        scores = self.scores(emails)
+        if scores.shape[1] == 1:
+            best, second = scores[:, 0], np.zeros(len(emails), dtype=np.float32)
+        else:
+            top = np.partition(scores, -2, axis=1)
+            best, second = top[:, -1], top[:, -2]
+        confidence = np.where(best > 0, (best - second) / np.where(best > 0, best, 1), 0.0)
+        confidence[best < LOCAL_CLASSIFIER_MIN_SIMILARITY] = 0.0
+        return self.category_ids[scores.argmax(axis=1)], confidence
+
+
+def load_examples(db: Session, account_id: int, limit: int = LOCAL_CLASSIFIER_MAX_EXAMPLES) -> List[Tuple[Dict, int]]:
+    """
+    The account's most recently received emails categorized by the LLM,
+    as (email, category ID) pairs. Bodies are truncated in the database.
+    """
+    rows = db.execute(
+        select(Email.subject, Email.sender, func.substr(Email.body, 1, LOCAL_CLASSIFIER_BODY_CHARS), Email.category_id)
+        .where(
+            Email.account_id == account_id,
+            Email.category_id.isnot(None),
+            or_(Email.category_source.is_(None), Email.category_source.notin_(LOCAL_CATEGORY_SOURCES))
+        )
+        .order_by(Email.received_at.desc())
+        .limit(limit)
+    ).all()
+    return [({'subject': subject, 'sender': sender, 'body': body}, category_id)
+            for subject, sender, body, category_id in rows]
+
+
+class LocalClassifier:
+    """
+    Per-account CentroidModels with usage counters.
+
+    Thread-safe; called from worker threads so model builds don't block
+    the event loop.
+    """
+
+    def __init__(
+        self,
+        threshold: float = LOCAL_CLASSIFIER_THRESHOLD,
+        min_examples: int = LOCAL_CLASSIFIER_MIN_EXAMPLES,
+        refresh: float = LOCAL_CLASSIFIER_REFRESH,
+        max_models: int = LOCAL_CLASSIFIER_MAX_MODELS
+    ):
+        self.threshold = threshold
+        self.min_examples = min_examples
+        self.refresh = refresh
+        self.max_models = max_models
+        # account_id -> (category version, built at, model or None)
+        self._models: 'OrderedDict[int, Tuple[str, float, Optional[CentroidModel]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'emails': 0, 'local': 0, 'escalated': 0, 'models_built': 0, 'build_seconds': 0.0}
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['models'] = len(self._models)
+        stats['build_seconds'] = round(stats['build_seconds'], 3)
+        stats['local_rate'] = stats['local'] / stats['emails'] if stats['emails'] else 0.0
+        return stats
+
+    def model(self, account_id: int, categories: List[Category]) -> Optional[CentroidModel]:
+        """
+        The account's model, built or rebuilt as needed. None while the
+        account has fewer than `min_examples` categorized emails.
+        """
+        version = category_version(categories)
+        with self._lock:
+            entry = self._models.get(account_id)
+            if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self.refresh:
+                self._models.move_to_end(account_id)
+                return entry[2]
+
+        start = time.perf_counter()
+        db: Session = SessionLocal()
+        try:
+            examples = load_examples(db, account_id)
+        finally:
+            db.close()
+        model = CentroidModel.train(examples, categories) if len(examples) >= self.min_examples else None
+        elapsed = time.perf_counter() - start
+        logger.debug("Built local classifier for account %s from %s emails in %.3fs",
+                     account_id, len(examples), elapsed)
+
+        with self._lock:
+            self._models[account_id] = (version, time.monotonic(), model)
+            self._models.move_to_end(account_id)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            self._stats['models_built'] += 1
+            self._stats['build_seconds'] += elapsed
+        return model
+
+    def classify(self, account_id: int, emails: List[Dict], categories: List[Category]) -> List[Optional[Dict]]:
+        """
+        Categorize a batch of emails locally where the model is confident.
+
+        Returns:
+            Per email, {'category_id', 'confidence'} or None where the LLM
+            has to decide
+        """
+        if not emails:
+            return []
+        model = self.model(account_id, categories)
+        results: List[Optional[Dict]] = [None] * len(emails)
+        if model is not None:
+            category_ids, confidences = model.predict(emails)
+            for i, (category_id, confidence) in enumerate(zip(category_ids, confidences)):
+                if confidence >= self.threshold:
+                    results[i] = {'category_id': int(category_id), 'confidence': round(float(confidence), 3)}
+        local = sum(result is not None for result in results)
+        with self._lock:
+            self._stats['emails'] += len(emails)
+            self._stats['local'] += local
+            self._stats['escalated'] += len(emails) - local
+        return results
+
+    def invalidate(self, account_id: int) -> None:
+        with self._lock:
+            self._models.pop(account_id, None)
+
+
+local_classifier = LocalClassifier()
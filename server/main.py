@@ -1,23 +1,40 @@
+import asyncio
+import hmac
 import json
 from math import log
-from fastapi import FastAPI, Depends, HTTPException, status, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Cookie
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse, Response
-from sqlalchemy.orm import Session
-from typing import List
-from database.database import get_db, init_db
-from models.db_models import Category, UserAccount, Email
-from schemas import CategoryCreate, CategoryUpdate, CategoryResponse, GoogleAuthRequest, EmailResponse, GetEmailsRequest
-from gmail_service import fetch_emails_since_date
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from database.database import get_async_db, init_db, async_engine
+from models.db_models import Category, UserAccount, Email, ProcessingJob
+from schemas import CategoryCreate, CategoryUpdate, CategoryResponse, GoogleAuthRequest, EmailResponse, GetEmailsRequest, PubSubPushRequest, StoredEmailResponse, StoredEmailPage, EmailSearchPage
+from email_store import list_stored_emails, known_ids, InvalidCursorError, EMAIL_PAGE_SIZE
+from email_search import search_emails, EMAIL_SEARCH_PAGE_SIZE
+from gmail_service import fetch_emails_since_date, aiter_emails_since_date, client_pool
+from email_sync_service import sync_scheduler, SYNC_ENABLED
+from job_queue import enqueue_job, get_job_status, job_worker, JOB_WORKER_ENABLED, JOB_SHUTDOWN_GRACE_SECONDS
+from job_events import stream_job_events
+from gmail_push import (
+    check_push_config, decode_notification, is_stale, renew_account_watch, push_syncs, watch_renewer,
+    InvalidNotificationError, GMAIL_PUSH_TOPIC, GMAIL_PUSH_TOKEN
+)
 from datetime import datetime as dt
-from auth import get_current_user
+from auth import get_current_user, user_cache, user_id_from_token
 from google_auth_oauthlib.flow import Flow
 import os
 from dotenv import load_dotenv
-from google.oauth2 import id_token
 from google.auth.transport import requests
 import jwt
-from utils import summarize, categorize
+from contextlib import asynccontextmanager
+from utils import llm_clients
+from llm_cache import llm_cache
+from google_io import google_io, background_google_io, GoogleIOTimeoutError, GoogleIOBusyError
+from google_id_tokens import google_id_tokens
+from local_classifier import local_classifier
+from sender_rules import sender_rules
 
 
 
@@ -25,7 +42,32 @@ load_dotenv()
 
 init_db()
 
-app = FastAPI(title="AI Email Sorter API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_push_config()
+    # Keep connected inboxes categorized in the background
+    if SYNC_ENABLED:
+        sync_scheduler.start()
+    # Drain queued processing jobs in-process; dedicated workers can run too
+    if JOB_WORKER_ENABLED:
+        job_worker.start()
+    # Keep Gmail push watches alive so idle mailboxes need no polling
+    if GMAIL_PUSH_TOPIC:
+        watch_renewer.start()
+    yield
+    await watch_renewer.stop()
+    await job_worker.stop(timeout=JOB_SHUTDOWN_GRACE_SECONDS)
+    await sync_scheduler.stop()
+    # Close pooled connections on shutdown
+    await llm_clients.aclose()
+    client_pool.clear()
+    await async_engine.dispose()
+    google_io.shutdown()
+    background_google_io.shutdown()
+
+
+app = FastAPI(title="AI Email Sorter API", version="1.0.0", lifespan=lifespan)
 
 SCOPES = [
     "https://www.googleapis.com/auth/gmail.readonly",
@@ -51,7 +93,7 @@ app.add_middleware(
 )
 
 @app.post("/google-auth")
-async def google_auth(body: GoogleAuthRequest, db: Session = Depends(get_db)):
+async def google_auth(body: GoogleAuthRequest, db: AsyncSession = Depends(get_async_db)):
     """
     1️⃣ Verify Google credential
     2️⃣ Find or create user
@@ -66,12 +108,11 @@ async def google_auth(body: GoogleAuthRequest, db: Session = Depends(get_db)):
         if not credential or not client_id:
             raise HTTPException(status_code=400, detail="Missing credential or client_id")
 
-        # 1️⃣ Verify Google token
-        idinfo = id_token.verify_oauth2_token(
-            credential,
-            requests.Request(),
-            client_id,
-        )
+        # 1️⃣ Verify Google token. A token seen moments ago is reused; otherwise
+        # verify it off the event loop (the signing certs are cached too)
+        idinfo = google_id_tokens.cached(credential, client_id)
+        if idinfo is None:
+            idinfo = await google_io.run(google_id_tokens.verify, credential, client_id)
 
         print("idinfo: " + str(idinfo))
 
@@ -85,12 +126,12 @@ async def google_auth(body: GoogleAuthRequest, db: Session = Depends(get_db)):
         picture = idinfo.get("picture")
 
         # 2️⃣ Find or create user
-        user = db.query(UserAccount).filter(UserAccount.gmail_address == email).first()
+        user = await db.scalar(select(UserAccount).where(UserAccount.gmail_address == email))
         if not user:
             user = UserAccount(gmail_address=email, name=name, picture=picture)
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
        
 
         # 3️⃣ Generate JWT
@@ -167,6 +208,10 @@ async def google_auth(body: GoogleAuthRequest, db: Session = Depends(get_db)):
 
         return response_obj
         
+    except GoogleIOTimeoutError as e:
+        raise HTTPException(status_code=504, detail=f"Google did not respond in time: {str(e)}")
+    except GoogleIOBusyError as e:
+        raise HTTPException(status_code=503, detail=f"Server busy, please retry: {str(e)}")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid Google token: {str(e)}")
     except Exception as e:
@@ -181,6 +226,23 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Runtime counters of the shared clients and caches.
+    """
+    return {
+        "llm": llm_clients.stats,
+        "llm_cache": llm_cache.stats,
+        "local_classifier": local_classifier.stats,
+        "sender_rules": sender_rules.stats,
+        "push": push_syncs.stats,
+        "google_io": google_io.stats,
+        "google_io_background": background_google_io.stats,
+        "google_id_tokens": google_id_tokens.stats,
+        "auth_users": user_cache.stats,
+    }
+
 
 # Example protected endpoint - verify session
 @app.get("/me")
@@ -199,11 +261,15 @@ async def get_current_user_info(user: UserAccount = Depends(get_current_user)):
 
 # Logout endpoint - clear cookie
 @app.post("/logout")
-async def logout():
+async def logout(token: Optional[str] = Cookie(None, alias="token")):
     """
     Logout endpoint - clears the authentication cookie.
     Must match the same cookie settings used when setting the cookie.
     """
+    user_id = user_id_from_token(token)
+    if user_id is not None:
+        user_cache.invalidate(user_id)
+
     is_production = os.getenv("ENVIRONMENT", "development") == "production"
     
     response = JSONResponse(
@@ -245,7 +311,7 @@ async def protected_route(user: UserAccount = Depends(get_current_user)):
 async def get_categories(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: UserAccount = Depends(get_current_user)
 ):
     """
@@ -256,19 +322,19 @@ async def get_categories(
     print(f"Categories requested for user: {user.id} ({user.gmail_address})")
     
     # Only return categories belonging to the authenticated user
-    query = db.query(Category).filter(Category.account_id == user.id)
+    query = select(Category).where(Category.account_id == user.id)
     
-    categories = query.offset(skip).limit(limit).all()
+    categories = (await db.scalars(query.offset(skip).limit(limit))).all()
     print(f"Found {len(categories)} categories for user {user.id}")
     return categories
 
 
 @app.get("/categories/{category_id}", response_model=CategoryResponse)
-async def get_category(category_id: int, db: Session = Depends(get_db)):
+async def get_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get a single category by ID.
     """
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = await db.get(Category, category_id)
     
     if not category:
         raise HTTPException(
@@ -280,13 +346,180 @@ async def get_category(category_id: int, db: Session = Depends(get_db)):
 
 
 # Email endpoints
+def _stored_email(email: Email, include_body: bool = False) -> StoredEmailResponse:
+    return StoredEmailResponse(
+        id=email.gmail_msg_id,
+        subject=email.subject,
+        sender=email.sender,
+        received_at=email.received_at,
+        category_id=email.category_id,
+        summary=email.summary,
+        body=email.body if include_body else None,
+    )
+
+
+@app.get("/emails", response_model=StoredEmailPage)
+async def list_emails(
+    category_id: Optional[int] = None,
+    sender: Optional[str] = None,
+    since: Optional[dt] = None,
+    until: Optional[dt] = None,
+    cursor: Optional[str] = None,
+    limit: int = EMAIL_PAGE_SIZE,
+    include_body: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    user: UserAccount = Depends(get_current_user)
+):
+    """
+    List the user's processed emails from the database, newest first.
+    Does not call Gmail.
+
+    Args:
+        category_id: Only emails in this category
+        sender: Case-insensitive substring of the sender
+        since / until: Received-at range (since inclusive, until exclusive);
+            times without an offset are UTC
+        cursor: next_cursor from the previous page
+        limit: Page size (at most EMAIL_PAGE_SIZE_MAX)
+        include_body: Include email bodies (omitted by default)
+
+    Returns:
+        A page of emails and the cursor of the next page
+    """
+    try:
+        emails, next_cursor = await list_stored_emails(
+            db,
+            user.id,
+            category_id=category_id,
+            sender=sender,
+            since=since,
+            until=until,
+            cursor=cursor,
+            limit=limit,
+            include_body=include_body,
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return StoredEmailPage(
+        emails=[_stored_email(email, include_body) for email in emails],
+        next_cursor=next_cursor,
+    )
+
+
+@app.get("/emails/search", response_model=EmailSearchPage)
+async def search_stored_emails(
+    q: str,
+    limit: int = EMAIL_SEARCH_PAGE_SIZE,
+    offset: int = 0,
+    include_body: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    user: UserAccount = Depends(get_current_user)
+):
+    """
+    Full-text search over the user's processed emails (subject, sender,
+    summary, body), best match first. Does not call Gmail.
+
+    Args:
+        q: Search words
+        limit: Page size
+        offset: next_offset from the previous page
+        include_body: Include email bodies (omitted by default)
+
+    Returns:
+        A page of matching emails and the offset of the next page
+    """
+    emails, next_offset = await search_emails(
+        db, user.id, q, limit=limit, offset=offset, include_body=include_body
+    )
+    return EmailSearchPage(
+        emails=[_stored_email(email, include_body) for email in emails],
+        next_offset=next_offset,
+    )
+
+
+@app.get("/emails/{email_id}", response_model=StoredEmailResponse)
+async def get_email(
+    email_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user: UserAccount = Depends(get_current_user)
+):
+    """
+    Get one processed email, including its body, from the database.
+    """
+    email = await db.get(Email, email_id)
+
+    if not email or email.account_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Email with id {email_id} not found"
+        )
+
+    return _stored_email(email, include_body=True)
+
+
+NDJSON = "application/x-ndjson"
+
+
+def _ndjson_line(email: dict) -> str:
+    return EmailResponse(**email).model_dump_json() + "\n"
+
+
+async def _stream_inbox(user: UserAccount, since_date: dt, max_results: int) -> StreamingResponse:
+    """
+    Stream inbox emails as NDJSON, one EmailResponse per line, as each Gmail
+    batch call returns. At most a page of emails is buffered, however many
+    are requested. The response starts once the first email has arrived,
+    so failures before that still get a proper status code.
+    """
+    emails = aiter_emails_since_date(
+        access_token=user.access_token,
+        refresh_token=user.refresh_token,
+        since_date=since_date,
+        max_results=max_results,
+        account_id=user.id
+    )
+    try:
+        first = await asyncio.wait_for(anext(emails), google_io.timeout)
+    except StopAsyncIteration:
+        first = None
+    except asyncio.TimeoutError:
+        raise GoogleIOTimeoutError(f"No email arrived from Gmail within {google_io.timeout}s")
+
+    async def _lines():
+        try:
+            if first is None:
+                return
+            yield _ndjson_line(first)
+            async for email in emails:
+                yield _ndjson_line(email)
+        except Exception as e:
+            # The status line has been sent already; report the error in-band
+            print(f"Error streaming emails: {str(e)}")
+            yield json.dumps({"error": f"Error fetching emails: {str(e)}"}) + "\n"
+        finally:
+            await emails.aclose()
+
+    return StreamingResponse(_lines(), media_type=NDJSON)
+
+
 @app.post("/emails/inbox", response_model=List[EmailResponse])
 async def get_inbox_emails(
     request_body: GetEmailsRequest,
+    request: Request,
+    stream: bool = False,
     user: UserAccount = Depends(get_current_user)
 ):
     """
     Get all inbox emails of the given user's Gmail account after the specified timestamp.
+
+    With `Accept: application/x-ndjson` or `?stream=true` the emails are
+    streamed as newline-delimited JSON while they are fetched, instead of
+    returned as one array at the end. A failure after the first email ends
+    the stream with an {"error": ...} line.
     
     Args:
         request_body: Contains gmail_address, timestamp, and optional max_results
@@ -319,20 +552,35 @@ async def get_inbox_emails(
             # Use the timestamp from request body
             since_date = request_body.timestamp
             max_results = request_body.max_results or 100
+
+            if stream or NDJSON in request.headers.get("accept", ""):
+                return await _stream_inbox(user, since_date, max_results)
             
-            # Fetch emails from Gmail API
-            emails = fetch_emails_since_date(
+            # Fetch emails from Gmail API on the Google I/O pool
+            emails = await google_io.run(
+                fetch_emails_since_date,
                 access_token=access_token,
                 refresh_token=refresh_token,
                 since_date=since_date,
-                max_results=max_results
+                max_results=max_results,
+                account_id=user.id
             )
             
             return emails
             
+        except GoogleIOTimeoutError as e:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail=f"Error fetching emails: {str(e)}"
+            )
+        except GoogleIOBusyError as e:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Error fetching emails: {str(e)}"
+            )
         except Exception as e:
             # If API call fails, token might be expired - try to refresh
-            log.error(f"Error fetching emails: {str(e)}")
+            print(f"Error fetching emails: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error fetching emails: {str(e)}"
@@ -347,21 +595,23 @@ async def get_inbox_emails(
         )
 
 
-@app.post("/emails/process")
+@app.post("/emails/process", status_code=status.HTTP_202_ACCEPTED)
 async def process_emails(
     request_body: GetEmailsRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: UserAccount = Depends(get_current_user)
 ):
     """
-    Get all inbox emails of the given user's Gmail account after the specified timestamp.
-    
+    Queue processing (summarize, categorize, store) of the user's inbox
+    emails after the specified timestamp.
+
     Args:
         request_body: Contains gmail_address, timestamp, and optional max_results
         db: Database session
-    
+
     Returns:
-        List of emails from the user's Gmail inbox after the specified timestamp
+        The ID of the queued job; follow GET /jobs/{job_id}/events or poll
+        GET /jobs/{job_id} for progress and results
     """
     try:
         # Find user by gmail_address
@@ -377,55 +627,14 @@ async def process_emails(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Gmail API access not configured for user '{request_body.gmail_address}'. Please grant Gmail API access permissions."
             )
-        
-        # Verify and refresh token if needed
-        access_token = user.access_token
-        refresh_token = user.refresh_token
-        
-        # Try to fetch emails using the stored access token
-        try:
-            # Use the timestamp from request body
-            since_date = request_body.timestamp
-            max_results = request_body.max_results or 100
-            
-            # Fetch emails from Gmail API
-            emails = fetch_emails_since_date(
-                access_token=access_token,
-                refresh_token=refresh_token,
-                since_date=since_date,
-                max_results=max_results
-            )
-
-            
-            # store email information in DB
-            for email in emails:
-                print(">>>>>>>>> emails: ", email)
-
-                summary = await generateSummary(email.body)
-                category = await defineCategory(user.id, email.body)
-                db_email = Email(
-                    gmail_msg_id=email['id'],
-                    account_id=user.id,
-                    category_id=category,
-                    received_at=email['received_at'],
-                    subject=email['subject'],
-                    sender=email['sender'],
-                    body=email['body'],
-                    summary=summary
-                )
-                db.add(db_email)
-                db.commit()
-                db.refresh(db_email)
 
-            return emails
-            
-        except Exception as e:
-            # If API call fails, token might be expired - try to refresh
-            print(f"Error fetching emails: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error fetching emails: {str(e)}"
-            )
+        job = await db.run_sync(enqueue_job, user.id, {
+            "since_date": request_body.timestamp.isoformat(),
+            "max_results": request_body.max_results or 100,
+            "incremental": bool(request_body.incremental),
+            "llm_mode": request_body.llm_mode,
+        })
+        return {"job_id": job.id, "status": job.status}
                 
     except HTTPException:
         raise
@@ -435,31 +644,119 @@ async def process_emails(
             detail=f"Error processing request: {str(e)}"
         )
 
-async def generateSummary(email: str) -> str:
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    user: UserAccount = Depends(get_current_user)
+):
     """
-    Generate a summary of the email body using OpenAI API.
+    Get progress and results of an email processing job.
     """
-    contentToSummarize = {
-        "subject": email['subject'],
-        "body": email['body']
-    }
-    summary = await summarize(contentToSummarize)
-    print("summary generated: ", summary)
-    return summary
-
-async def defineCategory(userId: int, email: json) -> str:
-    contentToDefineCategory = {
-        "subject": email['subject'],
-        "body": email['body'],
-        "sender": email['sender']
-    }
-    category = await categorize(userId, contentToDefineCategory)
-    print("category generated: ", category)
-    return category
+    job = await db.get(ProcessingJob, job_id)
+
+    if not job or job.account_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with id {job_id} not found"
+        )
+
+    return await db.run_sync(get_job_status, job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(
+    job_id: int,
+    request: Request,
+    last_event_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    user: UserAccount = Depends(get_current_user)
+):
+    """
+    Stream the progress of an email processing job as server-sent events.
+
+    Each email produces "fetched", "summarized", "categorized" and
+    "persisted" events, or "failed". "progress" events carry the running
+    totals and throughput, and a final "done" event ends the stream once
+    the job has finished. Events are buffered, so a client that reconnects
+    with the Last-Event-ID header (sent by EventSource automatically) or
+    `?last_event_id=` resumes where it left off.
+    """
+    job = await db.get(ProcessingJob, job_id)
+
+    if not job or job.account_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with id {job_id} not found"
+        )
+
+    header = request.headers.get("last-event-id")
+    if last_event_id is None and header:
+        try:
+            last_event_id = int(header)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid Last-Event-ID '{header}'"
+            )
+
+    return StreamingResponse(
+        stream_job_events(job_id, last_event_id or 0, request.is_disconnected),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/gmail/push", status_code=status.HTTP_204_NO_CONTENT)
+async def gmail_push(
+    body: PubSubPushRequest,
+    token: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Cloud Pub/Sub push endpoint for Gmail users.watch notifications.
+
+    Queues an incremental sync job of the notified account. Bursts of
+    notifications for one account are coalesced into a single job.
+    Notifications for unknown accounts or already-synced history are
+    acknowledged and dropped, so Pub/Sub does not redeliver them. Not
+    served unless GMAIL_PUSH_TOKEN is set.
+    """
+    if not GMAIL_PUSH_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Push notifications are not configured"
+        )
+    if not hmac.compare_digest(token or "", GMAIL_PUSH_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid push token"
+        )
+
+    try:
+        notification = decode_notification(body.message.data)
+    except InvalidNotificationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    user = await db.scalar(select(UserAccount).where(UserAccount.gmail_address == notification["emailAddress"]))
+    if not user or not user.access_token:
+        push_syncs.stats["unknown_account"] += 1
+        return None
+    if is_stale(user, notification["historyId"]):
+        push_syncs.stats["stale"] += 1
+        return None
+
+    await push_syncs.notify(user.id)
+    return None
+
 
 @app.get("/auth/google/connect")
 async def connect_google(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user: UserAccount = Depends(get_current_user)
 ):
     """
@@ -521,7 +818,7 @@ async def google_callback(
     request: Request,
     code: str,
     state: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     print("google_callback() endpoint is running in python server")
     """Handle Google's redirect and exchange auth code for tokens"""
@@ -535,7 +832,7 @@ async def google_callback(
     # Validate state (contains user_id)
     try:
         user_id = int(state)
-        user = db.query(UserAccount).filter(UserAccount.id == user_id).first()
+        user = await db.get(UserAccount, user_id)
         
         print("User ID in oauth/callback url is found in DB as well. user.id: ", user.id, "user.gmail_address: ", user.gmail_address)
         if not user:
@@ -572,7 +869,7 @@ async def google_callback(
         
         # Exchange authorization code for tokens
         # Don't pass redirect_uri - it's already set in the Flow configuration
-        flow.fetch_token(code=code)
+        await google_io.run(flow.fetch_token, code=code)
         
         print(">>>> flow.credentials: ", flow.credentials)
         
@@ -581,6 +878,12 @@ async def google_callback(
         #json stringify the credentials
 
 
+    except (GoogleIOTimeoutError, GoogleIOBusyError) as e:
+        print(f">>>> Token exchange did not complete in google_callback: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT if isinstance(e, GoogleIOTimeoutError) else status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Error processing OAuth callback: {str(e)}"
+        )
     except Exception as e:
         print(f">>>> Error in google_callback: {str(e)}")
         raise HTTPException(
@@ -589,12 +892,21 @@ async def google_callback(
         )
 
     # check in DB whether the userID already exists in the DB and then update the access_token and refresh_token
-    user = db.query(UserAccount).filter(UserAccount.id == user_id).first()
+    user = await db.get(UserAccount, user_id)
     if user:
         user.access_token = credentials.token
         user.refresh_token = credentials.refresh_token
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        await db.refresh(user)
+        user_cache.invalidate(user.id)
+        # Pooled Gmail clients pick up the new tokens without being rebuilt
+        client_pool.update_credentials(user.id, user.access_token, user.refresh_token)
+        if GMAIL_PUSH_TOPIC:
+            try:
+                await google_io.run(renew_account_watch, user.id)
+            except Exception as e:
+                # The watch renewer retries; the account is polled until then
+                print(f"Failed to start Gmail watch for user {user.id}: {str(e)}")
         print("Access token and refresh token updated successfully for user: ", user.id, "gmail: ", user.gmail_address)
     else:
         # User not found - need to fetch user info from Google and create new user
@@ -623,8 +935,8 @@ async def google_callback(
                     refresh_token=credentials.refresh_token
                 )
                 db.add(user)
-                db.commit()
-                db.refresh(user)
+                await db.commit()
+                await db.refresh(user)
                 print(f"User added to DB successfully. user.id: {user.id}, gmail: {user.gmail_address}")
             else:
                 # If userinfo API fails, raise an error
@@ -653,7 +965,7 @@ async def google_callback(
 @app.post("/categories", status_code=status.HTTP_201_CREATED)
 async def create_category(
     category: CategoryCreate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_async_db), 
     user: UserAccount = Depends(get_current_user)):
     """
     Create a new category.
@@ -668,8 +980,9 @@ async def create_category(
     
     print(">>>>>>>>> user id: ", user.id)
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    await llm_cache.ainvalidate_categories(user.id, db)
     
     return db_category
 
@@ -678,12 +991,12 @@ async def create_category(
 async def update_category(
     category_id: int,
     category_update: CategoryUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update a category (full update - all fields required except optional ones).
     """
-    db_category = db.query(Category).filter(Category.id == category_id).first()
+    db_category = await db.get(Category, category_id)
     
     if not db_category:
         raise HTTPException(
@@ -697,8 +1010,9 @@ async def update_category(
     if category_update.description is not None:
         db_category.description = category_update.description
     
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    await llm_cache.ainvalidate_categories(db_category.account_id, db)
     
     return db_category
 
@@ -707,12 +1021,12 @@ async def update_category(
 async def partial_update_category(
     category_id: int,
     category_update: CategoryUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Partially update a category (only provided fields are updated).
     """
-    db_category = db.query(Category).filter(Category.id == category_id).first()
+    db_category = await db.get(Category, category_id)
     
     if not db_category:
         raise HTTPException(
@@ -725,18 +1039,19 @@ async def partial_update_category(
     for field, value in update_data.items():
         setattr(db_category, field, value)
     
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    await llm_cache.ainvalidate_categories(db_category.account_id, db)
     
     return db_category
 
 
 @app.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_category(category_id: int, db: Session = Depends(get_db)):
+async def delete_category(category_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a category.
     """
-    db_category = db.query(Category).filter(Category.id == category_id).first()
+    db_category = await db.get(Category, category_id)
     
     if not db_category:
         raise HTTPException(
@@ -744,8 +1059,12 @@ async def delete_category(category_id: int, db: Session = Depends(get_db)):
             detail=f"Category with id {category_id} not found"
         )
     
-    db.delete(db_category)
-    db.commit()
+    account_id = db_category.account_id
+    await db.delete(db_category)
+    await db.commit()
+    # The category's emails were deleted with it; they may be fetched again
+    known_ids.forget(account_id)
+    await llm_cache.ainvalidate_categories(account_id, db)
     
     return None
 
@@ -0,0 +1,58 @@
+"""
+Alembic environment. Migrations run on the application's own engine, so
+they use DATABASE_URL and, for SQLite, the same connection as the app.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+from database.database import engine
+from models.db_models import Base
+
+if context.config.config_file_name is not None:
+    fileConfig(context.config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Keep autogenerate away from the full-text search objects of revision
+    0003, which are managed by hand and not part of the models.
+    """
+    if type_ == "table" and name.startswith("emails_fts"):
+        return False
+    if name in ("search_vector", "ix_emails_search_vector"):
+        return False
+    return True
+
+
+def run_migrations_offline():
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        include_object=include_object,
+        render_as_batch=engine.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            # SQLite can only alter tables by copying them
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,116 @@
+"""Baseline schema
+
+Creates the tables as Base.metadata.create_all() used to. Databases that
+were created that way are adopted as they are: existing tables are kept and
+only missing tables and nullable columns added since are created.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _tables():
+    metadata = sa.MetaData()
+    return [
+        sa.Table(
+            'user_accounts', metadata,
+            sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column('gmail_address', sa.String, nullable=False, unique=True),
+            sa.Column('name', sa.String, nullable=True),
+            sa.Column('picture', sa.String, nullable=True),
+            sa.Column('access_token', sa.Text, nullable=True),
+            sa.Column('refresh_token', sa.Text, nullable=True),
+            sa.Column('last_history_id', sa.String, nullable=True),
+            sa.Column('watch_expiration', sa.DateTime, nullable=True),
+        ),
+        sa.Table(
+            'categories', metadata,
+            sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column('name', sa.String, nullable=False),
+            sa.Column('description', sa.Text),
+            sa.Column('account_id', sa.Integer, sa.ForeignKey('user_accounts.id'), nullable=False),
+        ),
+        sa.Table(
+            'emails', metadata,
+            sa.Column('gmail_msg_id', sa.String, primary_key=True),
+            sa.Column('account_id', sa.Integer, sa.ForeignKey('user_accounts.id'), nullable=False),
+            sa.Column('category_id', sa.Integer, sa.ForeignKey('categories.id'), nullable=True),
+            sa.Column('received_at', sa.DateTime, nullable=False),
+            sa.Column('summary', sa.Text),
+            sa.Column('summary_created_at', sa.DateTime),
+            sa.Column('subject', sa.String, nullable=True),
+            sa.Column('sender', sa.String, nullable=True),
+            sa.Column('body', sa.Text, nullable=True),
+        ),
+        sa.Table(
+            'llm_cache', metadata,
+            sa.Column('key', sa.String(64), primary_key=True),
+            sa.Column('account_id', sa.Integer, sa.ForeignKey('user_accounts.id'), nullable=False),
+            sa.Column('kind', sa.String, nullable=False),
+            sa.Column('value', sa.Text, nullable=False),
+            sa.Column('created_at', sa.DateTime),
+            sa.Index('ix_llm_cache_account_kind', 'account_id', 'kind'),
+        ),
+        sa.Table(
+            'processing_jobs', metadata,
+            sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column('account_id', sa.Integer, sa.ForeignKey('user_accounts.id'), nullable=False, index=True),
+            sa.Column('status', sa.String, nullable=False),
+            sa.Column('params', sa.Text, nullable=False),
+            sa.Column('history_id', sa.String, nullable=True),
+            sa.Column('total', sa.Integer, nullable=False),
+            sa.Column('processed', sa.Integer, nullable=False),
+            sa.Column('failed', sa.Integer, nullable=False),
+            sa.Column('inserted', sa.Integer, nullable=False),
+            sa.Column('skipped', sa.Integer, nullable=False),
+            sa.Column('already_processed', sa.Integer, nullable=False),
+            sa.Column('error', sa.Text, nullable=True),
+            sa.Column('created_at', sa.DateTime),
+            sa.Column('updated_at', sa.DateTime),
+        ),
+        sa.Table(
+            'work_items', metadata,
+            sa.Column('id', sa.Integer, primary_key=True, autoincrement=True),
+            sa.Column('job_id', sa.Integer, sa.ForeignKey('processing_jobs.id'), nullable=False, index=True),
+            sa.Column('kind', sa.String, nullable=False),
+            sa.Column('payload', sa.Text, nullable=False),
+            sa.Column('status', sa.String, nullable=False),
+            sa.Column('attempts', sa.Integer, nullable=False),
+            sa.Column('available_at', sa.DateTime, nullable=False),
+            sa.Column('leased_by', sa.String, nullable=True),
+            sa.Column('lease_expires_at', sa.DateTime, nullable=True),
+            sa.Column('result', sa.Text, nullable=True),
+            sa.Column('error', sa.Text, nullable=True),
+            sa.Index('ix_work_items_status_available', 'status', 'available_at'),
+        ),
+    ]
+
+
+def upgrade():
+    bind = op.get_bind()
+    # Offline (--sql) runs cannot look at the database; emit the full schema
+    inspector = None if op.get_context().as_sql else sa.inspect(bind)
+    existing = set(inspector.get_table_names()) if inspector else set()
+    for table in _tables():
+        if table.name not in existing:
+            table.create(bind)
+            continue
+        columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns and column.nullable:
+                op.add_column(table.name, column.copy())
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table in reversed(_tables()):
+        table.drop(bind, checkfirst=True)
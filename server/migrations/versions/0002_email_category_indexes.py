@@ -0,0 +1,41 @@
+"""Indexes for per-account email and category queries
+
+emails are listed per account newest first, optionally filtered by
+category; categories are always loaded per account. On PostgreSQL the
+indexes are built CONCURRENTLY so writes to a large emails table are not
+blocked while they build.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_emails_account_received', 'emails', [sa.text('account_id'), sa.text('received_at DESC')]),
+    ('ix_emails_account_category_received', 'emails',
+     [sa.text('account_id'), sa.text('category_id'), sa.text('received_at DESC')]),
+    ('ix_emails_category_id', 'emails', ['category_id']),
+    ('ix_categories_account_id', 'categories', ['account_id']),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
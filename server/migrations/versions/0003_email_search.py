@@ -0,0 +1,82 @@
+"""Full-text search index over stored emails
+
+PostgreSQL: a generated, stored tsvector column emails.search_vector
+(subject and sender weighted above summary and body) with a GIN index.
+Adding it rewrites the emails table.
+
+SQLite: an FTS5 table emails_fts over the same columns and account_id, with
+emails as its
+external content table, kept in sync by triggers. It is keyed by the rowid
+of emails, which VACUUM may renumber; run
+`INSERT INTO emails_fts(emails_fts) VALUES('rebuild')` after a VACUUM.
+
+Neither is part of the ORM models; see email_search.py for the queries.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(subject, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(sender, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(summary, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(body, '')), 'C')"
+)
+
+# account_id is indexed as a token so a search can be limited to one
+# account inside the FTS index instead of after matching every account
+FTS_COLUMNS = 'account_id, subject, sender, summary, body'
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute(f"ALTER TABLE emails ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({POSTGRES_VECTOR}) STORED")
+        op.execute("CREATE INDEX ix_emails_search_vector ON emails USING gin (search_vector)")
+    elif dialect == 'sqlite':
+        op.execute(
+            f"CREATE VIRTUAL TABLE emails_fts USING fts5({FTS_COLUMNS}, "
+            "content='emails', content_rowid='rowid', tokenize='porter unicode61')"
+        )
+        op.execute(f"""
+            CREATE TRIGGER emails_fts_insert AFTER INSERT ON emails BEGIN
+                INSERT INTO emails_fts(rowid, {FTS_COLUMNS})
+                VALUES (new.rowid, new.account_id, new.subject, new.sender, new.summary, new.body);
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER emails_fts_delete AFTER DELETE ON emails BEGIN
+                INSERT INTO emails_fts(emails_fts, rowid, {FTS_COLUMNS})
+                VALUES ('delete', old.rowid, old.account_id, old.subject, old.sender, old.summary, old.body);
+            END
+        """)
+        op.execute(f"""
+            CREATE TRIGGER emails_fts_update AFTER UPDATE OF {FTS_COLUMNS} ON emails BEGIN
+                INSERT INTO emails_fts(emails_fts, rowid, {FTS_COLUMNS})
+                VALUES ('delete', old.rowid, old.account_id, old.subject, old.sender, old.summary, old.body);
+                INSERT INTO emails_fts(rowid, {FTS_COLUMNS})
+                VALUES (new.rowid, new.account_id, new.subject, new.sender, new.summary, new.body);
+            END
+        """)
+        # Index the emails stored so far
+        op.execute("INSERT INTO emails_fts(emails_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_emails_search_vector")
+        op.execute("ALTER TABLE emails DROP COLUMN IF EXISTS search_vector")
+    elif dialect == 'sqlite':
+        for trigger in ('emails_fts_insert', 'emails_fts_delete', 'emails_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS emails_fts")
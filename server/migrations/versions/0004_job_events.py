@@ -0,0 +1,34 @@
+"""Per-email progress events of processing jobs
+
+job_events buffers the events streamed by GET /jobs/{job_id}/events, so a
+client that reconnects can resume after the last event it received.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job_events',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('job_id', sa.Integer(), sa.ForeignKey('processing_jobs.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('type', sa.String(), nullable=False),
+        sa.Column('data', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_job_events_job_id', 'job_events', ['job_id', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_job_events_job_id', table_name='job_events')
+    op.drop_table('job_events')
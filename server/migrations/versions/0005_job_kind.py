@@ -0,0 +1,29 @@
+"""Kind of processing job
+
+Background syncs run as "sync" jobs on the job queue, so API processes can
+tell whether an account already has one queued or running.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'processing_jobs',
+        sa.Column('kind', sa.String(), nullable=False, server_default='process'),
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('processing_jobs') as batch:
+        batch.drop_column('kind')
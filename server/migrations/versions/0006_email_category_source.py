@@ -0,0 +1,26 @@
+"""Source of an email's category
+
+Records whether an email's category was decided by the LLM or locally, so
+sender rules and the local classifier learn only from LLM decisions.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('emails', sa.Column('category_source', sa.String(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('emails') as batch:
+        batch.drop_column('category_source')
@@ -1,11 +1,16 @@
 from sqlalchemy import (
-    Column, String, Text, DateTime, ForeignKey, Integer
+    Column, String, Text, DateTime, ForeignKey, Integer, Index
 )
 from sqlalchemy.orm import relationship, declarative_base
 from datetime import datetime, timezone
 
 Base = declarative_base()
 
+# Email.category_source values of categories decided without the LLM. Such
+# emails are not learned from: a rule or model trained on its own decisions
+# only reinforces them, mistakes included
+LOCAL_CATEGORY_SOURCES = ('sender_rule', 'local_classifier')
+
 
 class UserAccount(Base):
     __tablename__ = "user_accounts"
@@ -20,6 +25,11 @@ class UserAccount(Base):
     access_token = Column(Text, nullable=True)  # OAuth 2.0 access token
     refresh_token = Column(Text, nullable=True)  # OAuth 2.0 refresh token
 
+    # Gmail historyId checkpoint for incremental sync
+    last_history_id = Column(String, nullable=True)
+    # When the Gmail push notification watch must be renewed by
+    watch_expiration = Column(DateTime, nullable=True)
+
     # Relationships
     categories = relationship("Category", back_populates="account", cascade="all, delete-orphan")
     emails = relationship("Email", back_populates="account", cascade="all, delete-orphan")
@@ -31,7 +41,7 @@ class Category(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String, nullable=False)
     description = Column(Text)
-    account_id = Column(Integer, ForeignKey("user_accounts.id"), nullable=False)
+    account_id = Column(Integer, ForeignKey("user_accounts.id"), nullable=False, index=True)
 
     # Relationship
     account = relationship("UserAccount", back_populates="categories")
@@ -44,6 +54,9 @@ class Email(Base):
     gmail_msg_id = Column(String, primary_key=True)
     account_id = Column(Integer, ForeignKey("user_accounts.id"), nullable=False)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    # Who decided category_id: llm, sender_rule or local_classifier; NULL for
+    # emails stored before it was recorded. Added by migrations/versions/0006
+    category_source = Column(String, nullable=True)
     received_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
     summary = Column(Text)
     summary_created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -53,4 +66,91 @@ class Email(Base):
 
     # Relationships
     account = relationship("UserAccount", back_populates="emails")
-    category = relationship("Category", back_populates="emails")
\ No newline at end of file
+    category = relationship("Category", back_populates="emails")
+
+    # Emails are read per account, newest first, optionally within one
+    # category. category_id alone serves the category delete cascade.
+    # Added to existing databases by migrations/versions/0002
+    __table_args__ = (
+        Index("ix_emails_account_received", account_id, received_at.desc()),
+        Index("ix_emails_account_category_received", account_id, category_id, received_at.desc()),
+        Index("ix_emails_category_id", category_id),
+    )
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    # sha256 of the normalized email content (see llm_cache.py)
+    key = Column(String(64), primary_key=True)
+    account_id = Column(Integer, ForeignKey("user_accounts.id"), nullable=False)
+    kind = Column(String, nullable=False)  # "summary" or "category"
+    value = Column(Text, nullable=False)  # JSON encoded result
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_llm_cache_account_kind", "account_id", "kind"),
+    )
+
+
+class ProcessingJob(Base):
+    __tablename__ = "processing_jobs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    account_id = Column(Integer, ForeignKey("user_accounts.id"), nullable=False, index=True)
+    # "process" for POST /emails/process, "sync" for scheduled and push syncs
+    kind = Column(String, nullable=False, default="process", server_default="process")
+    status = Column(String, nullable=False, default="pending")  # pending, running, succeeded, failed
+    params = Column(Text, nullable=False)  # JSON encoded request parameters
+    history_id = Column(String, nullable=True)  # Checkpoint to save once an incremental job succeeds
+
+    # Progress counters, updated atomically by the workers
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    already_processed = Column(Integer, nullable=False, default=0)
+
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    items = relationship("WorkItem", back_populates="job", cascade="all, delete-orphan")
+
+
+class WorkItem(Base):
+    __tablename__ = "work_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey("processing_jobs.id"), nullable=False, index=True)
+    kind = Column(String, nullable=False)  # "fetch" or "process"
+    payload = Column(Text, nullable=False)  # JSON encoded
+    status = Column(String, nullable=False, default="pending")  # pending, leased, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    leased_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    result = Column(Text, nullable=True)  # JSON encoded
+    error = Column(Text, nullable=True)
+
+    job = relationship("ProcessingJob", back_populates="items")
+
+    __table_args__ = (
+        Index("ix_work_items_status_available", "status", "available_at"),
+    )
+
+
+class JobEvent(Base):
+    __tablename__ = "job_events"
+
+    # Increasing, so it doubles as the server-sent event ID clients resume from
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(Integer, ForeignKey("processing_jobs.id", ondelete="CASCADE"), nullable=False)
+    type = Column(String, nullable=False)  # fetched, summarized, categorized, persisted, failed
+    data = Column(Text, nullable=False)  # JSON encoded
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index("ix_job_events_job_id", "job_id", "id"),
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 
 
@@ -43,6 +43,27 @@ class EmailResponse(BaseModel):
         from_attributes = True
 
 
+# Processed emails stored in the database
+class StoredEmailResponse(BaseModel):
+    id: str
+    subject: Optional[str] = None
+    sender: Optional[str] = None
+    received_at: datetime
+    category_id: Optional[int] = None
+    summary: Optional[str] = None
+    body: Optional[str] = None  # Only included when requested
+
+
+class StoredEmailPage(BaseModel):
+    emails: List[StoredEmailResponse]
+    next_cursor: Optional[str] = None  # Pass as `cursor` to get the next page; None on the last page
+
+
+class EmailSearchPage(BaseModel):
+    emails: List[StoredEmailResponse]  # Best match first
+    next_offset: Optional[int] = None  # Pass as `offset` to get the next page; None on the last page
+
+
 # OAuth Schemas
 class OAuthInitiateResponse(BaseModel):
     authorization_url: str
@@ -54,4 +75,18 @@ class GetEmailsRequest(BaseModel):
     gmail_address: str
     timestamp: datetime  # ISO format datetime string
     max_results: Optional[int] = 100  # Optional, defaults to 100
+    incremental: Optional[bool] = False  # Only fetch mail added since the last sync checkpoint
+    llm_mode: Optional[Literal["combined", "two_call"]] = None  # Defaults to the LLM_MODE setting
+
+
+
+# Gmail push notification Schemas (Cloud Pub/Sub push subscription)
+class PubSubMessage(BaseModel):
+    data: str  # base64 encoded JSON: {"emailAddress": ..., "historyId": ...}
+    messageId: Optional[str] = None
+    publishTime: Optional[str] = None
+
 
+class PubSubPushRequest(BaseModel):
+    message: PubSubMessage
+    subscription: Optional[str] = None
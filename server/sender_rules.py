@@ -0,0 +1,270 @@
+"""
+Sender and domain rules learned from past categorizations.
+
+For each account, counts of categories per normalized sender address and
+per sender domain are built from the emails table, from emails the LLM
+categorized; emails routed by a rule are not counted again. An email whose sender
+(or, failing that, domain) has been put in one category at least
+SENDER_RULES_AGREEMENT of the time, over at least SENDER_RULES_MIN_EMAILS
+emails, is routed to that category without the LLM. Indexes are updated as
+emails are stored by this process (see email_store.upsert_emails), and
+rebuilt when the account's category set changes or SENDER_RULES_REFRESH
+seconds have passed, so emails stored by other processes are counted too.
+"""
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from models.db_models import Category, Email, LOCAL_CATEGORY_SOURCES
+from database.database import SessionLocal
+from llm_cache import category_version
+from collections import OrderedDict
+from email.utils import parseaddr
+from typing import Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Set to "false" to route no email by its sender
+SENDER_RULES_ENABLED = os.getenv('SENDER_RULES_ENABLED', 'true').lower() == 'true'
+# Share of a sender's (or domain's) categorized emails that must agree on
+# one category before new emails from it are routed there
+SENDER_RULES_AGREEMENT = float(os.getenv('SENDER_RULES_AGREEMENT', '0.9'))
+# Categorized emails a sender (or domain) needs before it forms a rule
+SENDER_RULES_MIN_EMAILS = int(os.getenv('SENDER_RULES_MIN_EMAILS', '3'))
+# Seconds an index is used before it is rebuilt from the database
+SENDER_RULES_REFRESH = float(os.getenv('SENDER_RULES_REFRESH', '600'))
+# Accounts whose indexes are kept in memory
+SENDER_RULES_MAX_ACCOUNTS = int(os.getenv('SENDER_RULES_MAX_ACCOUNTS', '1000'))
+
+# Shared by unrelated people, so they never form domain rules
+FREEMAIL_DOMAINS = frozenset({
+    'gmail.com', 'yahoo.com', 'outlook.com', 'hotmail.com', 'live.com', 'msn.com', 'icloud.com',
+    'me.com', 'aol.com', 'proton.me', 'protonmail.com', 'gmx.com', 'gmx.de', 'mail.com', 'yandex.ru',
+})
+# Second-level labels under which registrations happen one level down,
+# e.g. example.co.uk
+_SECOND_LEVEL = frozenset({'co', 'com', 'ac', 'gov', 'edu', 'org', 'net', 'ne', 'or', 'go'})
+
+
+def normalize_address(sender: Optional[str]) -> Optional[str]:
+    """
+    The address of a From header, lowercased, without a +tag, and with
+    Gmail's ignored dots removed. None if there is no valid address.
+    """
+    address = parseaddr(sender or '')[1].strip().lower()
+    if address.count('@') != 1:
+        return None
+    local, domain = address.split('@')
+    domain = domain.rstrip('.')
+    if domain == 'googlemail.com':
+        domain = 'gmail.com'
+    local = local.split('+', 1)[0]
+    if domain == 'gmail.com':
+        local = local.replace('.', '')
+    if not local or '.' not in domain:
+        return None
+    return f'{local}@{domain}'
+
+
+def sender_domain(address: str) -> str:
+    """
+    Registrable domain of a normalized address: news.example.com and
+    example.com both give example.com, mail.example.co.uk gives example.co.uk.
+    """
+    labels = address.rsplit('@', 1)[1].split('.')
+    keep = 3 if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL else 2
+    return '.'.join(labels[-keep:])
+
+
+def sender_keys(sender: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (address key, domain key) of a From header; the domain key is None for
+    free mail providers.
+    """
+    address = normalize_address(sender)
+    if address is None:
+        return None, None
+    domain = sender_domain(address)
+    return address, None if domain in FREEMAIL_DOMAINS else domain
+
+
+class SenderIndex:
+    """
+    Category counts per sender address and domain of one account.
+    """
+
+    def __init__(self, version: str):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.addresses: Dict[str, Dict[int, int]] = {}
+        self.domains: Dict[str, Dict[int, int]] = {}
+
+    def add(self, sender: Optional[str], category_id: int, count: int = 1) -> None:
+        address, domain = sender_keys(sender)
+        for table, key in ((self.addresses, address), (self.domains, domain)):
+            if key is not None:
+                counts = table.setdefault(key, {})
+                counts[category_id] = counts.get(category_id, 0) + count
+
+    @staticmethod
+    def _rule(counts: Optional[Dict[int, int]], agreement: float, min_emails: int) -> Optional[Tuple[int, float]]:
+        if not counts:
+            return None
+        total = sum(counts.values())
+        category_id, count = max(counts.items(), key=lambda item: item[1])
+        share = count / total
+        if total < min_emails or share < agreement:
+            return None
+        return category_id, share
+
+    def match(self, sender: Optional[str], agreement: float, min_emails: int) -> Optional[Tuple[str, int, float]]:
+        """
+        (rule kind, category ID, agreement) of the rule an email's sender
+        falls under, the address rule taking precedence; None if neither
+        qualifies.
+        """
+        address, domain = sender_keys(sender)
+        for kind, table, key in (('address', self.addresses, address), ('domain', self.domains, domain)):
+            rule = self._rule(table.get(key), agreement, min_emails) if key is not None else None
+            if rule is not None:
+                return (kind,) + rule
+        return None
+
+
+def build_index(db: Session, account_id: int, version: str) -> SenderIndex:
+    """
+    An account's index from its emails categorized by the LLM, counted
+    per stored From header in the database.
+    """
+    index = SenderIndex(version)
+    rows = db.execute(
+        select(Email.sender, Email.category_id, func.count())
+        .where(
+            Email.account_id == account_id,
+            Email.category_id.isnot(None),
+            or_(Email.category_source.is_(None), Email.category_source.notin_(LOCAL_CATEGORY_SOURCES))
+        )
+        .group_by(Email.sender, Email.category_id)
+    ).all()
+    for sender, category_id, count in rows:
+        index.add(sender, category_id, count)
+    return index
+
+
+class SenderRules:
+    """
+    Per-account SenderIndexes, built on first use, with hit counters.
+
+    Thread-safe; indexes are built in worker threads and updated from
+    wherever emails are stored.
+    """
+
+    def __init__(
+        self,
+        agreement: float = SENDER_RULES_AGREEMENT,
+        min_emails: int = SENDER_RULES_MIN_EMAILS,
+        refresh: float = SENDER_RULES_REFRESH,
+        max_accounts: int = SENDER_RULES_MAX_ACCOUNTS
+    ):
+        self.agreement = agreement
+        self.min_emails = min_emails
+        self.refresh = refresh
+        self.max_accounts = max_accounts
+        self._indexes: 'OrderedDict[int, SenderIndex]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'lookups': 0, 'address_hits': 0, 'domain_hits': 0,
+            'recorded': 0, 'builds': 0, 'build_seconds': 0.0,
+        }
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['accounts'] = len(self._indexes)
+        stats['build_seconds'] = round(stats['build_seconds'], 3)
+        hits = stats['address_hits'] + stats['domain_hits']
+        stats['hit_rate'] = hits / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+    def _index(self, account_id: int, categories: List[Category]) -> SenderIndex:
+        version = category_version(categories)
+        with self._lock:
+            index = self._indexes.get(account_id)
+            if index is not None and index.version == version and time.monotonic() - index.built_at < self.refresh:
+                self._indexes.move_to_end(account_id)
+                return index
+
+        start = time.perf_counter()
+        db: Session = SessionLocal()
+        try:
+            index = build_index(db, account_id, version)
+        finally:
+            db.close()
+        elapsed = time.perf_counter() - start
+        logger.debug("Built sender index for account %s in %.3fs", account_id, elapsed)
+
+        with self._lock:
+            self._indexes[account_id] = index
+            self._indexes.move_to_end(account_id)
+            while len(self._indexes) > self.max_accounts:
+                self._indexes.popitem(last=False)
+            self._stats['builds'] += 1
+            self._stats['build_seconds'] += elapsed
+        return index
+
+    def route(self, account_id: int, emails: List[Dict], categories: List[Category]) -> List[Optional[Dict]]:
+        """
+        Categories of emails whose sender or domain forms a rule.
+
+        Returns:
+            Per email, {'category_id', 'confidence'} (the rule's agreement)
+            or None where no rule applies
+        """
+        if not emails:
+            return []
+        index = self._index(account_id, categories)
+        known = {cat.id for cat in categories}
+        results: List[Optional[Dict]] = []
+        hits = {'address': 0, 'domain': 0}
+        with self._lock:
+            for email in emails:
+                match = index.match(email.get('sender'), self.agreement, self.min_emails)
+                if match is None or match[1] not in known:
+                    results.append(None)
+                    continue
+                kind, category_id, share = match
+                hits[kind] += 1
+                results.append({'category_id': category_id, 'confidence': round(share, 3)})
+            self._stats['lookups'] += len(emails)
+            self._stats['address_hits'] += hits['address']
+            self._stats['domain_hits'] += hits['domain']
+        return results
+
+    def record(self, account_id: int, emails: Iterable[Dict]) -> None:
+        """
+        Count newly stored emails the LLM categorized in the account's
+        index, if it is loaded. Pass each stored email once, and no email
+        categorized locally.
+        """
+        with self._lock:
+            index = self._indexes.get(account_id)
+            if index is None:
+                return
+            for email in emails:
+                if email.get('category_id') is not None:
+                    index.add(email.get('sender'), email['category_id'])
+                    self._stats['recorded'] += 1
+
+    def invalidate(self, account_id: int) -> None:
+        """
+        Drop an account's index, e.g. after stored categories were changed;
+        it is rebuilt from the database on next use.
+        """
+        with self._lock:
+            self._indexes.pop(account_id, None)
+
+
+sender_rules = SenderRules()
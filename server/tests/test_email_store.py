@@ -0,0 +1,105 @@
+"""
+Stored email times: Date headers carry the sender's UTC offset, stored and
+queried emails are compared in UTC. And the cache of known message IDs.
+
+Run from the server directory:
+    python -m pytest tests
+"""
+import os
+import tempfile
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ['DATABASE_URL'] = f'sqlite:///{_tmpdir.name}/test.db'
+os.environ.setdefault('OPENAI_API_KEY', 'fake-key')
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from database.database import AsyncSessionLocal, SessionLocal, init_db
+from email_store import KnownIdCache, list_stored_emails, upsert_emails
+from models.db_models import Email, UserAccount
+
+ACCOUNT_ID = 1
+MOUNTAIN = timezone(timedelta(hours=-7))
+BERLIN = timezone(timedelta(hours=1))
+
+
+@pytest.fixture(scope='module', autouse=True)
+def emails():
+    """
+    Five emails sent 10:00-10:04 at -07:00 (17:00-17:04 UTC), interleaved
+    with four sent 18:00:30-18:03:30 at +01:00 (17:00:30-17:03:30 UTC).
+    """
+    init_db()
+    db = SessionLocal()
+    db.add(UserAccount(id=ACCOUNT_ID, gmail_address='me@example.com'))
+    db.commit()
+    upsert_emails(db, ACCOUNT_ID, [
+        {'id': f'mountain{minute}', 'received_at': datetime(2024, 1, 1, 10, minute, tzinfo=MOUNTAIN)}
+        for minute in range(5)
+    ] + [
+        {'id': f'berlin{minute}', 'received_at': datetime(2024, 1, 1, 18, minute, 30, tzinfo=BERLIN)}
+        for minute in range(4)
+    ])
+    yield
+    db.query(Email).delete()
+    db.query(UserAccount).delete()
+    db.commit()
+    db.close()
+
+
+def _list(**filters):
+    async def _run():
+        async with AsyncSessionLocal() as db:
+            return await list_stored_emails(db, ACCOUNT_ID, **filters)
+    return asyncio.run(_run())
+
+
+def test_received_at_is_stored_as_utc():
+    db = SessionLocal()
+    try:
+        assert db.get(Email, 'mountain0').received_at == datetime(2024, 1, 1, 17, 0)
+        assert db.get(Email, 'berlin0').received_at == datetime(2024, 1, 1, 17, 0, 30)
+    finally:
+        db.close()
+
+
+def test_since_until_compare_in_utc():
+    emails, _ = _list(since=datetime(2024, 1, 1, 17, 2, tzinfo=timezone.utc))
+    assert [email.gmail_msg_id for email in emails] == [
+        'mountain4', 'berlin3', 'mountain3', 'berlin2', 'mountain2'
+    ]
+
+    emails, _ = _list(
+        since=datetime(2024, 1, 1, 10, 1, tzinfo=MOUNTAIN),
+        until=datetime(2024, 1, 1, 18, 2, tzinfo=BERLIN),
+    )
+    assert [email.gmail_msg_id for email in emails] == ['berlin1', 'mountain1']
+
+
+def test_pages_follow_utc_order_across_offsets():
+    seen = []
+    cursor = None
+    while True:
+        emails, cursor = _list(cursor=cursor, limit=2)
+        seen.extend(email.gmail_msg_id for email in emails)
+        if cursor is None:
+            break
+    assert seen == [
+        'mountain4', 'berlin3', 'mountain3', 'berlin2', 'mountain2',
+        'berlin1', 'mountain1', 'berlin0', 'mountain0',
+    ]
+
+
+def test_known_ids_are_forgotten_and_expire():
+    cache = KnownIdCache(ttl=60)
+    cache.add(ACCOUNT_ID, ['a', 'b'])
+    assert cache.known(ACCOUNT_ID, ['a', 'c']) == {'a'}
+    cache.forget(ACCOUNT_ID)
+    assert cache.known(ACCOUNT_ID, ['a', 'b']) == set()
+
+    expired = KnownIdCache(ttl=0)
+    expired.add(ACCOUNT_ID, ['a'])
+    assert expired.known(ACCOUNT_ID, ['a']) == set()
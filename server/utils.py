@@ -1,43 +1,237 @@
+import asyncio
+import json
+import os
 import sqlite3
+import threading
+import logging
+import httpx
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 from sqlalchemy.orm import Session
 from database.database import SessionLocal
 from models.db_models import Category
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
 
-async def summarize(mail_content: str) -> str:
-    llm = ChatOpenAI(model="gpt-3.5-turbo")
+logger = logging.getLogger(__name__)
+
+# LLM client settings
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+
+class LLMClientManager:
+    """
+    Process-wide LLM client with one pooled async HTTP client per event loop,
+    so keep-alive connections and TLS sessions are reused across emails.
+
+    Clients are created lazily on first use in a loop. aclose() closes them
+    and must be awaited before a loop ends (see the FastAPI lifespan in
+    main.py and worker.py): a client whose loop has already closed can no
+    longer be shut down cleanly, and is only dropped.
+    """
+
+    def __init__(
+        self,
+        model: str = LLM_MODEL,
+        timeout: float = LLM_TIMEOUT,
+        max_connections: int = LLM_MAX_CONNECTIONS
+    ):
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        # An httpx client is bound to the event loop it was first used on
+        self._clients: Dict[asyncio.AbstractEventLoop, Tuple[httpx.AsyncClient, ChatOpenAI]] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+        }
+
+    def get_llm(self) -> ChatOpenAI:
+        """
+        Return the shared chat model of the running event loop, creating it
+        on first use.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is not None:
+                return client[1]
+            for closed in [other for other in self._clients if other.is_closed()]:
+                logger.warning("LLM client of a closed event loop was not closed with aclose()")
+                del self._clients[closed]
+            http_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                event_hooks={"request": [self._on_request], "response": [self._on_response]}
+            )
+            llm = ChatOpenAI(
+                model=self.model,
+                timeout=self.timeout,
+                http_async_client=http_client
+            )
+            self._clients[loop] = (http_client, llm)
+            return llm
+
+    async def aclose(self) -> None:
+        """
+        Close the pooled HTTP clients and their connections: the running
+        loop's here, those of other running loops on their own loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._clients.items())
+            self._clients.clear()
+        for owner, (http_client, _) in clients:
+            if owner is loop:
+                await http_client.aclose()
+            elif owner.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(http_client.aclose(), owner))
+
+    async def _on_request(self, request: httpx.Request) -> None:
+        # httpcore reports a connect_tcp event only when it opens a new connection
+        state = {"connected": False}
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                state["connected"] = True
+
+        request.extensions["trace"] = trace
+        request.extensions["connection_state"] = state
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        state = response.request.extensions.get("connection_state")
+        self.stats["requests"] += 1
+        if state is not None:
+            key = "new_connections" if state["connected"] else "reused_connections"
+            self.stats[key] += 1
+
+
+llm_clients = LLMClientManager()
+
+def _to_text(mail_content) -> str:
+    # Emails are passed around as dicts of subject/body/sender
+    if isinstance(mail_content, dict):
+        return json.dumps(mail_content, default=str)
+    return mail_content
+
+
+def _record_usage(response) -> None:
+    usage = getattr(response, "usage_metadata", None) or {}
+    llm_clients.stats["input_tokens"] += usage.get("input_tokens", 0)
+    llm_clients.stats["output_tokens"] += usage.get("output_tokens", 0)
+
+
+def load_categories(user_id: int) -> List[Category]:
+    db: Session = SessionLocal()
+    try:
+        return db.query(Category).filter(Category.account_id == user_id).all()
+    finally:
+        db.close()
+
+
+def _match_category(categories: List[Category], name: str) -> Optional[int]:
+    # The model is asked for the category name only, but may add quotes or punctuation
+    wanted = name.strip().strip('"\'.').lower()
+    for cat in categories:
+        if cat.name.strip().lower() == wanted:
+            return cat.id
+    return None
+
+
+async def summarize(mail_content) -> str:
+    llm = llm_clients.get_llm()
     prompt = [
         SystemMessage(content="Summarize the following email content:"),
-        HumanMessage(content=mail_content)
+        HumanMessage(content=_to_text(mail_content))
     ]
     response = await llm.ainvoke(prompt)
-    return response
+    _record_usage(response)
+    return response.content
 
-async def categorize(user_id: int, mail_content: str) -> str:
-    db: Session = SessionLocal()
-    try:
-        categories = db.query(Category).filter(Category.account_id == user_id).all()
-        print(">>>>>> categories: ", categories)
-        
-        if not categories:
-            return "No categories found for this user."
-
-        category_descriptions = "\n".join(
-            [f"{cat.name}: {cat.description or ''}" for cat in categories]
-        )
-        system_prompt = (
-            "Given the following categories:\n"
-            f"{category_descriptions}\n"
-            "Analyze the following email content and decide which category it suits best. "
-            "Respond with the category name only."
-        )
-        llm = ChatOpenAI(model="gpt-3.5-turbo")
-        prompt = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=mail_content)
-        ]
-        response = await llm.ainvoke(prompt)
-        return response.content
-    finally:
-        db.close()
\ No newline at end of file
+async def categorize(user_id: int, mail_content, categories: Optional[List[Category]] = None) -> Optional[int]:
+    """
+    Ask the LLM for the best matching category of the user.
+
+    Args:
+        categories: The user's categories, if already loaded
+
+    Returns:
+        ID of the matching Category, or None if the user has no categories
+        or the answer does not name one of them
+    """
+    if categories is None:
+        categories = await asyncio.to_thread(load_categories, user_id)
+    logger.debug("Categorizing against %d categories for user %s", len(categories), user_id)
+
+    if not categories:
+        return None
+
+    category_descriptions = "\n".join(
+        [f"{cat.name}: {cat.description or ''}" for cat in categories]
+    )
+    system_prompt = (
+        "Given the following categories:\n"
+        f"{category_descriptions}\n"
+        "Analyze the following email content and decide which category it suits best. "
+        "Respond with the category name only."
+    )
+    llm = llm_clients.get_llm()
+    prompt = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=_to_text(mail_content))
+    ]
+    response = await llm.ainvoke(prompt)
+    _record_usage(response)
+    return _match_category(categories, response.content)
+
+
+class EmailClassification(BaseModel):
+    summary: str
+    category_id: Optional[int] = None
+    confidence: float = 0.0
+
+
+async def classify(user_id: int, mail_content, categories: Optional[List[Category]] = None) -> EmailClassification:
+    """
+    Summarize and categorize an email with a single structured LLM call.
+
+    The category ID is validated against the user's categories; an unknown
+    ID is replaced by None with zero confidence.
+    """
+    if categories is None:
+        categories = await asyncio.to_thread(load_categories, user_id)
+
+    category_descriptions = "\n".join(
+        [f"{cat.id}: {cat.name} - {cat.description or ''}" for cat in categories]
+    ) or "(none)"
+    system_prompt = (
+        "Summarize the following email content and decide which of these categories "
+        "(id: name - description) it suits best:\n"
+        f"{category_descriptions}\n"
+        "Respond with a JSON object with the keys "
+        '"summary" (string), "category_id" (integer id, or null if no category fits) '
+        'and "confidence" (number between 0 and 1).'
+    )
+    llm = llm_clients.get_llm().bind(response_format={"type": "json_object"})
+    prompt = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=_to_text(mail_content))
+    ]
+    response = await llm.ainvoke(prompt)
+    _record_usage(response)
+
+    result = EmailClassification.model_validate_json(response.content)
+    result.confidence = min(max(result.confidence, 0.0), 1.0)
+    if result.category_id not in {cat.id for cat in categories}:
+        result.category_id = None
+        result.confidence = 0.0
+    return result
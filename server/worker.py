@@ -0,0 +1,135 @@
+"""
+Standalone email-processing worker.
+
+Runs N processes, each draining the job queue with its own asyncio loop, so
+categorization throughput scales separately from the API:
+
+    python -m worker --processes 4 --concurrency 8
+
+Set JOB_WORKER_ENABLED=false on the API servers when dedicated workers run.
+SIGINT/SIGTERM stop leasing, let running items finish for --grace seconds
+and put unfinished items back on the queue. Processes that die are
+restarted, and the work items they held are released immediately rather
+than after their leases expire.
+"""
+from database.database import SessionLocal
+from job_queue import (
+    JobWorker, release_leases, worker_prefix, JOB_WORKER_CONCURRENCY, JOB_POLL_INTERVAL, JOB_SHUTDOWN_GRACE_SECONDS
+)
+from utils import llm_clients
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between restarts of the same worker slot
+RESTART_DELAY_SECONDS = 1.0
+
+
+async def _serve(concurrency: int, poll_interval: float, grace: float) -> None:
+    worker = JobWorker(concurrency=concurrency, poll_interval=poll_interval)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    worker.start()
+    logger.info("Worker %s started with concurrency %s", worker.worker_id, concurrency)
+    await stopping.wait()
+    logger.info("Worker %s stopping", worker.worker_id)
+    await worker.stop(timeout=grace)
+    await llm_clients.aclose()
+
+
+def run_process(concurrency: int, poll_interval: float, grace: float) -> None:
+    """
+    Entry point of one worker process.
+    """
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+    asyncio.run(_serve(concurrency, poll_interval, grace))
+
+
+def _release_dead(pid: int) -> None:
+    db = SessionLocal()
+    try:
+        released = release_leases(db, worker_prefix(pid))
+        if released:
+            logger.warning("Released %s work items held by dead worker process %s", released, pid)
+    finally:
+        db.close()
+
+
+def supervise(processes: int, concurrency: int, poll_interval: float, grace: float) -> None:
+    """
+    Start `processes` worker processes and keep them running until signalled.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    args = (concurrency, poll_interval, grace)
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    def _spawn():
+        process = ctx.Process(target=run_process, args=args, daemon=False)
+        process.start()
+        return process
+
+    children = [_spawn() for _ in range(processes)]
+    while not stopping:
+        time.sleep(RESTART_DELAY_SECONDS)
+        for index, process in enumerate(children):
+            if process.is_alive() or stopping:
+                continue
+            logger.warning("Worker process %s exited with code %s, restarting", process.pid, process.exitcode)
+            try:
+                _release_dead(process.pid)
+            except Exception as e:
+                logger.error("Failed to release leases of process %s: %s", process.pid, e)
+            children[index] = _spawn()
+
+    logger.info("Stopping %s worker processes", len(children))
+    for process in children:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+    for process in children:
+        process.join(grace + 10)
+        if process.is_alive():
+            process.kill()
+            process.join()
+            _release_dead(process.pid)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run email-processing workers")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes to run (default: CPU count)")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY,
+                        help="work items each process runs at the same time")
+    parser.add_argument("--poll-interval", type=float, default=JOB_POLL_INTERVAL,
+                        help="seconds to wait before polling an empty queue again")
+    parser.add_argument("--grace", type=float, default=JOB_SHUTDOWN_GRACE_SECONDS,
+                        help="seconds running items get to finish on shutdown")
+    args = parser.parse_args()
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(name)s %(levelname)s %(message)s")
+    if args.processes == 1:
+        asyncio.run(_serve(args.concurrency, args.poll_interval, args.grace))
+    else:
+        supervise(args.processes, args.concurrency, args.poll_interval, args.grace)
+
+
+if __name__ == "__main__":
+    main()